@@ -0,0 +1,168 @@
+import threading
+from typing import Callable, Dict, List, Optional
+import grpc
+from bookstore_metrics import method_name
+
+# Load shedding: grpc's maximum_concurrent_rpcs bounds the work accepted by a
+# server (running on a worker plus waiting for one) and rejects the rest with
+# RESOURCE_EXHAUSTED before it is queued; the admission interceptor then caps
+# how many calls of one method run at once, so a burst of expensive searches
+# cannot take every worker, and drops calls whose deadline passed while they
+# waited in the queue.
+
+
+class ScanExpired(Exception):
+    # Raised by BookStore scans when the caller's deadline has passed or the
+    # call was cancelled, so the rest of the scan is skipped.
+    pass
+
+
+def expiry_check(context) -> Callable[[], bool]:
+    # A cheap predicate for long scans to poll between shards. grpc.aio
+    # contexts report done() instead of is_active().
+    is_active = getattr(context, "is_active", None)
+    if is_active is None:
+        is_active = lambda: not context.done()
+
+    def expired() -> bool:
+        remaining = context.time_remaining()
+        return (remaining is not None and remaining <= 0) or not is_active()
+
+    return expired
+
+
+def parse_method_limits(specs: List[str]) -> Dict[str, int]:
+    limits = {}
+    for spec in specs:
+        method, sep, limit = spec.partition("=")
+        if not sep or not method or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid method limit {spec!r}: expected METHOD=N with N >= 1")
+        limits[method] = int(limit)
+    return limits
+
+
+class Admission:
+    def __init__(self, method_limits: Optional[Dict[str, int]] = None, max_pending: Optional[int] = None):
+        self.method_limits = method_limits or {}
+        self.max_pending = max_pending
+        self.active: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def maximum_concurrent_rpcs(self, max_workers: int) -> Optional[int]:
+        # Streaming calls hold their slot until they end, so long-lived
+        # subscriptions count against the bound as well.
+        if self.max_pending is None:
+            return None
+        return max_workers + self.max_pending
+
+    def admit(self, method: str, expired: Callable[[], bool]) -> Optional[tuple]:
+        # None when the call may run, otherwise the status to fail it with.
+        # An admitted call must be released().
+        if expired():
+            return grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline expired while the call was queued"
+        limit = self.method_limits.get(method)
+        with self.lock:
+            active = self.active.get(method, 0)
+            if limit is not None and active >= limit:
+                return grpc.StatusCode.RESOURCE_EXHAUSTED, f"Too many concurrent {method} calls; retry later"
+            self.active[method] = active + 1
+        return None
+
+    def release(self, method: str) -> None:
+        with self.lock:
+            self.active[method] -= 1
+
+
+class AdmissionInterceptor(grpc.ServerInterceptor):
+    # Goes after MetricsInterceptor, so rejected calls are still counted
+    # under their status code.
+    def __init__(self, admission: Admission):
+        self.admission = admission
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = method_name(handler_call_details)
+        if handler.unary_unary:
+            return handler._replace(unary_unary=self.wrap_unary(method, handler.unary_unary))
+        if handler.stream_unary:
+            return handler._replace(stream_unary=self.wrap_unary(method, handler.stream_unary))
+        if handler.unary_stream:
+            return handler._replace(unary_stream=self.wrap_stream(method, handler.unary_stream))
+        return handler._replace(stream_stream=self.wrap_stream(method, handler.stream_stream))
+
+    def wrap_unary(self, method: str, behavior):
+        admission = self.admission
+
+        def wrapper(request, context):
+            rejected = admission.admit(method, expiry_check(context))
+            if rejected is not None:
+                context.abort(*rejected)
+            try:
+                return behavior(request, context)
+            finally:
+                admission.release(method)
+
+        return wrapper
+
+    def wrap_stream(self, method: str, behavior):
+        admission = self.admission
+
+        def wrapper(request, context):
+            rejected = admission.admit(method, expiry_check(context))
+            if rejected is not None:
+                context.abort(*rejected)
+            try:
+                yield from behavior(request, context)
+            finally:
+                admission.release(method)
+
+        return wrapper
+
+
+class AsyncAdmissionInterceptor(grpc.aio.ServerInterceptor):
+    def __init__(self, admission: Admission):
+        self.admission = admission
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = method_name(handler_call_details)
+        if handler.unary_unary:
+            return handler._replace(unary_unary=self.wrap_unary(method, handler.unary_unary))
+        if handler.stream_unary:
+            return handler._replace(stream_unary=self.wrap_unary(method, handler.stream_unary))
+        if handler.unary_stream:
+            return handler._replace(unary_stream=self.wrap_stream(method, handler.unary_stream))
+        return handler._replace(stream_stream=self.wrap_stream(method, handler.stream_stream))
+
+    def wrap_unary(self, method: str, behavior):
+        admission = self.admission
+
+        async def wrapper(request, context):
+            rejected = admission.admit(method, expiry_check(context))
+            if rejected is not None:
+                await context.abort(*rejected)
+            try:
+                return await behavior(request, context)
+            finally:
+                admission.release(method)
+
+        return wrapper
+
+    def wrap_stream(self, method: str, behavior):
+        admission = self.admission
+
+        async def wrapper(request, context):
+            rejected = admission.admit(method, expiry_check(context))
+            if rejected is not None:
+                await context.abort(*rejected)
+            try:
+                async for response in behavior(request, context):
+                    yield response
+            finally:
+                admission.release(method)
+
+        return wrapper
@@ -0,0 +1,262 @@
+import asyncio
+import grpc
+import bookstore_pb2
+import bookstore_pb2_grpc
+import queue
+from bookstore_admission import Admission, AsyncAdmissionInterceptor
+from bookstore_broker import SubscriptionClosed
+from bookstore_changes import ChangesTrimmed
+from bookstore_metrics import AsyncMetricsInterceptor, Metrics
+from bookstore_server import BookStore, BookStoreServicer, BULK_BATCH_SIZE, WATCH_BATCH
+from bookstore_wire import ResponseCompression, add_servicer_to_server
+from typing import Optional
+
+
+class LoopQueue:
+    # Exposes an asyncio.Queue through the thread-safe put() that BookStore
+    # uses for fan-out, so publishers on any thread can feed an async stream.
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, item) -> None:
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    def qsize(self) -> int:
+        return self.queue.qsize()
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class AsyncBookStoreServicer(bookstore_pb2_grpc.BookStoreServicer):
+    # Point RPCs are short in-memory operations on BookStore, so they run
+    # directly on the event loop through the threaded servicer. Work that
+    # can take long goes to the loop's executor instead: searches, listings
+    # and exports scan under shard read locks, and writes to a persistent
+    # store may wait for an fsync. Streaming RPCs are async generators
+    # parked on asyncio queues instead of holding a thread each.
+    def __init__(self, store: Optional[BookStore] = None, metrics: Optional[Metrics] = None,
+                 compression: Optional[ResponseCompression] = None):
+        # Compression is chosen here rather than by the threaded servicer:
+        # grpc.aio only applies set_compression to a unary response once the
+        # initial metadata has been sent explicitly.
+        self.servicer = BookStoreServicer(store, metrics)
+        self.store = self.servicer.store
+        self.compression = compression if compression is not None else ResponseCompression()
+
+    async def offload(self, handler, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, handler, *args)
+
+    async def write(self, handler, *args):
+        # The WAL is read per call: recovery attaches it after startup.
+        if self.store.wal is None:
+            return handler(*args)
+        return await self.offload(handler, *args)
+
+    @property
+    def encoded_responses(self) -> bool:
+        return self.servicer.encoded_responses
+
+    @encoded_responses.setter
+    def encoded_responses(self, value: bool) -> None:
+        self.servicer.encoded_responses = value
+
+    async def AddBook(self, request, context):
+        return await self.write(self.servicer.AddBook, request, context)
+
+    async def GetBook(self, request, context):
+        return self.servicer.GetBook(request, context)
+
+    async def BatchGetBooks(self, request, context):
+        return self.servicer.BatchGetBooks(request, context)
+
+    async def BatchUpdateStock(self, request, context):
+        return await self.write(self.servicer.BatchUpdateStock, request, context)
+
+    async def BatchDeleteBooks(self, request, context):
+        return await self.write(self.servicer.BatchDeleteBooks, request, context)
+
+    async def GetBookByIsbn(self, request, context):
+        return self.servicer.GetBookByIsbn(request, context)
+
+    async def BatchGetByIsbn(self, request, context):
+        return self.servicer.BatchGetByIsbn(request, context)
+
+    async def SearchBook(self, request, context):
+        return await self.compressed(context, await self.offload(self.servicer.SearchBook, request, context))
+
+    async def compressed(self, context, response):
+        algorithm = self.compression.choose(context, response)
+        if algorithm is not None:
+            context.set_compression(algorithm)
+            await context.send_initial_metadata(())
+        return response
+
+    async def UpdateStock(self, request, context):
+        return await self.write(self.servicer.UpdateStock, request, context)
+
+    async def AdjustStock(self, request, context):
+        return await self.write(self.servicer.AdjustStock, request, context)
+
+    async def CompareAndSetStock(self, request, context):
+        return await self.write(self.servicer.CompareAndSetStock, request, context)
+
+    async def ListBooks(self, request, context):
+        return await self.compressed(context, await self.offload(self.servicer.ListBooks, request, context))
+
+    async def QueryBooks(self, request, context):
+        return await self.compressed(context, await self.offload(self.servicer.QueryBooks, request, context))
+
+    async def DeleteBook(self, request, context):
+        return await self.write(self.servicer.DeleteBook, request, context)
+
+    async def SubscribeToNewBooks(self, request, context):
+        loop = asyncio.get_running_loop()
+        broker = self.store.broker
+        subscription = broker.subscribe(loop)
+        context.add_done_callback(lambda _: broker.unsubscribe(subscription))
+        
+        end_time = loop.time() + request.duration_seconds
+        try:
+            while True:
+                remaining = end_time - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    book = await subscription.get_async(remaining)
+                except queue.Empty:
+                    return
+                except SubscriptionClosed:
+                    if subscription.overflowed:
+                        context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+                        context.set_details("Subscriber fell too far behind")
+                    return
+                yield book
+        finally:
+            broker.unsubscribe(subscription)
+
+    async def WatchChanges(self, request, context):
+        loop = asyncio.get_running_loop()
+        changes = self.store.changes
+        try:
+            seq = changes.resolve(request.from_sequence)
+        except (ChangesTrimmed, ValueError) as e:
+            await context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+        ready = asyncio.Event()
+
+        def notify():
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass  # the loop has closed under a server shutdown
+
+        changes.add_listener(notify)
+        try:
+            while True:
+                ready.clear()
+                try:
+                    data = changes.read(seq, WATCH_BATCH)
+                except ChangesTrimmed as e:
+                    await context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+                if not data:
+                    await ready.wait()
+                    continue
+                seq += len(data)
+                for event in self.servicer.change_events(data):
+                    yield event
+        finally:
+            changes.remove_listener(notify)
+
+    async def BulkAddBooks(self, request_iterator, context):
+        response = bookstore_pb2.BulkAddResponse()
+        batch = []
+        async for request in request_iterator:
+            batch.append(request)
+            if len(batch) >= BULK_BATCH_SIZE:
+                await self.write(self.servicer.add_batch, batch, response)
+                batch = []
+        await self.write(self.servicer.add_batch, batch, response)
+        return self.servicer.finish_bulk_add(response)
+
+    async def BulkIngest(self, request_iterator, context):
+        batch = []
+        async for request in request_iterator:
+            batch.append(request)
+            if request.flush or len(batch) >= BULK_BATCH_SIZE:
+                yield await self.write(self.servicer.ingest_batch, batch)
+                batch = []
+        if batch:
+            yield await self.write(self.servicer.ingest_batch, batch)
+
+    async def StreamBooks(self, request, context):
+        view = await self.offload(self.store.open_view)
+        context.add_done_callback(lambda _: self.store.close_view(view))
+        chunks = self.servicer.export_chunks(request, view)
+        try:
+            while True:
+                chunk = await self.offload(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.store.close_view(view)
+
+    async def GetServerStats(self, request, context):
+        return self.servicer.server_stats()
+
+    async def GetChatHistory(self, request, context):
+        for messages in self.servicer.chat_history_pages(request):
+            for message in messages:
+                yield message
+
+    async def Chat(self, request_iterator, context):
+        try:
+            first_message = await request_iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        username = first_message.user
+
+        if first_message.message == "GET_USERS":
+            for message in self.servicer.online_users(username):
+                yield message
+            return
+
+        client_queue = LoopQueue(asyncio.get_running_loop())
+        self.servicer.join_chat(first_message, client_queue)
+
+        async def receive_messages():
+            try:
+                async for request in request_iterator:
+                    self.servicer.route_chat_message(request)
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print(f"Receive task error: {str(e)}")
+            finally:
+                self.servicer.leave_chat(username)
+
+        receiver = asyncio.create_task(receive_messages())
+        try:
+            while True:
+                yield await client_queue.get()
+        finally:
+            receiver.cancel()
+
+
+async def serve_async(store: Optional[BookStore] = None, address: str = '[::]:50051',
+                      metrics: Optional[Metrics] = None, admission: Optional[Admission] = None,
+                      compression: Optional[ResponseCompression] = None):
+    metrics = metrics if metrics is not None else Metrics()
+    admission = admission if admission is not None else Admission()
+    # Handlers run on the event loop, so the pending bound is counted
+    # against a single worker.
+    server = grpc.aio.server(
+        interceptors=[AsyncMetricsInterceptor(metrics), AsyncAdmissionInterceptor(admission)],
+        maximum_concurrent_rpcs=admission.maximum_concurrent_rpcs(1)
+    )
+    add_servicer_to_server(AsyncBookStoreServicer(store, metrics, compression), server)
+    server.add_insecure_port(address)
+    await server.start()
+    print(f"BookStore asyncio server started on {address}")
+    await server.wait_for_termination()
@@ -0,0 +1,250 @@
+import argparse
+import math
+import random
+import string
+import threading
+import time
+import uuid
+from typing import List
+import bookstore_pb2
+from bookstore_cache import SearchCache
+from bookstore_server import BookStore, DEFAULT_PAGE_SIZE, DEFAULT_SHARDS, normalize_isbn
+
+WORDS = [
+    "dune", "empire", "shadow", "river", "garden", "silent", "winter", "crown",
+    "ocean", "machine", "memory", "forest", "glass", "storm", "kingdom", "light",
+    "night", "stone", "dragon", "city", "house", "fire", "secret", "journey",
+]
+QUERIES = ["dune", "the silent", "zq", "kingdom of", "author 42", "e"]
+
+
+def random_book(rng: random.Random) -> bookstore_pb2.Book:
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+    suffix = "".join(rng.choice(string.ascii_lowercase) for _ in range(4))
+    return bookstore_pb2.Book(
+        id=str(uuid.uuid4()),
+        title=f"The {title} {suffix}",
+        author=f"Author {rng.randint(0, 5000)}",
+        isbn=str(rng.randint(10**12, 10**13 - 1)),
+        stock=rng.randint(0, 100),
+        price=round(rng.uniform(5, 60), 2)
+    )
+
+
+def linear_scan(store: BookStore, query: str):
+    query = query.lower()
+    return [
+        book for book in store.iter_books()
+        if query in book.title.lower() or query in book.author.lower()
+    ]
+
+
+def time_per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_search(sizes, repeat: int, seed: int):
+    # Times what SearchBook runs: a ranked first page. The index column runs
+    # with the search cache off; the cached column repeats each query against
+    # a warm cache swapped into the same store.
+    rng = random.Random(seed)
+    store = BookStore(search_cache=SearchCache(0))
+    cache = SearchCache()
+    print(f"{'books':>8} {'query':>12} {'matches':>8} {'index ms':>10} {'cached ms':>10} {'scan ms':>10}")
+    for size in sizes:
+        while store.count() < size:
+            store.add_book(random_book(rng))
+        for query in QUERIES:
+            matches = len(store.search_books(query))
+            indexed = time_per_call(lambda: store.search_ranked(query, DEFAULT_PAGE_SIZE), repeat)
+            uncached, store.search_cache = store.search_cache, cache
+            cached = time_per_call(lambda: store.search_ranked(query, DEFAULT_PAGE_SIZE), repeat)
+            store.search_cache = uncached
+            scanned = time_per_call(lambda: linear_scan(store, query), max(1, repeat // 10))
+            print(f"{size:>8} {query!r:>12} {matches:>8} {indexed:>10.3f} {cached:>10.3f} {scanned:>10.3f}")
+
+
+def walk_pages(store: BookStore, page_size: int) -> List[str]:
+    seen = []
+    after_seq = 0
+    while True:
+        books, next_seq = store.list_books_after(after_seq, page_size)
+        seen.extend(book.id for book in books)
+        if next_seq is None:
+            return seen
+        after_seq = next_seq
+
+
+def check_invariants(store: BookStore, expected: int, stable: List[str]) -> List[str]:
+    errors = []
+    if store.count() != expected:
+        errors.append(f"count {store.count()} != expected {expected}")
+    for i, shard in enumerate(store.shards):
+        table = shard.table
+        if any(table.ids[row] != book_id for book_id, row in table.rows.items()) or \
+                sum(book_id is not None for book_id in table.ids) != len(table):
+            errors.append(f"shard {i}: id map and row ids disagree")
+        if list(table.seqs) != sorted(table.seqs):
+            errors.append(f"shard {i}: rows are out of sequence order")
+        live = {table.seqs[row]: row for row in table.live_rows()}
+        if sorted((table.prices[row], seq) for seq, row in live.items()) != \
+                list(shard.price_index.scan((-math.inf, 0), (math.inf, math.inf))) or \
+                sorted((table.stocks[row], seq) for seq, row in live.items()) != \
+                list(shard.stock_index.scan((-math.inf, 0), (math.inf, math.inf))):
+            errors.append(f"shard {i}: range indexes disagree with the rows")
+    with_isbn = [book for book in store.iter_books() if book.isbn]
+    owners = {normalize_isbn(book.isbn): book.id for book in with_isbn}
+    if len(owners) != len(with_isbn) or owners != store.isbns.owners:
+        errors.append("ISBN index disagrees with the catalog")
+    if len(store.search_books("")) != expected:
+        errors.append("empty search does not return the whole catalog")
+    for book_id in stable[::50]:
+        book = store.get_book(book_id)
+        if book is None or book_id not in {found.id for found in store.search_books(book.title)}:
+            errors.append(f"book {book_id} not found by its title")
+    missing = set(stable) - set(walk_pages(store, 97))
+    if missing:
+        errors.append(f"{len(missing)} stable books missing from a full page walk")
+    return errors
+
+
+def stress(threads: int, ops: int, num_shards: int, seed: int):
+    store = BookStore(num_shards)
+    rng = random.Random(seed)
+    stable = []
+    for _ in range(1_000):
+        book = random_book(rng)
+        store.add_book(book)
+        stable.append(book.id)
+
+    added = [0] * threads
+    deleted = [0] * threads
+    errors = []
+    start_barrier = threading.Barrier(threads + 2)
+
+    def writer(worker: int):
+        local = random.Random(seed + worker)
+        own: List[str] = []
+        start_barrier.wait()
+        for _ in range(ops):
+            op = local.random()
+            if op < 0.35 or not own:
+                book = random_book(local)
+                if store.add_book(book) is None:
+                    own.append(book.id)
+                    added[worker] += 1
+            elif op < 0.55:
+                store.update_stock(local.choice(own + stable), local.randint(0, 100))
+            elif op < 0.75:
+                book_id = own.pop(local.randrange(len(own)))
+                if not store.delete_book(book_id):
+                    errors.append(f"worker {worker}: delete of own book {book_id} failed")
+                deleted[worker] += 1
+            elif op < 0.95:
+                store.search_books(local.choice(QUERIES))
+            else:
+                store.list_books(local.randint(1, 20), 25)
+
+    def walker():
+        start_barrier.wait()
+        for _ in range(5):
+            seen = walk_pages(store, 50)
+            if len(seen) != len(set(seen)):
+                errors.append("page walk returned a book twice")
+            if set(stable) - set(seen):
+                errors.append("page walk skipped a book that was never deleted")
+
+    workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=walker))
+    for thread in workers:
+        thread.start()
+    began = time.perf_counter()
+    start_barrier.wait()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    errors.extend(check_invariants(store, len(stable) + sum(added) - sum(deleted), stable))
+    print(f"{threads} threads x {ops} ops on {num_shards} shards: "
+          f"{threads * ops / elapsed:,.0f} ops/s, {store.count()} books")
+    for error in errors:
+        print(f"ERROR: {error}")
+    if errors:
+        raise SystemExit(1)
+    print("OK")
+
+
+def hot_item(threads: int, ops: int, stock: int):
+    # Every thread buys the same title with AdjustStock, a few restock it and
+    # a few retry CompareAndSetStock; no sale may be lost or oversold.
+    store = BookStore()
+    book = bookstore_pb2.Book(id="hot", title="Hot title", stock=stock)
+    store.add_book(book)
+    sold = [0] * threads
+    restocked = [0] * threads
+    start_barrier = threading.Barrier(threads + 1)
+
+    def buyer(worker: int):
+        start_barrier.wait()
+        for i in range(ops):
+            if worker % 8 == 7:
+                while True:
+                    current = store.get_book("hot")
+                    if store.compare_and_set_stock("hot", current.version, current.stock + 1)[0]:
+                        restocked[worker] += 1
+                        break
+            elif store.adjust_stock("hot", -1, 0)[0]:
+                sold[worker] += 1
+
+    workers = [threading.Thread(target=buyer, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    began = time.perf_counter()
+    start_barrier.wait()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    final = store.get_book("hot")
+    print(f"{threads} threads x {ops} ops on one book: {threads * ops / elapsed:,.0f} ops/s, "
+          f"{sum(sold)} sold, {sum(restocked)} restocked, stock {final.stock}, version {final.version}")
+    expected = stock - sum(sold) + sum(restocked)
+    if final.stock != expected or final.stock < 0 or final.version != 1 + sum(sold) + sum(restocked):
+        print(f"ERROR: stock {final.stock} != expected {expected}")
+        raise SystemExit(1)
+    print("OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BookStore micro-benchmarks")
+    parser.add_argument("--seed", type=int, default=1)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="indexed search latency versus catalog size")
+    search.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    search.add_argument("--repeat", type=int, default=50)
+
+    stress_cmd = commands.add_parser("stress", help="concurrent mutation stress test")
+    stress_cmd.add_argument("--threads", type=int, default=16)
+    stress_cmd.add_argument("--ops", type=int, default=2_000)
+    stress_cmd.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+
+    hot = commands.add_parser("hot", help="concurrent stock changes on a single book")
+    hot.add_argument("--threads", type=int, default=16)
+    hot.add_argument("--ops", type=int, default=2_000)
+    hot.add_argument("--stock", type=int, default=20_000)
+
+    args = parser.parse_args()
+    if args.command == "search":
+        bench_search(args.sizes, args.repeat, args.seed)
+    elif args.command == "hot":
+        hot_item(args.threads, args.ops, args.stock)
+    else:
+        stress(args.threads, args.ops, args.shards, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+DROP_OLDEST = "drop-oldest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DISCONNECT)
+DEFAULT_CAPACITY = 1024
+
+
+class SubscriptionClosed(Exception):
+    pass
+
+
+class Subscription:
+    # A bounded buffer between the broker and one stream. offer() never
+    # blocks the publisher: a full buffer either drops its oldest event or
+    # closes the subscription, depending on the overflow policy.
+    def __init__(self, capacity: int, policy: str):
+        self.capacity = capacity
+        self.policy = policy
+        self.buffer = deque()
+        self.closed = False
+        self.overflowed = False
+        self.dropped = 0
+        self.cond = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def wake(self) -> None:
+        self.cond.notify_all()
+
+    def offer(self, item) -> bool:
+        return self.offer_many((item,))
+
+    def offer_many(self, items) -> bool:
+        with self.cond:
+            if self.closed:
+                return False
+            for item in items:
+                if len(self.buffer) >= self.capacity:
+                    if self.policy == DISCONNECT:
+                        self.closed = True
+                        self.overflowed = True
+                        self.wake()
+                        return False
+                    self.buffer.popleft()
+                    self.dropped += 1
+                self.buffer.append(item)
+            self.wake()
+        return True
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.wake()
+
+    def get(self, timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while not self.buffer:
+                if self.closed:
+                    raise SubscriptionClosed()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty()
+                self.cond.wait(remaining)
+            return self.buffer.popleft()
+
+
+class AsyncSubscription(Subscription):
+    # Same buffer, but readers await an asyncio.Event that publishers on any
+    # thread set through the owning loop.
+    def __init__(self, capacity: int, policy: str, loop: asyncio.AbstractEventLoop):
+        super().__init__(capacity, policy)
+        self.loop = loop
+        self.ready = asyncio.Event()
+
+    def wake(self) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # The loop has shut down; nobody is left to read this buffer.
+            self.closed = True
+
+    async def get_async(self, timeout: Optional[float] = None):
+        deadline = None if timeout is None else self.loop.time() + timeout
+        while True:
+            self.ready.clear()
+            with self.cond:
+                if self.buffer:
+                    return self.buffer.popleft()
+                if self.closed:
+                    raise SubscriptionClosed()
+            remaining = None if deadline is None else deadline - self.loop.time()
+            if remaining is not None and remaining <= 0:
+                raise queue.Empty()
+            try:
+                await asyncio.wait_for(self.ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise queue.Empty()
+
+
+class Broker:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, policy: str = DROP_OLDEST):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy!r}")
+        self.capacity = capacity
+        self.policy = policy
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def subscribe(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        if loop is None:
+            subscription = Subscription(self.capacity, self.policy)
+        else:
+            subscription = AsyncSubscription(self.capacity, self.policy, loop)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            self.subscriptions.discard(subscription)
+        subscription.close()
+
+    def publish(self, item) -> None:
+        self.publish_many((item,))
+
+    def publish_many(self, items) -> None:
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if not subscription.offer_many(items):
+                self.unsubscribe(subscription)
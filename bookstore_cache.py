@@ -0,0 +1,126 @@
+import itertools
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+DEFAULT_CACHE_ENTRIES = 1024
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+DEFAULT_CACHE_TTL = 60.0
+# Bytes per list slot, the reference to the item.
+SLOT_BYTES = 8
+# Ranking features measured to estimate the size of a part's features.
+FEATURE_SAMPLE = 64
+
+
+def nested_size(value: tuple, seen: set) -> int:
+    # A tuple and the tuples in it, skipping those already in `seen`. Their
+    # ints are small and shared, so they are not counted.
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    return sys.getsizeof(value) + sum(nested_size(item, seen) for item in value if isinstance(item, tuple))
+
+
+def part_size(part: Optional[List[bytes]], seqs: array, features: Optional[list]) -> int:
+    # Estimated memory held by one shard's part of a CachedSearch. Ranking
+    # features are only measured for a sample and scaled up; tuples they
+    # share, like the one for an absent field, count once.
+    size = seqs.itemsize * len(seqs)
+    if part is not None:
+        size += sys.getsizeof(part) + sum(map(sys.getsizeof, part))
+    if features is not None:
+        size += SLOT_BYTES * len(features)
+        sample = list(itertools.islice((item for item in features if item is not None), FEATURE_SAMPLE))
+        if sample:
+            seen = set()
+            measured = sum(nested_size(item, seen) for item in sample)
+            size += measured * (len(features) - features.count(None)) // len(sample)
+    return size
+
+
+class CachedSearch:
+    # One query's results split by shard, with the shard generation each part
+    # was computed at, so a write to one shard only recomputes that part.
+    # Every match keeps its sequence number; a part holds the matches' Book
+    # wire encodings once a plain search has used it and their ranking
+    # features once a ranked search has, None until then. Ranked pages are
+    # rescored from the features and read back by sequence number.
+    def __init__(self, generations: List[int], parts: List[Optional[List[bytes]]], sizes: List[int],
+                 expires_at: float, seqs: List[array], features: List[Optional[list]]):
+        self.generations = generations
+        self.parts = parts
+        self.sizes = sizes
+        self.expires_at = expires_at
+        self.seqs = seqs
+        self.features = features
+
+    @property
+    def size(self) -> int:
+        return sum(self.sizes)
+
+
+class SearchCache:
+    # LRU of CachedSearch entries bounded by entry count and by the memory
+    # the entries hold, see part_size(); entries older than `ttl` seconds are dropped
+    # on lookup (0 disables expiry).
+    def __init__(self, max_entries: int = DEFAULT_CACHE_ENTRIES, max_bytes: int = DEFAULT_CACHE_BYTES,
+                 ttl: float = DEFAULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, CachedSearch]" = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def expiry(self) -> float:
+        return time.monotonic() + self.ttl if self.ttl > 0 else float("inf")
+
+    def get(self, query: str) -> Optional[CachedSearch]:
+        with self.lock:
+            entry = self.entries.get(query)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self.bytes -= self.entries.pop(query).size
+                return None
+            self.entries.move_to_end(query)
+            return entry
+
+    def put(self, query: str, entry: CachedSearch) -> None:
+        size = entry.size
+        with self.lock:
+            old = self.entries.pop(query, None)
+            if old is not None:
+                self.bytes -= old.size
+            if size > self.max_bytes:
+                return
+            self.entries[query] = entry
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+
+    def record(self, hit: bool, refreshed: bool) -> None:
+        with self.lock:
+            if hit:
+                self.hits += 1
+            elif refreshed:
+                self.refreshes += 1
+            else:
+                self.misses += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
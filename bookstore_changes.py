@@ -0,0 +1,120 @@
+import threading
+from typing import Callable, List, Optional, Set
+import bookstore_pb2
+from bookstore_wire import encode_bytes, encode_int, encode_string
+
+DEFAULT_MAX_EVENTS = 100_000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+ADDED = bookstore_pb2.ChangeEvent.ADDED
+UPDATED = bookstore_pb2.ChangeEvent.UPDATED
+DELETED = bookstore_pb2.ChangeEvent.DELETED
+
+
+class ChangesTrimmed(Exception):
+    def __init__(self, sequence: int, first: int):
+        super().__init__(f"Change {sequence} is no longer retained; the oldest is {first}")
+        self.sequence = sequence
+        self.first = first
+
+
+class ChangeLog:
+    # The most recent catalog changes as encoded ChangeEvents, for
+    # WatchChanges. Sequence numbers are consecutive; the log keeps the range
+    # [start, end) and evicts from the front when either the event count or
+    # the byte budget is exceeded. Watchers only remember the next sequence
+    # they want, so any number of them follow the log at their own pace, and
+    # one that falls out of the retained range is told instead of silently
+    # missing changes.
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.slots: List[Optional[bytes]] = [None] * max_events
+        self.start = 1
+        self.end = 1
+        self.bytes = 0
+        self.cond = threading.Condition(threading.Lock())
+        # Called after every append; lets asyncio watchers wait on their loop.
+        self.listeners: Set[Callable[[], None]] = set()
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def last_sequence(self) -> int:
+        return self.end - 1
+
+    def restart(self, next_sequence: int) -> None:
+        # Continues the numbering of a recovered catalog: the store logs one
+        # change per WAL record, so the next sequence follows the last LSN.
+        with self.cond:
+            self.slots = [None] * self.max_events
+            self.start = self.end = next_sequence
+            self.bytes = 0
+
+    def append(self, kind: int, book_id: str, book: Optional[bookstore_pb2.Book] = None) -> int:
+        if self.max_events <= 0:
+            with self.cond:
+                sequence = self.end
+                self.start = self.end = sequence + 1
+            return sequence
+        body = encode_int(2, kind) + encode_string(3, book_id)
+        if book is not None:
+            body += encode_bytes(4, book.SerializeToString())
+        with self.cond:
+            sequence = self.end
+            data = encode_int(1, sequence) + body
+            if self.end - self.start == self.max_events:
+                self._evict()
+            self.slots[sequence % self.max_events] = data
+            self.end += 1
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes and self.end - self.start > 1:
+                self._evict()
+            self.cond.notify_all()
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener()
+        return sequence
+
+    def _evict(self) -> None:
+        i = self.start % self.max_events
+        self.bytes -= len(self.slots[i])
+        self.slots[i] = None
+        self.start += 1
+
+    def resolve(self, from_sequence: int) -> int:
+        # The first sequence a new watcher reads: 0 means the next change.
+        with self.cond:
+            if from_sequence == 0:
+                return self.end
+            if from_sequence < self.start:
+                raise ChangesTrimmed(from_sequence, self.start)
+            if from_sequence > self.end:
+                raise ValueError(f"Change {from_sequence} has not happened yet; the last is {self.end - 1}")
+            return from_sequence
+
+    def read(self, from_sequence: int, limit: int) -> List[bytes]:
+        with self.cond:
+            if from_sequence < self.start:
+                raise ChangesTrimmed(from_sequence, self.start)
+            stop = min(self.end, from_sequence + limit)
+            return [self.slots[sequence % self.max_events] for sequence in range(from_sequence, stop)]
+
+    def wait(self, from_sequence: int, stopped: Callable[[], bool], timeout: Optional[float] = None) -> bool:
+        # Blocks until change `from_sequence` exists or `stopped()`; wake()
+        # makes waiters re-check `stopped`.
+        with self.cond:
+            return self.cond.wait_for(lambda: self.end > from_sequence or stopped(), timeout)
+
+    def wake(self) -> None:
+        with self.cond:
+            self.cond.notify_all()
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        with self.cond:
+            self.listeners.add(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        with self.cond:
+            self.listeners.discard(listener)
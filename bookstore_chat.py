@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import List, Tuple
+import bookstore_pb2
+
+DEFAULT_MAX_MESSAGES = 10_000
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+
+class ChatHistory:
+    # Fixed-capacity ring of encoded ChatMessages. Every message gets a
+    # sequence number; the ring keeps the range [start, end) and evicts from
+    # the front when either the message count or the byte budget is exceeded.
+    # Entries are (arrival time, encoded bytes) so a replay decodes only the
+    # page it is about to send.
+    def __init__(self, max_messages: int = DEFAULT_MAX_MESSAGES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.slots: List[Tuple[int, bytes]] = [None] * max_messages
+        self.start = 0
+        self.end = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.end - self.start
+
+    def append(self, message: bookstore_pb2.ChatMessage) -> None:
+        if self.max_messages <= 0:
+            # History disabled: messages are still numbered, nothing is kept.
+            with self.lock:
+                self.start = self.end = self.end + 1
+            return
+        data = message.SerializeToString()
+        with self.lock:
+            if self.end - self.start == self.max_messages:
+                self._evict()
+            self.slots[self.end % self.max_messages] = (int(time.time()), data)
+            self.end += 1
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes and self.end - self.start > 1:
+                self._evict()
+
+    def _evict(self) -> None:
+        i = self.start % self.max_messages
+        self.bytes -= len(self.slots[i][1])
+        self.slots[i] = None
+        self.start += 1
+
+    def replay_range(self, last_n: int = 0, since_timestamp: int = 0) -> Tuple[int, int]:
+        with self.lock:
+            if last_n > 0:
+                return max(self.start, self.end - last_n), self.end
+            lo, hi = self.start, self.end
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.slots[mid % self.max_messages][0] < since_timestamp:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo, self.end
+
+    def read(self, from_seq: int, until_seq: int, limit: int) -> Tuple[List[bookstore_pb2.ChatMessage], int]:
+        with self.lock:
+            from_seq = max(from_seq, self.start)
+            stop = min(until_seq, self.end, from_seq + limit)
+            page = [self.slots[seq % self.max_messages][1] for seq in range(from_seq, stop)]
+        return [bookstore_pb2.ChatMessage.FromString(data) for data in page], max(stop, from_seq)
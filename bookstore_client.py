@@ -1,3 +1,4 @@
+import argparse
 import grpc
 import bookstore_pb2
 import bookstore_pb2_grpc
@@ -7,13 +8,14 @@ import time
 import threading
 from datetime import datetime
 import queue
+from bookstore_sdk import DEFAULT_TARGET
 
 def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
 class BookStoreClient:
-    def __init__(self):
-        self.channel = grpc.insecure_channel('localhost:50051')
+    def __init__(self, target: str = DEFAULT_TARGET):
+        self.channel = grpc.insecure_channel(target)
         self.stub = bookstore_pb2_grpc.BookStoreStub(self.channel)
         self.username = input("Enter your username: ")
         self.subscription_thread = None
@@ -30,10 +32,17 @@ class BookStoreClient:
         response = self.stub.AddBook(request)
         return response.success, response.message
     
-    def search_books(self, query: str) -> List[bookstore_pb2.Book]:
-        request = bookstore_pb2.SearchBookRequest(query=query)
+    def search_books(self, query: str, page_token: str = "",
+                     limit: int = 10) -> tuple[List[bookstore_pb2.Book], str]:
+        # One page of matches, most relevant first, and the token for the
+        # next page; the token is empty after the last page.
+        request = bookstore_pb2.SearchBookRequest(query=query, limit=limit, page_token=page_token)
         response = self.stub.SearchBook(request)
-        return response.books
+        return response.books, response.next_page_token
+    
+    def get_book_by_isbn(self, isbn: str):
+        response = self.stub.GetBookByIsbn(bookstore_pb2.GetBookByIsbnRequest(isbn=isbn))
+        return response.book if response.found else None
     
     def update_stock(self, book_id: str, new_stock: int) -> tuple[bool, str]:
         request = bookstore_pb2.UpdateStockRequest(
@@ -111,6 +120,15 @@ class BookStoreClient:
         except Exception as e:
             print(f"Error getting active users: {str(e)}")
 
+        try:
+            history = self.get_chat_history(last_n=20)
+            if history:
+                print("\nRecent messages:")
+                for msg in history:
+                    print(f"[{msg.user}]: {msg.message}")
+        except Exception as e:
+            print(f"Error getting chat history: {str(e)}")
+
         print("\nChat instructions:")
         print("- Type a message to send to everyone (group chat)")
         print("- Type 'username: message' to send a private message")
@@ -198,6 +216,13 @@ class BookStoreClient:
 
 
 
+    def get_chat_history(self, last_n: int = 0, since_timestamp: int = 0) -> List[bookstore_pb2.ChatMessage]:
+        request = bookstore_pb2.ChatHistoryRequest(
+            last_n=last_n,
+            since_timestamp=since_timestamp
+        )
+        return list(self.stub.GetChatHistory(request))
+
     def get_active_users(self):        
         try:
             request = bookstore_pb2.ChatMessage(
@@ -236,7 +261,10 @@ def print_menu():
     return input("Choose an option (1-9): ")
 
 def main():
-    client = BookStoreClient()
+    parser = argparse.ArgumentParser(description="Interactive BookStore client")
+    parser.add_argument("--target", default=DEFAULT_TARGET, help="Server address (host:port)")
+    args = parser.parse_args()
+    client = BookStoreClient(args.target)
     
     while True:
         choice = print_menu()
@@ -257,15 +285,22 @@ def main():
         elif choice == "2":
             clear_screen()
             print("\n=== Search Books ===")
-            query = input("Enter search query: ")
-            books = client.search_books(query)
+            query = input("Enter search query or ISBN: ")
+            book = client.get_book_by_isbn(query) if query.strip() else None
+            books, page_token = ([book], "") if book is not None else client.search_books(query)
             
             if not books:
                 print("No books found.")
-            else:
-                print(f"\nFound {len(books)} book(s):")
+            shown = 0
+            while books:
                 for book in books:
                     print_book(book)
+                shown += len(books)
+                if not page_token or input("\nShow more results? (y/n): ").strip().lower() != "y":
+                    break
+                books, page_token = client.search_books(query, page_token)
+            if shown:
+                print(f"\nShown {shown} book(s)" + ("; more may match." if page_token else "."))
             input("\nPress Enter to continue...")
         
         elif choice == "3":
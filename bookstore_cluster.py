@@ -0,0 +1,393 @@
+import os
+import struct
+import tempfile
+import threading
+from typing import List, Optional
+import grpc
+import bookstore_pb2
+import bookstore_pb2_grpc
+from bookstore_admission import Admission
+from bookstore_metrics import Metrics, method_name, serve_text
+from bookstore_persistence import OP_DELETE, OP_PUT, RECORD_HEADER, encode_record
+from bookstore_server import BookStore, BookStoreServicer, start_server
+from bookstore_wire import ResponseCompression
+
+# Multi-process serving: one primary process owns every write and N replica
+# processes, forked from it once the catalog is loaded, serve reads from
+# their own copy. All of them listen on the public port with SO_REUSEPORT, so
+# the kernel spreads incoming connections across processes. Replicas forward
+# writes (and the subscription and chat streams, whose state lives in one
+# process) to the primary over a private unix socket, and the primary ships
+# every logged change to each replica through a pipe.
+
+REUSEPORT_OPTIONS = [("grpc.so_reuseport", 1)]
+# Trailing metadata on forwarded writes: the last change the primary had
+# logged when the write finished. A replica waits until it has applied that
+# change before answering, so a client reads its own writes.
+LSN_METADATA = "x-bookstore-lsn"
+CATCH_UP_TIMEOUT = 1.0
+PIPE_READ = 1 << 20
+# time_remaining() of a call without a deadline is about 2**63 seconds, which
+# is not a usable timeout for the forwarded call.
+NO_DEADLINE = 1e9
+# Replicated put payload: the primary's sequence number, then the Book.
+SEQ = struct.Struct("<Q")
+
+WRITE_METHODS = frozenset((
+    "AddBook", "UpdateStock", "BatchUpdateStock", "AdjustStock", "CompareAndSetStock",
+    "DeleteBook", "BatchDeleteBooks", "BulkAddBooks", "BulkIngest",
+))
+
+
+class ReplicaLink:
+    # The primary's end of one replica's pipe. send() only queues, so a slow
+    # replica never holds up a writer that has a shard locked; a sender thread
+    # writes whatever has queued with a single write().
+    def __init__(self, pid: int, fd: int):
+        self.pid = pid
+        self.fd = fd
+        self.pending: List[bytes] = []
+        self.cond = threading.Condition(threading.Lock())
+        self.closed = False
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self._run, name=f"replica-{self.pid}", daemon=True)
+        self.thread.start()
+
+    def send(self, record: bytes) -> None:
+        with self.cond:
+            if not self.closed:
+                self.pending.append(record)
+                self.cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                batch, self.pending = self.pending, []
+            data = memoryview(b"".join(batch))
+            try:
+                while data:
+                    data = data[os.write(self.fd, data):]
+            except OSError as e:
+                print(f"Replica {self.pid} stopped receiving changes: {str(e)}")
+                with self.cond:
+                    self.closed = True
+                    self.pending = []
+                return
+
+    def close(self) -> None:
+        # Closing the pipe once everything queued is written tells the replica
+        # to shut down.
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+        os.close(self.fd)
+
+
+def forward_timeout(context) -> Optional[float]:
+    remaining = context.time_remaining()
+    return remaining if remaining < NO_DEADLINE else None
+
+
+def relay(rpc, request, context, wait_for_ready: bool = False):
+    # Calls a unary-response stub method on behalf of the handler's caller,
+    # within its deadline; returns (response, call) or aborts the handler
+    # with the downstream status.
+    try:
+        return rpc.with_call(request, timeout=forward_timeout(context), wait_for_ready=wait_for_ready)
+    except grpc.RpcError as e:
+        context.abort(e.code(), e.details())
+
+
+def relay_stream(rpc, request, context, wait_for_ready: bool = False):
+    # Streaming counterpart of relay(): yields the downstream responses and
+    # returns the finished call, or None if the caller went away first.
+    call = rpc(request, timeout=forward_timeout(context), wait_for_ready=wait_for_ready)
+    context.add_callback(call.cancel)
+    try:
+        yield from call
+    except grpc.RpcError as e:
+        if context.is_active():
+            context.abort(e.code(), e.details())
+        return None
+    return call
+
+
+class ReplicationLog:
+    # Takes the place of BookStore.wal on the primary. The store logs every
+    # change while holding the book's shard write lock, so the order records
+    # reach a replica preserves the order of writes to each book and each
+    # shard; the inner WAL, if any, still makes them durable.
+    def __init__(self, store: BookStore, links: List[ReplicaLink]):
+        self.store = store
+        self.wal = store.wal
+        self.links = links
+        self.lock = threading.Lock()
+        self.last_lsn = 0
+
+    def ship(self, op: int, payload: bytes) -> None:
+        with self.lock:
+            self.last_lsn += 1
+            record = encode_record(self.last_lsn, op, payload)
+            for link in self.links:
+                link.send(record)
+
+    def put(self, book: bookstore_pb2.Book) -> int:
+        data = book.SerializeToString()
+        shard = self.store.shard_for(book.id)
+        self.ship(OP_PUT, SEQ.pack(shard.table.seqs[shard.table.rows[book.id]]) + data)
+        return self.wal.append(OP_PUT, data) if self.wal else 0
+
+    def delete(self, book_id: str) -> int:
+        self.ship(OP_DELETE, book_id.encode())
+        return self.wal.delete(book_id) if self.wal else 0
+
+    def wait(self, lsn: int) -> None:
+        if self.wal:
+            self.wal.wait(lsn)
+
+
+class ReplicationInterceptor(grpc.ServerInterceptor):
+    # Stamps the primary's answers to write RPCs with LSN_METADATA.
+    def __init__(self, log: ReplicationLog):
+        self.log = log
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or method_name(handler_call_details) not in WRITE_METHODS:
+            return handler
+        if handler.unary_unary:
+            return handler._replace(unary_unary=self.wrap_unary(handler.unary_unary))
+        if handler.stream_unary:
+            return handler._replace(stream_unary=self.wrap_unary(handler.stream_unary))
+        return handler._replace(stream_stream=self.wrap_stream(handler.stream_stream))
+
+    def stamp(self, context) -> None:
+        context.set_trailing_metadata(((LSN_METADATA, str(self.log.last_lsn)),))
+
+    def wrap_unary(self, behavior):
+        def wrapper(request, context):
+            response = behavior(request, context)
+            self.stamp(context)
+            return response
+
+        return wrapper
+
+    def wrap_stream(self, behavior):
+        def wrapper(request, context):
+            yield from behavior(request, context)
+            self.stamp(context)
+
+        return wrapper
+
+
+class ReplicaApplier:
+    # Applies the primary's changes to a replica's store, in order, as they
+    # arrive on the pipe. The thread ends when the primary closes the pipe.
+    def __init__(self, store: BookStore, fd: int):
+        self.store = store
+        self.fd = fd
+        self.applied_lsn = 0
+        self.closed = False
+        self.cond = threading.Condition(threading.Lock())
+        self.thread = threading.Thread(target=self._run, name="replica-applier", daemon=True)
+        self.thread.start()
+
+    def apply(self, op: int, payload: bytes) -> None:
+        if op == OP_PUT:
+            (seq,) = SEQ.unpack_from(payload)
+            self.store.apply_put(bookstore_pb2.Book.FromString(payload[SEQ.size:]), seq)
+        elif op == OP_DELETE:
+            self.store.apply_delete(payload.decode())
+
+    def _run(self) -> None:
+        buffer = bytearray()
+        try:
+            while True:
+                chunk = os.read(self.fd, PIPE_READ)
+                if not chunk:
+                    return
+                buffer += chunk
+                offset = 0
+                last = None
+                while offset + RECORD_HEADER.size <= len(buffer):
+                    length, _, lsn, op = RECORD_HEADER.unpack_from(buffer, offset)
+                    start = offset + RECORD_HEADER.size
+                    if start + length > len(buffer):
+                        break
+                    self.apply(op, bytes(buffer[start:start + length]))
+                    offset = start + length
+                    last = lsn
+                del buffer[:offset]
+                if last is not None:
+                    with self.cond:
+                        self.applied_lsn = last
+                        self.cond.notify_all()
+        finally:
+            os.close(self.fd)
+            with self.cond:
+                self.closed = True
+                self.cond.notify_all()
+
+    def wait(self, lsn: int, timeout: float) -> bool:
+        with self.cond:
+            return self.cond.wait_for(lambda: self.applied_lsn >= lsn or self.closed, timeout) \
+                and self.applied_lsn >= lsn
+
+
+class ReplicaServicer(BookStoreServicer):
+    # Reads are answered from the replica's own store by the inherited
+    # handlers; everything else is passed through to the primary.
+    def __init__(self, store: BookStore, metrics: Metrics, primary: bookstore_pb2_grpc.BookStoreStub,
+                 applier: ReplicaApplier, compression: Optional[ResponseCompression] = None):
+        super().__init__(store, metrics, compression)
+        self.primary = primary
+        self.applier = applier
+
+    def catch_up(self, call) -> None:
+        lsn = dict(call.trailing_metadata() or ()).get(LSN_METADATA)
+        if lsn is not None and not self.applier.wait(int(lsn), CATCH_UP_TIMEOUT):
+            print(f"Replica lagging: change {lsn} not applied after {CATCH_UP_TIMEOUT}s")
+
+    def forward(self, method: str, request, context):
+        response, call = relay(getattr(self.primary, method), request, context, wait_for_ready=True)
+        self.catch_up(call)
+        return response
+
+    def forward_stream(self, method: str, request, context):
+        call = yield from relay_stream(getattr(self.primary, method), request, context, wait_for_ready=True)
+        if call is not None:
+            self.catch_up(call)
+
+    def AddBook(self, request, context):
+        return self.forward("AddBook", request, context)
+
+    def UpdateStock(self, request, context):
+        return self.forward("UpdateStock", request, context)
+
+    def BatchUpdateStock(self, request, context):
+        return self.forward("BatchUpdateStock", request, context)
+
+    def AdjustStock(self, request, context):
+        return self.forward("AdjustStock", request, context)
+
+    def CompareAndSetStock(self, request, context):
+        return self.forward("CompareAndSetStock", request, context)
+
+    def DeleteBook(self, request, context):
+        return self.forward("DeleteBook", request, context)
+
+    def BatchDeleteBooks(self, request, context):
+        return self.forward("BatchDeleteBooks", request, context)
+
+    def BulkAddBooks(self, request_iterator, context):
+        return self.forward("BulkAddBooks", request_iterator, context)
+
+    def BulkIngest(self, request_iterator, context):
+        yield from self.forward_stream("BulkIngest", request_iterator, context)
+
+    def SubscribeToNewBooks(self, request, context):
+        yield from self.forward_stream("SubscribeToNewBooks", request, context)
+
+    def WatchChanges(self, request, context):
+        # Sequences are numbered by the primary, which owns the change log.
+        yield from self.forward_stream("WatchChanges", request, context)
+
+    def GetChatHistory(self, request, context):
+        yield from self.forward_stream("GetChatHistory", request, context)
+
+    def Chat(self, request_iterator, context):
+        yield from self.forward_stream("Chat", request_iterator, context)
+
+
+def primary_address() -> str:
+    return f"unix:{os.path.join(tempfile.gettempdir(), f'bookstore-{os.getpid()}.sock')}"
+
+
+def run_replica(store: BookStore, index: int, fd: int, primary: str, address: str, max_workers: int,
+                metrics_port: Optional[int], admission: Optional[Admission],
+                compression: Optional[ResponseCompression]) -> None:
+    store.wal = None
+    applier = ReplicaApplier(store, fd)
+    metrics = Metrics()
+    if metrics_port:
+        serve_text(metrics_port + index, lambda: metrics.collect(store))
+    stub = bookstore_pb2_grpc.BookStoreStub(grpc.insecure_channel(primary))
+    server = start_server(ReplicaServicer(store, metrics, stub, applier, compression), metrics, max_workers,
+                          addresses=(address,), options=REUSEPORT_OPTIONS, admission=admission)
+    print(f"BookStore replica {index} (pid {os.getpid()}) started on {address}")
+    try:
+        applier.thread.join()
+    except KeyboardInterrupt:
+        pass
+    server.stop(1).wait()
+
+
+def fork_replicas(store: BookStore, count: int, max_workers: int = 10, metrics_port: Optional[int] = None,
+                  address: str = '[::]:50051', admission: Optional[Admission] = None,
+                  compression: Optional[ResponseCompression] = None) -> List[ReplicaLink]:
+    # Must run before this process creates any gRPC channel or server, and
+    # before persistence opens its WAL and starts its flusher and snapshot
+    # threads: each child starts from a copy of the loaded catalog, with no
+    # thread of the primary's frozen mid-way. Children never return from here.
+    primary = primary_address()
+    links = []
+    for index in range(1, count + 1):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(write_fd)
+            for link in links:
+                os.close(link.fd)
+            code = 0
+            try:
+                run_replica(store, index, read_fd, primary, address, max_workers, metrics_port, admission,
+                            compression)
+            except BaseException as e:
+                print(f"Replica {index} failed: {str(e)}")
+                code = 1
+            finally:
+                # Skip interpreter shutdown: exit handlers and buffered files
+                # inherited from the primary are not this process's to run.
+                os._exit(code)
+        os.close(read_fd)
+        links.append(ReplicaLink(pid, write_fd))
+    return links
+
+
+def serve_primary(store: BookStore, links: List[ReplicaLink], max_workers: int = 10,
+                  metrics_port: Optional[int] = None, address: str = '[::]:50051',
+                  admission: Optional[Admission] = None, compression: Optional[ResponseCompression] = None) -> None:
+    primary = primary_address()
+    socket_path = primary[len("unix:"):]
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    log = ReplicationLog(store, links)
+    for link in links:
+        link.start()
+    store.wal = log
+    metrics = Metrics()
+    if metrics_port:
+        serve_text(metrics_port, lambda: metrics.collect(store))
+    server = start_server(BookStoreServicer(store, metrics, compression), metrics, max_workers,
+                          addresses=(address, primary), options=REUSEPORT_OPTIONS,
+                          interceptors=(ReplicationInterceptor(log),), admission=admission)
+    print(f"BookStore primary (pid {os.getpid()}) and {len(links)} replicas started on {address}")
+    try:
+        server.wait_for_termination()
+    finally:
+        server.stop(1).wait()
+        store.wal = log.wal
+        for link in links:
+            link.close()
+        for link in links:
+            os.waitpid(link.pid, 0)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -0,0 +1,139 @@
+from array import array
+from typing import Dict, List, Optional, Tuple
+import bookstore_pb2
+
+
+class StringTable:
+    # Strings packed as UTF-8 into one buffer; row i is the slice
+    # data[offsets[i]:offsets[i] + lengths[i]]. A shorter replacement is
+    # written in place, a longer one is appended and leaves garbage behind
+    # until the table is rebuilt.
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("I")
+        self.lengths = array("I")
+
+    def append(self, text: str) -> None:
+        encoded = text.encode()
+        self.offsets.append(len(self.data))
+        self.lengths.append(len(encoded))
+        self.data += encoded
+
+    def get(self, row: int) -> str:
+        offset = self.offsets[row]
+        return self.data[offset:offset + self.lengths[row]].decode()
+
+    def set(self, row: int, text: str) -> None:
+        encoded = text.encode()
+        offset = self.offsets[row]
+        if len(encoded) > self.lengths[row]:
+            offset = self.offsets[row] = len(self.data)
+            self.data += encoded
+        else:
+            self.data[offset:offset + len(encoded)] = encoded
+        self.lengths[row] = len(encoded)
+
+
+class BookTable:
+    # Column-oriented storage for one shard's books: titles and ISBNs in
+    # string tables, authors interned, stock, price and version in typed
+    # arrays. Rows are appended in sequence order and never reordered;
+    # deleting a book only clears its id, and compacted() drops the dead rows.
+    def __init__(self):
+        self.rows: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = []
+        self.seqs = array("Q")
+        self.titles = StringTable()
+        self.isbns = StringTable()
+        self.authors = array("I")
+        self.author_names: List[str] = []
+        self.author_ids: Dict[str, int] = {}
+        self.stocks = array("i")
+        self.prices = array("f")
+        self.versions = array("Q")
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, book_id: str):
+        return book_id in self.rows
+
+    @property
+    def dead(self) -> int:
+        return len(self.ids) - len(self.rows)
+
+    def intern(self, author: str) -> int:
+        author_id = self.author_ids.get(author)
+        if author_id is None:
+            author_id = self.author_ids[author] = len(self.author_names)
+            self.author_names.append(author)
+        return author_id
+
+    def append(self, seq: int, book: bookstore_pb2.Book) -> int:
+        return self.append_row(seq, book.id, book.title, book.author, book.isbn, book.stock, book.price,
+                               max(book.version, 1))
+
+    def append_row(self, seq: int, book_id: str, title: str, author: str, isbn: str,
+                   stock: int, price: float, version: int) -> int:
+        row = len(self.ids)
+        self.rows[book_id] = row
+        self.ids.append(book_id)
+        self.seqs.append(seq)
+        self.titles.append(title)
+        self.isbns.append(isbn)
+        self.authors.append(self.intern(author))
+        self.stocks.append(stock)
+        self.prices.append(price)
+        self.versions.append(version)
+        return row
+
+    def update(self, row: int, book: bookstore_pb2.Book, replay: bool = False) -> None:
+        self.titles.set(row, book.title)
+        self.isbns.set(row, book.isbn)
+        self.authors[row] = self.intern(book.author)
+        self.stocks[row] = book.stock
+        self.prices[row] = book.price
+        # A replayed write restores the version it was logged with: replay
+        # can revisit writes the snapshot already holds, so counting them
+        # again would inflate it. Entries logged without one count as a write.
+        if replay and book.version:
+            self.versions[row] = book.version
+        else:
+            self.versions[row] += 1
+
+    def delete(self, row: int) -> None:
+        del self.rows[self.ids[row]]
+        self.ids[row] = None
+
+    def title(self, row: int) -> str:
+        return self.titles.get(row)
+
+    def author(self, row: int) -> str:
+        return self.author_names[self.authors[row]]
+
+    def book(self, row: int) -> bookstore_pb2.Book:
+        return bookstore_pb2.Book(
+            id=self.ids[row],
+            title=self.titles.get(row),
+            author=self.author_names[self.authors[row]],
+            isbn=self.isbns.get(row),
+            stock=self.stocks[row],
+            price=self.prices[row],
+            version=self.versions[row]
+        )
+
+    def live_rows(self, start: int = 0):
+        ids = self.ids
+        return (row for row in range(start, len(ids)) if ids[row] is not None)
+
+    def compacted(self) -> Tuple["BookTable", array]:
+        # A copy without dead rows (or stale string bytes and authors) and the
+        # old-row to new-row mapping, -1 for dropped rows.
+        table = BookTable()
+        mapping = array("i", [-1]) * len(self.ids)
+        for row in self.live_rows():
+            mapping[row] = table.append_row(
+                self.seqs[row], self.ids[row], self.titles.get(row), self.author(row),
+                self.isbns.get(row), self.stocks[row], self.prices[row], self.versions[row]
+            )
+        return table, mapping
@@ -0,0 +1,258 @@
+import bisect
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class TrigramIndex:
+    # Every 1-, 2- and 3-gram of the lowercased fields is indexed. Posting
+    # lists are compact arrays of row numbers that are only ever appended to:
+    # rows deleted or rewritten since the last rebuild stay in the lists, and
+    # the caller filters them out. Queries of up to three characters are
+    # answered straight from a posting list; longer queries intersect the
+    # posting lists of their trigrams and must be verified against the text.
+    N = 3
+    # Stop intersecting once the next posting list is this many times larger
+    # than the candidate set; verifying the candidates is cheaper.
+    INTERSECT_RATIO = 8
+
+    def __init__(self):
+        self.postings: Dict[str, array] = {}
+        # Total length of the posting lists, kept as they grow so stats
+        # need not sum them.
+        self.entries = 0
+
+    @classmethod
+    def grams(cls, *fields: str) -> Set[str]:
+        return {
+            text[i:i + size]
+            for text in fields
+            for size in range(1, cls.N + 1)
+            for i in range(len(text) - size + 1)
+        }
+
+    def add(self, row: int, *fields: str) -> None:
+        postings = self.postings
+        grams = self.grams(*(field.lower() for field in fields))
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                postings[gram] = array("I", (row,))
+            else:
+                posting.append(row)
+        self.entries += len(grams)
+
+    def candidates(self, query: str) -> Tuple[Iterable[int], bool]:
+        # Rows that may contain the lowercased `query`, and whether a live,
+        # unchanged row among them is a guaranteed match.
+        if len(query) <= self.N:
+            return self.postings.get(query, ()), True
+
+        lists = []
+        for i in range(len(query) - self.N + 1):
+            posting = self.postings.get(query[i:i + self.N])
+            if not posting:
+                return (), True
+            lists.append(posting)
+        lists.sort(key=len)
+
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            if not candidates or len(posting) > self.INTERSECT_RATIO * len(candidates):
+                break
+            candidates.intersection_update(posting)
+        return sorted(candidates), False
+
+    def remapped(self, mapping: array, skip: Set[int]) -> "TrigramIndex":
+        # A copy with row numbers translated through `mapping`, dropping rows
+        # mapped to -1 and rows in `skip`.
+        index = TrigramIndex()
+        for gram, posting in self.postings.items():
+            rows = array("I", (mapping[row] for row in posting if mapping[row] >= 0 and row not in skip))
+            if rows:
+                index.postings[gram] = rows
+                index.entries += len(rows)
+        return index
+
+
+class TermIndex:
+    # The whole words of one field, for relevance ranking. Each row's words
+    # are stored when it is indexed, as ids into `words`, in one array with a
+    # (start, end) span per row, so a row's length and word frequencies are
+    # read without its text. `frequencies` counts the rows holding each word
+    # and, with the number of rows and words indexed, gives BM25's document
+    # frequencies and average field length. Append-only like TrigramIndex: a
+    # rewritten row gets a new span, and until the next rebuild the
+    # statistics still count rows deleted or rewritten since, which only
+    # blurs the weights slightly.
+    TOKEN = re.compile(r"\w+")
+
+    def __init__(self):
+        self.words: Dict[str, int] = {}
+        self.frequencies = array("I")
+        self.row_words = array("I")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.documents = 0
+        self.length = 0
+
+    @classmethod
+    def tokens(cls, text: str) -> List[str]:
+        return cls.TOKEN.findall(text.lower())
+
+    def add(self, row: int, text: str) -> None:
+        # Rows are added in order; a row already present is rewritten.
+        tokens = self.tokens(text)
+        words = self.words
+        row_words = [words.get(token) for token in tokens]
+        if None in row_words:
+            for i, token in enumerate(tokens):
+                if row_words[i] is None:
+                    word = words.get(token)
+                    if word is None:
+                        word = words[token] = len(self.frequencies)
+                        self.frequencies.append(0)
+                    row_words[i] = word
+        start = len(self.row_words)
+        self.row_words.extend(row_words)
+        for word in set(row_words):
+            self.frequencies[word] += 1
+        if row < len(self.starts):
+            self.starts[row] = start
+            self.ends[row] = len(self.row_words)
+        else:
+            self.starts.append(start)
+            self.ends.append(len(self.row_words))
+        self.documents += 1
+        self.length += len(tokens)
+
+    def word(self, term: str) -> Optional[int]:
+        return self.words.get(term)
+
+    def frequency(self, term: str) -> int:
+        word = self.words.get(term)
+        return self.frequencies[word] if word is not None else 0
+
+    def row(self, row: int) -> array:
+        # The word ids of `row`, in order.
+        return self.row_words[self.starts[row]:self.ends[row]]
+
+
+class UniqueIndex:
+    # Maps a unique key to the id of the book that holds it. Books sharing a
+    # key can live in different shards, so the index has its own lock;
+    # callers claim and release keys while holding the owning book's shard
+    # write lock, which keeps each book's entries in step with its row.
+    def __init__(self):
+        self.owners: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.owners)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.owners.get(key)
+
+    def claim(self, key: str, owner: str, replace: bool = False) -> Optional[str]:
+        # Returns the other book holding `key`, or None once `owner` holds it.
+        with self.lock:
+            current = self.owners.get(key)
+            if current is not None and current != owner and not replace:
+                return current
+            self.owners[key] = owner
+            return None
+
+    def release(self, key: str, owner: str) -> None:
+        with self.lock:
+            if self.owners.get(key) == owner:
+                del self.owners[key]
+
+
+class RangeIndex:
+    # (value, seq) pairs kept sorted for range scans, split into chunks of at
+    # most 2 * CHUNK entries so an insert or delete only shifts one chunk.
+    # Keyed by sequence number rather than row, so compaction leaves it alone.
+    CHUNK = 512
+
+    def __init__(self, typecode: str):
+        self.typecode = typecode
+        self.keys: List[array] = []
+        self.seqs: List[array] = []
+        # Largest (key, seq) of each chunk.
+        self.maxes: List[Tuple[float, int]] = []
+
+    def __len__(self):
+        return sum(len(keys) for keys in self.keys)
+
+    def locate(self, chunk: int, key: float, seq: int) -> int:
+        # Position of the first entry of `chunk` not below (key, seq).
+        keys = self.keys[chunk]
+        lo = bisect.bisect_left(keys, key)
+        hi = bisect.bisect_right(keys, key, lo)
+        return bisect.bisect_left(self.seqs[chunk], seq, lo, hi)
+
+    def insert(self, key: float, seq: int) -> None:
+        if not self.maxes:
+            self.keys.append(array(self.typecode, (key,)))
+            self.seqs.append(array("Q", (seq,)))
+            self.maxes.append((key, seq))
+            return
+        chunk = min(bisect.bisect_left(self.maxes, (key, seq)), len(self.maxes) - 1)
+        keys, seqs = self.keys[chunk], self.seqs[chunk]
+        position = self.locate(chunk, key, seq)
+        keys.insert(position, key)
+        seqs.insert(position, seq)
+        self.maxes[chunk] = (keys[-1], seqs[-1])
+        if len(keys) > 2 * self.CHUNK:
+            self.keys[chunk + 1:chunk + 1] = [keys[self.CHUNK:]]
+            self.seqs[chunk + 1:chunk + 1] = [seqs[self.CHUNK:]]
+            del keys[self.CHUNK:], seqs[self.CHUNK:]
+            self.maxes[chunk:chunk + 1] = [(keys[-1], seqs[-1]), self.maxes[chunk]]
+
+    def remove(self, key: float, seq: int) -> None:
+        chunk = bisect.bisect_left(self.maxes, (key, seq))
+        if chunk == len(self.maxes):
+            return
+        keys, seqs = self.keys[chunk], self.seqs[chunk]
+        position = self.locate(chunk, key, seq)
+        if position == len(keys) or keys[position] != key or seqs[position] != seq:
+            return
+        del keys[position], seqs[position]
+        if keys:
+            self.maxes[chunk] = (keys[-1], seqs[-1])
+        else:
+            del self.keys[chunk], self.seqs[chunk], self.maxes[chunk]
+
+    def scan(self, low: Tuple[float, float], high: Tuple[float, float], descending: bool = False):
+        # (key, seq) pairs between `low` and `high` inclusive, in order.
+        if descending:
+            chunk = bisect.bisect_left(self.maxes, high)
+            if chunk == len(self.maxes):
+                chunk -= 1
+                position = len(self.keys[chunk]) - 1 if chunk >= 0 else -1
+            else:
+                position = self.locate(chunk, *high)
+                if (self.keys[chunk][position], self.seqs[chunk][position]) > high:
+                    position -= 1
+            while chunk >= 0:
+                keys, seqs = self.keys[chunk], self.seqs[chunk]
+                for i in range(position, -1, -1):
+                    entry = (keys[i], seqs[i])
+                    if entry < low:
+                        return
+                    yield entry
+                chunk -= 1
+                position = len(self.keys[chunk]) - 1 if chunk >= 0 else -1
+        else:
+            chunk = bisect.bisect_left(self.maxes, low)
+            position = self.locate(chunk, *low) if chunk < len(self.maxes) else 0
+            while chunk < len(self.maxes):
+                keys, seqs = self.keys[chunk], self.seqs[chunk]
+                for i in range(position, len(keys)):
+                    entry = (keys[i], seqs[i])
+                    if entry > high:
+                        return
+                    yield entry
+                chunk += 1
+                position = 0
@@ -0,0 +1,314 @@
+import argparse
+import contextlib
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+import grpc
+import bookstore_pb2
+from bookstore_benchmark import QUERIES, random_book
+from bookstore_metrics import Metrics
+from bookstore_sdk import ChannelPool
+from bookstore_server import BookStore, BookStoreServicer, DEFAULT_SHARDS, build_server
+
+DEFAULT_MIX = "AddBook=10,SearchBook=30,UpdateStock=20,ListBooks=15,DeleteBook=10," \
+              "SubscribeToNewBooks=5,BulkAddBooks=2,Chat=3,StreamBooks=5"
+SEED_BATCH = 1000
+BULK_ADD_SIZE = 100
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        method, _, weight = part.partition("=")
+        method = method.strip()
+        if method not in OPERATIONS:
+            raise ValueError(f"Unknown method in mix: {method!r}")
+        mix[method] = float(weight or 1)
+    return mix
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    if not latencies:
+        return 0.0
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+def add_request(book: bookstore_pb2.Book) -> bookstore_pb2.AddBookRequest:
+    return bookstore_pb2.AddBookRequest(
+        title=book.title, author=book.author, isbn=book.isbn, stock=book.stock, price=book.price
+    )
+
+
+class Worker:
+    # Per-thread client state: its own RNG, the ids of books it added (so
+    # deletes keep the catalog size steady) and a ListBooks cursor.
+    def __init__(self, index: int, pool: ChannelPool, known_ids: List[str], seed: int):
+        self.index = index
+        self.pool = pool
+        self.known_ids = known_ids
+        self.rng = random.Random(seed + index)
+        self.own_ids: List[str] = []
+        self.page_token = ""
+        self.chats = 0
+
+    def run(self, method: str) -> None:
+        OPERATIONS[method](self, self.pool.stub())
+
+    def add_book(self, stub) -> None:
+        response = stub.AddBook(add_request(random_book(self.rng)))
+        if response.success:
+            self.own_ids.append(response.book.id)
+
+    def search_book(self, stub) -> None:
+        stub.SearchBook(bookstore_pb2.SearchBookRequest(query=self.rng.choice(QUERIES)))
+
+    def update_stock(self, stub) -> None:
+        book_id = self.rng.choice(self.own_ids or self.known_ids)
+        stub.UpdateStock(bookstore_pb2.UpdateStockRequest(book_id=book_id, new_stock=self.rng.randint(0, 100)))
+
+    def adjust_stock(self, stub) -> None:
+        # Everyone buying from the same few titles.
+        book_id = self.known_ids[self.rng.randrange(min(len(self.known_ids), 4))]
+        stub.AdjustStock(bookstore_pb2.AdjustStockRequest(book_id=book_id, delta=self.rng.choice([-1, -1, -1, 3])))
+
+    def list_books(self, stub) -> None:
+        response = stub.ListBooks(bookstore_pb2.ListBooksRequest(page_size=25, page_token=self.page_token))
+        self.page_token = response.next_page_token
+
+    def delete_book(self, stub) -> None:
+        if not self.own_ids:
+            self.add_book(stub)
+        book_id = self.own_ids.pop() if self.own_ids else ""
+        stub.DeleteBook(bookstore_pb2.DeleteBookRequest(book_id=book_id))
+
+    def subscribe(self, stub) -> None:
+        # A zero-length subscription: measures stream setup and teardown.
+        for _ in stub.SubscribeToNewBooks(bookstore_pb2.SubscribeRequest(duration_seconds=0)):
+            pass
+
+    def bulk_add_books(self, stub) -> None:
+        stub.BulkAddBooks(add_request(random_book(self.rng)) for _ in range(BULK_ADD_SIZE))
+
+    def chat(self, stub) -> None:
+        # Join, post one message and wait for its echo.
+        self.chats += 1
+        user = f"load-{self.index}"
+        text = f"message {self.chats}"
+        sent = threading.Event()
+
+        def requests():
+            yield bookstore_pb2.ChatMessage(user=user, message=text, timestamp=int(time.time()))
+            sent.wait()
+
+        call = stub.Chat(requests())
+        try:
+            for message in call:
+                if message.user == user and message.message == text:
+                    break
+        finally:
+            sent.set()
+            call.cancel()
+
+    def query_books(self, stub) -> None:
+        low = self.rng.uniform(5, 50)
+        stub.QueryBooks(bookstore_pb2.QueryBooksRequest(
+            min_price=low, max_price=low + 10, min_stock=1, limit=25,
+            sort_by=self.rng.choice([bookstore_pb2.QueryBooksRequest.PRICE, bookstore_pb2.QueryBooksRequest.STOCK])
+        ))
+
+    def stream_books(self, stub) -> None:
+        for _ in stub.StreamBooks(bookstore_pb2.StreamBooksRequest(chunk_size=500, min_stock=95)):
+            pass
+
+    def chat_history(self, stub) -> None:
+        for _ in stub.GetChatHistory(bookstore_pb2.ChatHistoryRequest(last_n=20)):
+            pass
+
+
+OPERATIONS = {
+    "AddBook": Worker.add_book,
+    "SearchBook": Worker.search_book,
+    "UpdateStock": Worker.update_stock,
+    "ListBooks": Worker.list_books,
+    "DeleteBook": Worker.delete_book,
+    "SubscribeToNewBooks": Worker.subscribe,
+    "BulkAddBooks": Worker.bulk_add_books,
+    "Chat": Worker.chat,
+    "StreamBooks": Worker.stream_books,
+    "QueryBooks": Worker.query_books,
+    "AdjustStock": Worker.adjust_stock,
+    "GetChatHistory": Worker.chat_history,
+}
+
+
+def seed_catalog(pool: ChannelPool, size: int, rng: random.Random) -> None:
+    # Tops the catalog up to `size` books over BulkIngest.
+    missing = size - catalog_size(pool)
+    if missing <= 0:
+        return
+
+    def requests():
+        for sequence in range(1, missing + 1):
+            yield bookstore_pb2.BulkIngestRequest(
+                sequence=sequence,
+                book=add_request(random_book(rng)),
+                flush=sequence % SEED_BATCH == 0
+            )
+
+    for _ in pool.stub().BulkIngest(requests()):
+        pass
+
+
+def catalog_size(pool: ChannelPool) -> int:
+    return pool.stub().ListBooks(bookstore_pb2.ListBooksRequest(page_size=1)).total_books
+
+
+def sample_ids(pool: ChannelPool, count: int) -> List[str]:
+    response = pool.stub().ListBooks(bookstore_pb2.ListBooksRequest(page_size=count))
+    return [book.id for book in response.books]
+
+
+def run_load(pool: ChannelPool, mix: Dict[str, float], concurrency: int, duration: float,
+             qps: float, known_ids: List[str], seed: int) -> dict:
+    # Closed loop when qps is 0: every worker issues its next call as soon as
+    # the previous one returns. Open loop otherwise: calls are scheduled at a
+    # fixed rate and latency is measured from the scheduled start, so a
+    # server that falls behind shows up in the tail instead of silently
+    # lowering the offered load.
+    methods = list(mix)
+    weights = [mix[method] for method in methods]
+    latencies: Dict[str, List[float]] = {method: [] for method in methods}
+    errors: Dict[str, int] = {method: 0 for method in methods}
+    lock = threading.Lock()
+    ticket = itertools.count()
+    start = time.perf_counter() + 0.1
+    stop = start + duration
+
+    def drive(worker: Worker):
+        local_latencies = {method: [] for method in methods}
+        local_errors = {method: 0 for method in methods}
+        while True:
+            if qps > 0:
+                with lock:
+                    scheduled = start + next(ticket) / qps
+                if scheduled >= stop:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= stop:
+                    break
+            method = worker.rng.choices(methods, weights)[0]
+            try:
+                worker.run(method)
+            except grpc.RpcError:
+                local_errors[method] += 1
+                continue
+            local_latencies[method].append(time.perf_counter() - scheduled)
+        with lock:
+            for method in methods:
+                latencies[method].extend(local_latencies[method])
+                errors[method] += local_errors[method]
+
+    workers = [Worker(i, pool, known_ids, seed) for i in range(concurrency)]
+    threads = [threading.Thread(target=drive, args=(worker,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = max(time.perf_counter(), stop) - start
+
+    report = {}
+    for method in methods:
+        samples = sorted(latencies[method])
+        report[method] = {
+            "calls": len(samples),
+            "errors": errors[method],
+            "throughput": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            "p999_ms": round(percentile(samples, 0.999) * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3) if samples else 0.0,
+        }
+    total = sum(len(samples) for samples in latencies.values())
+    return {"elapsed_s": round(elapsed, 3), "throughput": round(total / elapsed, 1), "methods": report}
+
+
+def start_server(workers: int, shards: int):
+    # Built like the shipped server, with its interceptors and encoded
+    # responses, on a port picked by the OS.
+    metrics = Metrics()
+    server = build_server(BookStoreServicer(BookStore(shards), metrics), metrics, workers)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, f"localhost:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end BookStore load generator")
+    parser.add_argument("--target", help="server to load; default starts one in-process")
+    parser.add_argument("--server-workers", type=int, default=64, help="thread pool of the in-process server")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS, help="shards of the in-process server")
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated Method=weight pairs")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--qps", type=float, default=0, help="offered load for open-loop runs; 0 runs closed loop")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per catalog size")
+    parser.add_argument("--channels", type=int, default=4, help="client connections")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    server: Optional[grpc.Server] = None
+    target = args.target
+    if target is None:
+        # Client and server then share one interpreter and its GIL; use
+        # --target against a separate server process for absolute numbers.
+        server, target = start_server(args.server_workers, args.shards)
+    pool = ChannelPool(target, args.channels)
+    rng = random.Random(args.seed)
+
+    results = []
+    # The server logs with print(); keep stdout for the JSON report.
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            for size in sorted(args.catalog_sizes):
+                began = time.perf_counter()
+                seed_catalog(pool, size, rng)
+                seeded = time.perf_counter() - began
+                result = run_load(pool, mix, args.concurrency, args.duration, args.qps,
+                                  sample_ids(pool, 1000), args.seed)
+                # AddBook and BulkAddBooks grow the catalog during the run.
+                result.update({"catalog_size": size, "catalog_size_after": catalog_size(pool),
+                               "seed_s": round(seeded, 3)})
+                results.append(result)
+        finally:
+            pool.close()
+            if server is not None:
+                server.stop(None)
+
+    report = json.dumps({
+        "target": args.target or "in-process",
+        "mode": "open" if args.qps > 0 else "closed",
+        "qps": args.qps,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "mix": mix,
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
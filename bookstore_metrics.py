@@ -0,0 +1,339 @@
+import bisect
+import threading
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+import grpc
+import bookstore_pb2
+
+# Upper bounds in seconds, 100us to 10s.
+LATENCY_BUCKETS = [
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+]
+
+
+class ThreadStats:
+    # Counters written by exactly one thread. Readers copy the dicts (an
+    # atomic operation under the GIL) and sum across threads, so recording
+    # never takes a lock.
+    def __init__(self):
+        self.started: Dict[str, int] = {}
+        self.finished: Dict[str, int] = {}
+        self.codes: Dict[tuple, int] = {}
+        self.latency: Dict[str, List[int]] = {}
+        self.latency_sum: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+
+class Metrics:
+    def __init__(self):
+        self.local = threading.local()
+        self.threads: List[ThreadStats] = []
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.executor: Optional["InstrumentedExecutor"] = None
+
+    def stats(self) -> ThreadStats:
+        stats = getattr(self.local, "stats", None)
+        if stats is None:
+            stats = self.local.stats = ThreadStats()
+            with self.lock:
+                self.threads.append(stats)
+        return stats
+
+    def start(self, method: str) -> None:
+        started = self.stats().started
+        started[method] = started.get(method, 0) + 1
+
+    def count(self, name: str) -> None:
+        counters = self.stats().counters
+        counters[name] = counters.get(name, 0) + 1
+
+    def counter_totals(self) -> Dict[str, int]:
+        with self.lock:
+            threads = list(self.threads)
+        totals: Dict[str, int] = {}
+        for stats in threads:
+            for name, count in stats.counters.copy().items():
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def finish(self, method: str, code: grpc.StatusCode, seconds: float) -> None:
+        stats = self.stats()
+        stats.finished[method] = stats.finished.get(method, 0) + 1
+        key = (method, code.name)
+        stats.codes[key] = stats.codes.get(key, 0) + 1
+        buckets = stats.latency.get(method)
+        if buckets is None:
+            buckets = stats.latency[method] = [0] * (len(LATENCY_BUCKETS) + 1)
+        buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        stats.latency_sum[method] = stats.latency_sum.get(method, 0.0) + seconds
+
+    def method_stats(self) -> List[bookstore_pb2.MethodStats]:
+        with self.lock:
+            threads = list(self.threads)
+        started: Dict[str, int] = {}
+        finished: Dict[str, int] = {}
+        codes: Dict[str, Dict[str, int]] = {}
+        latency: Dict[str, List[int]] = {}
+        latency_sum: Dict[str, float] = {}
+        for stats in threads:
+            for method, count in stats.started.copy().items():
+                started[method] = started.get(method, 0) + count
+            for method, count in stats.finished.copy().items():
+                finished[method] = finished.get(method, 0) + count
+            for (method, code), count in stats.codes.copy().items():
+                per_method = codes.setdefault(method, {})
+                per_method[code] = per_method.get(code, 0) + count
+            for method, buckets in stats.latency.copy().items():
+                total = latency.setdefault(method, [0] * len(buckets))
+                for i, count in enumerate(list(buckets)):
+                    total[i] += count
+            for method, seconds in stats.latency_sum.copy().items():
+                latency_sum[method] = latency_sum.get(method, 0.0) + seconds
+
+        return [
+            bookstore_pb2.MethodStats(
+                method=method,
+                calls=finished.get(method, 0),
+                in_flight=started[method] - finished.get(method, 0),
+                status_codes=codes.get(method, {}),
+                latency_bounds=LATENCY_BUCKETS,
+                latency_counts=latency.get(method, [0] * (len(LATENCY_BUCKETS) + 1)),
+                latency_sum_seconds=latency_sum.get(method, 0.0)
+            )
+            for method in sorted(started)
+        ]
+
+    def collect(self, store=None) -> bookstore_pb2.ServerStats:
+        stats = bookstore_pb2.ServerStats(
+            methods=self.method_stats(),
+            uptime_seconds=time.monotonic() - self.started_at
+        )
+        if self.executor is not None:
+            stats.executor_workers = self.executor._max_workers
+            stats.executor_busy, stats.executor_queued = self.executor.load()
+        if store is not None:
+            collect_store_stats(store, stats)
+        return stats
+
+
+def collect_store_stats(store, stats: bookstore_pb2.ServerStats) -> None:
+    stats.catalog_size = store.count()
+    for shard in store.shards:
+        with shard.lock.read:
+            stats.index_terms += len(shard.search_index.postings)
+            stats.index_postings += shard.search_index.entries
+
+    with store.broker.lock:
+        subscriptions = list(store.broker.subscriptions)
+    depths = [len(subscription) for subscription in subscriptions]
+    stats.subscribers = len(depths)
+    stats.subscriber_queued = sum(depths)
+    stats.max_subscriber_queue = max(depths, default=0)
+
+    with store.chat_lock:
+        chat_queues = list(store.active_chat_clients.values())
+    stats.chat_clients = len(chat_queues)
+    stats.chat_queued = sum(client_queue.qsize() for client_queue in chat_queues)
+    stats.chat_history_messages = len(store.chat_history)
+    stats.chat_history_bytes = store.chat_history.bytes
+    stats.change_log_events = len(store.changes)
+    stats.last_change_sequence = store.changes.last_sequence
+
+    cache = store.search_cache
+    stats.search_cache_hits = cache.hits
+    stats.search_cache_refreshes = cache.refreshes
+    stats.search_cache_misses = cache.misses
+    stats.search_cache_evictions = cache.evictions
+    stats.search_cache_entries = len(cache)
+    stats.search_cache_bytes = cache.bytes
+    stats.isbn_index_entries = len(store.isbns)
+
+
+class InstrumentedExecutor(futures.ThreadPoolExecutor):
+    # Counts submitted, started and finished work items per thread, using the
+    # same lock-free counters as the interceptor, to report how many workers
+    # are busy and how much work is queued behind them.
+    def __init__(self, max_workers: int, metrics: Metrics):
+        super().__init__(max_workers=max_workers)
+        self.metrics = metrics
+        metrics.executor = self
+
+    def submit(self, fn, *args, **kwargs):
+        self.metrics.count("executor.submitted")
+
+        def run():
+            self.metrics.count("executor.started")
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.metrics.count("executor.finished")
+
+        return super().submit(run)
+
+    def load(self) -> tuple[int, int]:
+        totals = self.metrics.counter_totals()
+        started = totals.get("executor.started", 0)
+        busy = started - totals.get("executor.finished", 0)
+        queued = totals.get("executor.submitted", 0) - started
+        return busy, queued
+
+
+def method_name(handler_call_details) -> str:
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = method_name(handler_call_details)
+        if handler.unary_unary:
+            return handler._replace(unary_unary=self.wrap_unary(method, handler.unary_unary))
+        if handler.stream_unary:
+            return handler._replace(stream_unary=self.wrap_unary(method, handler.stream_unary))
+        if handler.unary_stream:
+            return handler._replace(unary_stream=self.wrap_stream(method, handler.unary_stream))
+        return handler._replace(stream_stream=self.wrap_stream(method, handler.stream_stream))
+
+    def wrap_unary(self, method: str, behavior):
+        metrics = self.metrics
+
+        def wrapper(request, context):
+            metrics.start(method)
+            start = time.perf_counter()
+            code = grpc.StatusCode.CANCELLED
+            try:
+                response = behavior(request, context)
+                code = context.code() or grpc.StatusCode.OK
+                return response
+            except Exception:
+                code = context.code() or grpc.StatusCode.UNKNOWN
+                raise
+            finally:
+                metrics.finish(method, code, time.perf_counter() - start)
+
+        return wrapper
+
+    def wrap_stream(self, method: str, behavior):
+        metrics = self.metrics
+
+        def wrapper(request, context):
+            metrics.start(method)
+            start = time.perf_counter()
+            code = grpc.StatusCode.CANCELLED
+            try:
+                yield from behavior(request, context)
+                code = context.code() or (grpc.StatusCode.OK if context.is_active() else grpc.StatusCode.CANCELLED)
+            except Exception:
+                code = context.code() or grpc.StatusCode.UNKNOWN
+                raise
+            finally:
+                metrics.finish(method, code, time.perf_counter() - start)
+
+        return wrapper
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = method_name(handler_call_details)
+        if handler.unary_unary:
+            return handler._replace(unary_unary=self.wrap_unary(method, handler.unary_unary))
+        if handler.stream_unary:
+            return handler._replace(stream_unary=self.wrap_unary(method, handler.stream_unary))
+        if handler.unary_stream:
+            return handler._replace(unary_stream=self.wrap_stream(method, handler.unary_stream))
+        return handler._replace(stream_stream=self.wrap_stream(method, handler.stream_stream))
+
+    def wrap_unary(self, method: str, behavior):
+        metrics = self.metrics
+
+        async def wrapper(request, context):
+            metrics.start(method)
+            start = time.perf_counter()
+            code = grpc.StatusCode.CANCELLED
+            try:
+                response = await behavior(request, context)
+                code = context.code() or grpc.StatusCode.OK
+                return response
+            except Exception:
+                code = context.code() or grpc.StatusCode.UNKNOWN
+                raise
+            finally:
+                metrics.finish(method, code, time.perf_counter() - start)
+
+        return wrapper
+
+    def wrap_stream(self, method: str, behavior):
+        metrics = self.metrics
+
+        async def wrapper(request, context):
+            metrics.start(method)
+            start = time.perf_counter()
+            code = grpc.StatusCode.CANCELLED
+            try:
+                async for response in behavior(request, context):
+                    yield response
+                code = context.code() or (grpc.StatusCode.CANCELLED if context.cancelled() else grpc.StatusCode.OK)
+            except Exception:
+                code = context.code() or grpc.StatusCode.UNKNOWN
+                raise
+            finally:
+                metrics.finish(method, code, time.perf_counter() - start)
+
+        return wrapper
+
+
+def render_text(stats: bookstore_pb2.ServerStats) -> str:
+    # Prometheus text exposition format.
+    lines = []
+    for method in stats.methods:
+        label = f'method="{method.method}"'
+        lines.append(f"bookstore_rpc_in_flight{{{label}}} {method.in_flight}")
+        for code, count in sorted(method.status_codes.items()):
+            lines.append(f'bookstore_rpc_total{{{label},code="{code}"}} {count}')
+        cumulative = 0
+        for bound, count in zip(list(method.latency_bounds) + ["+Inf"], method.latency_counts):
+            cumulative += count
+            lines.append(f'bookstore_rpc_latency_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f"bookstore_rpc_latency_seconds_sum{{{label}}} {method.latency_sum_seconds}")
+        lines.append(f"bookstore_rpc_latency_seconds_count{{{label}}} {cumulative}")
+    for field in bookstore_pb2.ServerStats.DESCRIPTOR.fields:
+        if field.name != "methods":
+            lines.append(f"bookstore_{field.name} {getattr(stats, field.name)}")
+    return "\n".join(lines) + "\n"
+
+
+def serve_text(port: int, collect) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_text(collect()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Metrics available on http://localhost:{port}/metrics")
+    return server
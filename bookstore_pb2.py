@@ -22,43 +22,110 @@ _runtime_version.ValidateProtobufRuntimeVersion(
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import field_mask_pb2 as google_dot_protobuf_dot_field__mask__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0f\x62ookstore.proto\x12\tbookstore\"]\n\x04\x42ook\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\x0c\n\x04isbn\x18\x04 \x01(\t\x12\r\n\x05stock\x18\x05 \x01(\x05\x12\r\n\x05price\x18\x06 \x01(\x02\"[\n\x0e\x41\x64\x64\x42ookRequest\x12\r\n\x05title\x18\x01 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x02 \x01(\t\x12\x0c\n\x04isbn\x18\x03 \x01(\t\x12\r\n\x05stock\x18\x04 \x01(\x05\x12\r\n\x05price\x18\x05 \x01(\x02\"R\n\x0f\x41\x64\x64\x42ookResponse\x12\x1d\n\x04\x62ook\x18\x01 \x01(\x0b\x32\x0f.bookstore.Book\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\x0f\n\x07message\x18\x03 \x01(\t\"\"\n\x11SearchBookRequest\x12\r\n\x05query\x18\x01 \x01(\t\"4\n\x12SearchBookResponse\x12\x1e\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\x0f.bookstore.Book\"8\n\x12UpdateStockRequest\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\x12\x11\n\tnew_stock\x18\x02 \x01(\x05\"7\n\x13UpdateStockResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"3\n\x10ListBooksRequest\x12\x0c\n\x04page\x18\x01 \x01(\x05\x12\x11\n\tpage_size\x18\x02 \x01(\x05\"]\n\x11ListBooksResponse\x12\x1e\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\x0f.bookstore.Book\x12\x13\n\x0btotal_books\x18\x02 \x01(\x05\x12\x13\n\x0btotal_pages\x18\x03 \x01(\x05\"$\n\x11\x44\x65leteBookRequest\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\"6\n\x12\x44\x65leteBookResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\",\n\x10SubscribeRequest\x12\x18\n\x10\x64uration_seconds\x18\x01 \x01(\x05\"N\n\x0f\x42ulkAddResponse\x12\x19\n\x11total_books_added\x18\x01 \x01(\x05\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\x0f\n\x07message\x18\x03 \x01(\t\"?\n\x0b\x43hatMessage\x12\x0c\n\x04user\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x11\n\ttimestamp\x18\x03 \x01(\x03\x32\xd5\x04\n\tBookStore\x12\x42\n\x07\x41\x64\x64\x42ook\x12\x19.bookstore.AddBookRequest\x1a\x1a.bookstore.AddBookResponse\"\x00\x12K\n\nSearchBook\x12\x1c.bookstore.SearchBookRequest\x1a\x1d.bookstore.SearchBookResponse\"\x00\x12N\n\x0bUpdateStock\x12\x1d.bookstore.UpdateStockRequest\x1a\x1e.bookstore.UpdateStockResponse\"\x00\x12H\n\tListBooks\x12\x1b.bookstore.ListBooksRequest\x1a\x1c.bookstore.ListBooksResponse\"\x00\x12K\n\nDeleteBook\x12\x1c.bookstore.DeleteBookRequest\x1a\x1d.bookstore.DeleteBookResponse\"\x00\x12G\n\x13SubscribeToNewBooks\x12\x1b.bookstore.SubscribeRequest\x1a\x0f.bookstore.Book\"\x00\x30\x01\x12I\n\x0c\x42ulkAddBooks\x12\x19.bookstore.AddBookRequest\x1a\x1a.bookstore.BulkAddResponse\"\x00(\x01\x12<\n\x04\x43hat\x12\x16.bookstore.ChatMessage\x1a\x16.bookstore.ChatMessage\"\x00(\x01\x30\x01\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0f\x62ookstore.proto\x12\tbookstore\x1a google/protobuf/field_mask.proto\"n\n\x04\x42ook\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\x0c\n\x04isbn\x18\x04 \x01(\t\x12\r\n\x05stock\x18\x05 \x01(\x05\x12\r\n\x05price\x18\x06 \x01(\x02\x12\x0f\n\x07version\x18\x07 \x01(\x04\"\x84\x01\n\x0e\x41\x64\x64\x42ookRequest\x12\r\n\x05title\x18\x01 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x02 \x01(\t\x12\x0c\n\x04isbn\x18\x03 \x01(\t\x12\r\n\x05stock\x18\x04 \x01(\x05\x12\r\n\x05price\x18\x05 \x01(\x02\x12\n\n\x02id\x18\x06 \x01(\t\x12\x1b\n\x13skip_duplicate_isbn\x18\x07 \x01(\x08\"R\n\x0f\x41\x64\x64\x42ookResponse\x12\x1d\n\x04\x62ook\x18\x01 \x01(\x0b\x32\x0f.bookstore.Book\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\x0f\n\x07message\x18\x03 \x01(\t\"t\n\x11SearchBookRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12-\n\tread_mask\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\x12\r\n\x05limit\x18\x03 \x01(\x05\x12\x12\n\npage_token\x18\x04 \x01(\t\"]\n\x12SearchBookResponse\x12\x1e\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\x0f.bookstore.Book\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\x12\x0e\n\x06scores\x18\x03 \x03(\x01\"8\n\x12UpdateStockRequest\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\x12\x11\n\tnew_stock\x18\x02 \x01(\x05\"7\n\x13UpdateStockResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"v\n\x10ListBooksRequest\x12\x0c\n\x04page\x18\x01 \x01(\x05\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\x12-\n\tread_mask\x18\x04 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"v\n\x11ListBooksResponse\x12\x1e\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\x0f.bookstore.Book\x12\x13\n\x0btotal_books\x18\x02 \x01(\x05\x12\x13\n\x0btotal_pages\x18\x03 \x01(\x05\x12\x17\n\x0fnext_page_token\x18\x04 \x01(\t\"$\n\x11\x44\x65leteBookRequest\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\"6\n\x12\x44\x65leteBookResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\",\n\x10SubscribeRequest\x12\x18\n\x10\x64uration_seconds\x18\x01 \x01(\x05\"\x87\x01\n\x0f\x42ulkAddResponse\x12\x19\n\x11total_books_added\x18\x01 \x01(\x05\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\x0f\n\x07message\x18\x03 \x01(\t\x12\x1a\n\x12\x64uplicates_skipped\x18\x04 \x01(\x05\x12\x1b\n\x13\x64uplicates_rejected\x18\x05 \x01(\x05\"?\n\x0b\x43hatMessage\x12\x0c\n\x04user\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x11\n\ttimestamp\x18\x03 \x01(\x03\"P\n\x12\x43hatHistoryRequest\x12\x0e\n\x06last_n\x18\x01 \x01(\x05\x12\x17\n\x0fsince_timestamp\x18\x02 \x01(\x03\x12\x11\n\tpage_size\x18\x03 \x01(\x05\"]\n\x11\x42ulkIngestRequest\x12\x10\n\x08sequence\x18\x01 \x01(\x03\x12\'\n\x04\x62ook\x18\x02 \x01(\x0b\x32\x19.bookstore.AddBookRequest\x12\r\n\x05\x66lush\x18\x03 \x01(\x08\"4\n\x0f\x42ulkIngestError\x12\x10\n\x08sequence\x18\x01 \x01(\x03\x12\x0f\n\x07message\x18\x02 \x01(\t\"y\n\rBulkIngestAck\x12\x1a\n\x12\x63ommitted_sequence\x18\x01 \x01(\x03\x12\x10\n\x08\x61\x63\x63\x65pted\x18\x02 \x01(\x05\x12\x0e\n\x06\x66\x61iled\x18\x03 \x01(\x05\x12*\n\x06\x65rrors\x18\x04 \x03(\x0b\x32\x1a.bookstore.BulkIngestError\"\x80\x01\n\x12StreamBooksRequest\x12\x12\n\nchunk_size\x18\x01 \x01(\x05\x12\r\n\x05query\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\x11\n\tmin_stock\x18\x04 \x01(\x05\x12\x11\n\tmin_price\x18\x05 \x01(\x02\x12\x11\n\tmax_price\x18\x06 \x01(\x02\"+\n\tBookChunk\x12\x1e\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\x0f.bookstore.Book\"$\n\x14GetBookByIsbnRequest\x12\x0c\n\x04isbn\x18\x01 \x01(\t\"E\n\x15GetBookByIsbnResponse\x12\x1d\n\x04\x62ook\x18\x01 \x01(\x0b\x32\x0f.bookstore.Book\x12\r\n\x05\x66ound\x18\x02 \x01(\x08\"&\n\x15\x42\x61tchGetByIsbnRequest\x12\r\n\x05isbns\x18\x01 \x03(\t\"O\n\x16\x42\x61tchGetByIsbnResponse\x12\x1e\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\x0f.bookstore.Book\x12\x15\n\rmissing_isbns\x18\x02 \x03(\t\"\xc0\x02\n\x11QueryBooksRequest\x12\x11\n\tmin_price\x18\x01 \x01(\x02\x12\x11\n\tmax_price\x18\x02 \x01(\x02\x12\x11\n\tmin_stock\x18\x03 \x01(\x05\x12\x16\n\tmax_stock\x18\x04 \x01(\x05H\x00\x88\x01\x01\x12\x0e\n\x06\x61uthor\x18\x05 \x01(\t\x12\x35\n\x07sort_by\x18\x06 \x01(\x0e\x32$.bookstore.QueryBooksRequest.SortKey\x12\x12\n\ndescending\x18\x07 \x01(\x08\x12\r\n\x05limit\x18\x08 \x01(\x05\x12\x12\n\npage_token\x18\t \x01(\t\x12-\n\tread_mask\x18\n \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"\x1f\n\x07SortKey\x12\t\n\x05PRICE\x10\x00\x12\t\n\x05STOCK\x10\x01\x42\x0c\n\n_max_stock\"M\n\x12QueryBooksResponse\x12\x1e\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\x0f.bookstore.Book\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"!\n\x0eGetBookRequest\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\"?\n\x0fGetBookResponse\x12\x1d\n\x04\x62ook\x18\x01 \x01(\x0b\x32\x0f.bookstore.Book\x12\r\n\x05\x66ound\x18\x02 \x01(\x08\"(\n\x14\x42\x61tchGetBooksRequest\x12\x10\n\x08\x62ook_ids\x18\x01 \x03(\t\"L\n\x15\x42\x61tchGetBooksResponse\x12\x1e\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\x0f.bookstore.Book\x12\x13\n\x0bmissing_ids\x18\x02 \x03(\t\"?\n\nBookResult\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\x0f\n\x07message\x18\x03 \x01(\t\"I\n\x17\x42\x61tchUpdateStockRequest\x12.\n\x07updates\x18\x01 \x03(\x0b\x32\x1d.bookstore.UpdateStockRequest\"U\n\x18\x42\x61tchUpdateStockResponse\x12&\n\x07results\x18\x01 \x03(\x0b\x32\x15.bookstore.BookResult\x12\x11\n\tsucceeded\x18\x02 \x01(\x05\"+\n\x17\x42\x61tchDeleteBooksRequest\x12\x10\n\x08\x62ook_ids\x18\x01 \x03(\t\"U\n\x18\x42\x61tchDeleteBooksResponse\x12&\n\x07results\x18\x01 \x03(\x0b\x32\x15.bookstore.BookResult\x12\x11\n\tsucceeded\x18\x02 \x01(\x05\"G\n\x12\x41\x64justStockRequest\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x02 \x01(\x05\x12\x11\n\tmin_floor\x18\x03 \x01(\x05\"Y\n\x19\x43ompareAndSetStockRequest\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\x12\x18\n\x10\x65xpected_version\x18\x02 \x01(\x04\x12\x11\n\tnew_stock\x18\x03 \x01(\x05\"W\n\x13StockChangeResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\r\n\x05stock\x18\x03 \x01(\x05\x12\x0f\n\x07version\x18\x04 \x01(\x04\"\x14\n\x12ServerStatsRequest\"\xff\x01\n\x0bMethodStats\x12\x0e\n\x06method\x18\x01 \x01(\t\x12\r\n\x05\x63\x61lls\x18\x02 \x01(\x03\x12\x11\n\tin_flight\x18\x03 \x01(\x03\x12=\n\x0cstatus_codes\x18\x04 \x03(\x0b\x32\'.bookstore.MethodStats.StatusCodesEntry\x12\x16\n\x0elatency_bounds\x18\x05 \x03(\x01\x12\x16\n\x0elatency_counts\x18\x06 \x03(\x03\x12\x1b\n\x13latency_sum_seconds\x18\x07 \x01(\x01\x1a\x32\n\x10StatusCodesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x03:\x02\x38\x01\"\x96\x05\n\x0bServerStats\x12\'\n\x07methods\x18\x01 \x03(\x0b\x32\x16.bookstore.MethodStats\x12\x16\n\x0euptime_seconds\x18\x02 \x01(\x01\x12\x18\n\x10\x65xecutor_workers\x18\x03 \x01(\x05\x12\x15\n\rexecutor_busy\x18\x04 \x01(\x05\x12\x17\n\x0f\x65xecutor_queued\x18\x05 \x01(\x05\x12\x14\n\x0c\x63\x61talog_size\x18\x06 \x01(\x03\x12\x13\n\x0bindex_terms\x18\x07 \x01(\x03\x12\x16\n\x0eindex_postings\x18\x08 \x01(\x03\x12\x13\n\x0bsubscribers\x18\t \x01(\x05\x12\x19\n\x11subscriber_queued\x18\n \x01(\x03\x12\x1c\n\x14max_subscriber_queue\x18\x0b \x01(\x05\x12\x14\n\x0c\x63hat_clients\x18\x0c \x01(\x05\x12\x13\n\x0b\x63hat_queued\x18\r \x01(\x03\x12\x1d\n\x15\x63hat_history_messages\x18\x0e \x01(\x03\x12\x1a\n\x12\x63hat_history_bytes\x18\x0f \x01(\x03\x12\x19\n\x11search_cache_hits\x18\x10 \x01(\x03\x12\x1e\n\x16search_cache_refreshes\x18\x11 \x01(\x03\x12\x1b\n\x13search_cache_misses\x18\x12 \x01(\x03\x12\x1e\n\x16search_cache_evictions\x18\x13 \x01(\x03\x12\x1c\n\x14search_cache_entries\x18\x14 \x01(\x05\x12\x1a\n\x12search_cache_bytes\x18\x15 \x01(\x03\x12\x1a\n\x12isbn_index_entries\x18\x16 \x01(\x03\x12\x19\n\x11\x63hange_log_events\x18\x17 \x01(\x03\x12\x1c\n\x14last_change_sequence\x18\x18 \x01(\x04\",\n\x13WatchChangesRequest\x12\x15\n\rfrom_sequence\x18\x01 \x01(\x04\"\xb3\x01\n\x0b\x43hangeEvent\x12\x10\n\x08sequence\x18\x01 \x01(\x04\x12/\n\x04type\x18\x02 \x01(\x0e\x32!.bookstore.ChangeEvent.ChangeType\x12\x0f\n\x07\x62ook_id\x18\x03 \x01(\t\x12\x1d\n\x04\x62ook\x18\x04 \x01(\x0b\x32\x0f.bookstore.Book\"1\n\nChangeType\x12\t\n\x05\x41\x44\x44\x45\x44\x10\x00\x12\x0b\n\x07UPDATED\x10\x01\x12\x0b\n\x07\x44\x45LETED\x10\x02\x32\xcf\r\n\tBookStore\x12\x42\n\x07\x41\x64\x64\x42ook\x12\x19.bookstore.AddBookRequest\x1a\x1a.bookstore.AddBookResponse\"\x00\x12K\n\nSearchBook\x12\x1c.bookstore.SearchBookRequest\x1a\x1d.bookstore.SearchBookResponse\"\x00\x12N\n\x0bUpdateStock\x12\x1d.bookstore.UpdateStockRequest\x1a\x1e.bookstore.UpdateStockResponse\"\x00\x12H\n\tListBooks\x12\x1b.bookstore.ListBooksRequest\x1a\x1c.bookstore.ListBooksResponse\"\x00\x12K\n\nDeleteBook\x12\x1c.bookstore.DeleteBookRequest\x1a\x1d.bookstore.DeleteBookResponse\"\x00\x12G\n\x13SubscribeToNewBooks\x12\x1b.bookstore.SubscribeRequest\x1a\x0f.bookstore.Book\"\x00\x30\x01\x12I\n\x0c\x42ulkAddBooks\x12\x19.bookstore.AddBookRequest\x1a\x1a.bookstore.BulkAddResponse\"\x00(\x01\x12<\n\x04\x43hat\x12\x16.bookstore.ChatMessage\x1a\x16.bookstore.ChatMessage\"\x00(\x01\x30\x01\x12K\n\x0eGetChatHistory\x12\x1d.bookstore.ChatHistoryRequest\x1a\x16.bookstore.ChatMessage\"\x00\x30\x01\x12J\n\nBulkIngest\x12\x1c.bookstore.BulkIngestRequest\x1a\x18.bookstore.BulkIngestAck\"\x00(\x01\x30\x01\x12\x46\n\x0bStreamBooks\x12\x1d.bookstore.StreamBooksRequest\x1a\x14.bookstore.BookChunk\"\x00\x30\x01\x12I\n\x0eGetServerStats\x12\x1d.bookstore.ServerStatsRequest\x1a\x16.bookstore.ServerStats\"\x00\x12T\n\rGetBookByIsbn\x12\x1f.bookstore.GetBookByIsbnRequest\x1a .bookstore.GetBookByIsbnResponse\"\x00\x12W\n\x0e\x42\x61tchGetByIsbn\x12 .bookstore.BatchGetByIsbnRequest\x1a!.bookstore.BatchGetByIsbnResponse\"\x00\x12K\n\nQueryBooks\x12\x1c.bookstore.QueryBooksRequest\x1a\x1d.bookstore.QueryBooksResponse\"\x00\x12\x42\n\x07GetBook\x12\x19.bookstore.GetBookRequest\x1a\x1a.bookstore.GetBookResponse\"\x00\x12T\n\rBatchGetBooks\x12\x1f.bookstore.BatchGetBooksRequest\x1a .bookstore.BatchGetBooksResponse\"\x00\x12]\n\x10\x42\x61tchUpdateStock\x12\".bookstore.BatchUpdateStockRequest\x1a#.bookstore.BatchUpdateStockResponse\"\x00\x12]\n\x10\x42\x61tchDeleteBooks\x12\".bookstore.BatchDeleteBooksRequest\x1a#.bookstore.BatchDeleteBooksResponse\"\x00\x12N\n\x0b\x41\x64justStock\x12\x1d.bookstore.AdjustStockRequest\x1a\x1e.bookstore.StockChangeResponse\"\x00\x12\\\n\x12\x43ompareAndSetStock\x12$.bookstore.CompareAndSetStockRequest\x1a\x1e.bookstore.StockChangeResponse\"\x00\x12J\n\x0cWatchChanges\x12\x1e.bookstore.WatchChangesRequest\x1a\x16.bookstore.ChangeEvent\"\x00\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'bookstore_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_BOOK']._serialized_start=30
-  _globals['_BOOK']._serialized_end=123
-  _globals['_ADDBOOKREQUEST']._serialized_start=125
-  _globals['_ADDBOOKREQUEST']._serialized_end=216
-  _globals['_ADDBOOKRESPONSE']._serialized_start=218
-  _globals['_ADDBOOKRESPONSE']._serialized_end=300
-  _globals['_SEARCHBOOKREQUEST']._serialized_start=302
-  _globals['_SEARCHBOOKREQUEST']._serialized_end=336
-  _globals['_SEARCHBOOKRESPONSE']._serialized_start=338
-  _globals['_SEARCHBOOKRESPONSE']._serialized_end=390
-  _globals['_UPDATESTOCKREQUEST']._serialized_start=392
-  _globals['_UPDATESTOCKREQUEST']._serialized_end=448
-  _globals['_UPDATESTOCKRESPONSE']._serialized_start=450
-  _globals['_UPDATESTOCKRESPONSE']._serialized_end=505
-  _globals['_LISTBOOKSREQUEST']._serialized_start=507
-  _globals['_LISTBOOKSREQUEST']._serialized_end=558
-  _globals['_LISTBOOKSRESPONSE']._serialized_start=560
-  _globals['_LISTBOOKSRESPONSE']._serialized_end=653
-  _globals['_DELETEBOOKREQUEST']._serialized_start=655
-  _globals['_DELETEBOOKREQUEST']._serialized_end=691
-  _globals['_DELETEBOOKRESPONSE']._serialized_start=693
-  _globals['_DELETEBOOKRESPONSE']._serialized_end=747
-  _globals['_SUBSCRIBEREQUEST']._serialized_start=749
-  _globals['_SUBSCRIBEREQUEST']._serialized_end=793
-  _globals['_BULKADDRESPONSE']._serialized_start=795
-  _globals['_BULKADDRESPONSE']._serialized_end=873
-  _globals['_CHATMESSAGE']._serialized_start=875
-  _globals['_CHATMESSAGE']._serialized_end=938
-  _globals['_BOOKSTORE']._serialized_start=941
-  _globals['_BOOKSTORE']._serialized_end=1538
+  _globals['_METHODSTATS_STATUSCODESENTRY']._loaded_options = None
+  _globals['_METHODSTATS_STATUSCODESENTRY']._serialized_options = b'8\001'
+  _globals['_BOOK']._serialized_start=64
+  _globals['_BOOK']._serialized_end=174
+  _globals['_ADDBOOKREQUEST']._serialized_start=177
+  _globals['_ADDBOOKREQUEST']._serialized_end=309
+  _globals['_ADDBOOKRESPONSE']._serialized_start=311
+  _globals['_ADDBOOKRESPONSE']._serialized_end=393
+  _globals['_SEARCHBOOKREQUEST']._serialized_start=395
+  _globals['_SEARCHBOOKREQUEST']._serialized_end=511
+  _globals['_SEARCHBOOKRESPONSE']._serialized_start=513
+  _globals['_SEARCHBOOKRESPONSE']._serialized_end=606
+  _globals['_UPDATESTOCKREQUEST']._serialized_start=608
+  _globals['_UPDATESTOCKREQUEST']._serialized_end=664
+  _globals['_UPDATESTOCKRESPONSE']._serialized_start=666
+  _globals['_UPDATESTOCKRESPONSE']._serialized_end=721
+  _globals['_LISTBOOKSREQUEST']._serialized_start=723
+  _globals['_LISTBOOKSREQUEST']._serialized_end=841
+  _globals['_LISTBOOKSRESPONSE']._serialized_start=843
+  _globals['_LISTBOOKSRESPONSE']._serialized_end=961
+  _globals['_DELETEBOOKREQUEST']._serialized_start=963
+  _globals['_DELETEBOOKREQUEST']._serialized_end=999
+  _globals['_DELETEBOOKRESPONSE']._serialized_start=1001
+  _globals['_DELETEBOOKRESPONSE']._serialized_end=1055
+  _globals['_SUBSCRIBEREQUEST']._serialized_start=1057
+  _globals['_SUBSCRIBEREQUEST']._serialized_end=1101
+  _globals['_BULKADDRESPONSE']._serialized_start=1104
+  _globals['_BULKADDRESPONSE']._serialized_end=1239
+  _globals['_CHATMESSAGE']._serialized_start=1241
+  _globals['_CHATMESSAGE']._serialized_end=1304
+  _globals['_CHATHISTORYREQUEST']._serialized_start=1306
+  _globals['_CHATHISTORYREQUEST']._serialized_end=1386
+  _globals['_BULKINGESTREQUEST']._serialized_start=1388
+  _globals['_BULKINGESTREQUEST']._serialized_end=1481
+  _globals['_BULKINGESTERROR']._serialized_start=1483
+  _globals['_BULKINGESTERROR']._serialized_end=1535
+  _globals['_BULKINGESTACK']._serialized_start=1537
+  _globals['_BULKINGESTACK']._serialized_end=1658
+  _globals['_STREAMBOOKSREQUEST']._serialized_start=1661
+  _globals['_STREAMBOOKSREQUEST']._serialized_end=1789
+  _globals['_BOOKCHUNK']._serialized_start=1791
+  _globals['_BOOKCHUNK']._serialized_end=1834
+  _globals['_GETBOOKBYISBNREQUEST']._serialized_start=1836
+  _globals['_GETBOOKBYISBNREQUEST']._serialized_end=1872
+  _globals['_GETBOOKBYISBNRESPONSE']._serialized_start=1874
+  _globals['_GETBOOKBYISBNRESPONSE']._serialized_end=1943
+  _globals['_BATCHGETBYISBNREQUEST']._serialized_start=1945
+  _globals['_BATCHGETBYISBNREQUEST']._serialized_end=1983
+  _globals['_BATCHGETBYISBNRESPONSE']._serialized_start=1985
+  _globals['_BATCHGETBYISBNRESPONSE']._serialized_end=2064
+  _globals['_QUERYBOOKSREQUEST']._serialized_start=2067
+  _globals['_QUERYBOOKSREQUEST']._serialized_end=2387
+  _globals['_QUERYBOOKSREQUEST_SORTKEY']._serialized_start=2342
+  _globals['_QUERYBOOKSREQUEST_SORTKEY']._serialized_end=2373
+  _globals['_QUERYBOOKSRESPONSE']._serialized_start=2389
+  _globals['_QUERYBOOKSRESPONSE']._serialized_end=2466
+  _globals['_GETBOOKREQUEST']._serialized_start=2468
+  _globals['_GETBOOKREQUEST']._serialized_end=2501
+  _globals['_GETBOOKRESPONSE']._serialized_start=2503
+  _globals['_GETBOOKRESPONSE']._serialized_end=2566
+  _globals['_BATCHGETBOOKSREQUEST']._serialized_start=2568
+  _globals['_BATCHGETBOOKSREQUEST']._serialized_end=2608
+  _globals['_BATCHGETBOOKSRESPONSE']._serialized_start=2610
+  _globals['_BATCHGETBOOKSRESPONSE']._serialized_end=2686
+  _globals['_BOOKRESULT']._serialized_start=2688
+  _globals['_BOOKRESULT']._serialized_end=2751
+  _globals['_BATCHUPDATESTOCKREQUEST']._serialized_start=2753
+  _globals['_BATCHUPDATESTOCKREQUEST']._serialized_end=2826
+  _globals['_BATCHUPDATESTOCKRESPONSE']._serialized_start=2828
+  _globals['_BATCHUPDATESTOCKRESPONSE']._serialized_end=2913
+  _globals['_BATCHDELETEBOOKSREQUEST']._serialized_start=2915
+  _globals['_BATCHDELETEBOOKSREQUEST']._serialized_end=2958
+  _globals['_BATCHDELETEBOOKSRESPONSE']._serialized_start=2960
+  _globals['_BATCHDELETEBOOKSRESPONSE']._serialized_end=3045
+  _globals['_ADJUSTSTOCKREQUEST']._serialized_start=3047
+  _globals['_ADJUSTSTOCKREQUEST']._serialized_end=3118
+  _globals['_COMPAREANDSETSTOCKREQUEST']._serialized_start=3120
+  _globals['_COMPAREANDSETSTOCKREQUEST']._serialized_end=3209
+  _globals['_STOCKCHANGERESPONSE']._serialized_start=3211
+  _globals['_STOCKCHANGERESPONSE']._serialized_end=3298
+  _globals['_SERVERSTATSREQUEST']._serialized_start=3300
+  _globals['_SERVERSTATSREQUEST']._serialized_end=3320
+  _globals['_METHODSTATS']._serialized_start=3323
+  _globals['_METHODSTATS']._serialized_end=3578
+  _globals['_METHODSTATS_STATUSCODESENTRY']._serialized_start=3528
+  _globals['_METHODSTATS_STATUSCODESENTRY']._serialized_end=3578
+  _globals['_SERVERSTATS']._serialized_start=3581
+  _globals['_SERVERSTATS']._serialized_end=4243
+  _globals['_WATCHCHANGESREQUEST']._serialized_start=4245
+  _globals['_WATCHCHANGESREQUEST']._serialized_end=4289
+  _globals['_CHANGEEVENT']._serialized_start=4292
+  _globals['_CHANGEEVENT']._serialized_end=4471
+  _globals['_CHANGEEVENT_CHANGETYPE']._serialized_start=4422
+  _globals['_CHANGEEVENT_CHANGETYPE']._serialized_end=4471
+  _globals['_BOOKSTORE']._serialized_start=4474
+  _globals['_BOOKSTORE']._serialized_end=6217
 # @@protoc_insertion_point(module_scope)
@@ -74,6 +74,76 @@ class BookStoreStub(object):
                 request_serializer=bookstore__pb2.ChatMessage.SerializeToString,
                 response_deserializer=bookstore__pb2.ChatMessage.FromString,
                 _registered_method=True)
+        self.GetChatHistory = channel.unary_stream(
+                '/bookstore.BookStore/GetChatHistory',
+                request_serializer=bookstore__pb2.ChatHistoryRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.ChatMessage.FromString,
+                _registered_method=True)
+        self.BulkIngest = channel.stream_stream(
+                '/bookstore.BookStore/BulkIngest',
+                request_serializer=bookstore__pb2.BulkIngestRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.BulkIngestAck.FromString,
+                _registered_method=True)
+        self.StreamBooks = channel.unary_stream(
+                '/bookstore.BookStore/StreamBooks',
+                request_serializer=bookstore__pb2.StreamBooksRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.BookChunk.FromString,
+                _registered_method=True)
+        self.GetServerStats = channel.unary_unary(
+                '/bookstore.BookStore/GetServerStats',
+                request_serializer=bookstore__pb2.ServerStatsRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.ServerStats.FromString,
+                _registered_method=True)
+        self.GetBookByIsbn = channel.unary_unary(
+                '/bookstore.BookStore/GetBookByIsbn',
+                request_serializer=bookstore__pb2.GetBookByIsbnRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.GetBookByIsbnResponse.FromString,
+                _registered_method=True)
+        self.BatchGetByIsbn = channel.unary_unary(
+                '/bookstore.BookStore/BatchGetByIsbn',
+                request_serializer=bookstore__pb2.BatchGetByIsbnRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.BatchGetByIsbnResponse.FromString,
+                _registered_method=True)
+        self.QueryBooks = channel.unary_unary(
+                '/bookstore.BookStore/QueryBooks',
+                request_serializer=bookstore__pb2.QueryBooksRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.QueryBooksResponse.FromString,
+                _registered_method=True)
+        self.GetBook = channel.unary_unary(
+                '/bookstore.BookStore/GetBook',
+                request_serializer=bookstore__pb2.GetBookRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.GetBookResponse.FromString,
+                _registered_method=True)
+        self.BatchGetBooks = channel.unary_unary(
+                '/bookstore.BookStore/BatchGetBooks',
+                request_serializer=bookstore__pb2.BatchGetBooksRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.BatchGetBooksResponse.FromString,
+                _registered_method=True)
+        self.BatchUpdateStock = channel.unary_unary(
+                '/bookstore.BookStore/BatchUpdateStock',
+                request_serializer=bookstore__pb2.BatchUpdateStockRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.BatchUpdateStockResponse.FromString,
+                _registered_method=True)
+        self.BatchDeleteBooks = channel.unary_unary(
+                '/bookstore.BookStore/BatchDeleteBooks',
+                request_serializer=bookstore__pb2.BatchDeleteBooksRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.BatchDeleteBooksResponse.FromString,
+                _registered_method=True)
+        self.AdjustStock = channel.unary_unary(
+                '/bookstore.BookStore/AdjustStock',
+                request_serializer=bookstore__pb2.AdjustStockRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.StockChangeResponse.FromString,
+                _registered_method=True)
+        self.CompareAndSetStock = channel.unary_unary(
+                '/bookstore.BookStore/CompareAndSetStock',
+                request_serializer=bookstore__pb2.CompareAndSetStockRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.StockChangeResponse.FromString,
+                _registered_method=True)
+        self.WatchChanges = channel.unary_stream(
+                '/bookstore.BookStore/WatchChanges',
+                request_serializer=bookstore__pb2.WatchChangesRequest.SerializeToString,
+                response_deserializer=bookstore__pb2.ChangeEvent.FromString,
+                _registered_method=True)
 
 
 class BookStoreServicer(object):
@@ -127,6 +197,90 @@ class BookStoreServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetChatHistory(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BulkIngest(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamBooks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetServerStats(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetBookByIsbn(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchGetByIsbn(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def QueryBooks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetBook(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchGetBooks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchUpdateStock(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchDeleteBooks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AdjustStock(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CompareAndSetStock(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchChanges(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_BookStoreServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -170,6 +324,76 @@ def add_BookStoreServicer_to_server(servicer, server):
                     request_deserializer=bookstore__pb2.ChatMessage.FromString,
                     response_serializer=bookstore__pb2.ChatMessage.SerializeToString,
             ),
+            'GetChatHistory': grpc.unary_stream_rpc_method_handler(
+                    servicer.GetChatHistory,
+                    request_deserializer=bookstore__pb2.ChatHistoryRequest.FromString,
+                    response_serializer=bookstore__pb2.ChatMessage.SerializeToString,
+            ),
+            'BulkIngest': grpc.stream_stream_rpc_method_handler(
+                    servicer.BulkIngest,
+                    request_deserializer=bookstore__pb2.BulkIngestRequest.FromString,
+                    response_serializer=bookstore__pb2.BulkIngestAck.SerializeToString,
+            ),
+            'StreamBooks': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamBooks,
+                    request_deserializer=bookstore__pb2.StreamBooksRequest.FromString,
+                    response_serializer=bookstore__pb2.BookChunk.SerializeToString,
+            ),
+            'GetServerStats': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetServerStats,
+                    request_deserializer=bookstore__pb2.ServerStatsRequest.FromString,
+                    response_serializer=bookstore__pb2.ServerStats.SerializeToString,
+            ),
+            'GetBookByIsbn': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetBookByIsbn,
+                    request_deserializer=bookstore__pb2.GetBookByIsbnRequest.FromString,
+                    response_serializer=bookstore__pb2.GetBookByIsbnResponse.SerializeToString,
+            ),
+            'BatchGetByIsbn': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetByIsbn,
+                    request_deserializer=bookstore__pb2.BatchGetByIsbnRequest.FromString,
+                    response_serializer=bookstore__pb2.BatchGetByIsbnResponse.SerializeToString,
+            ),
+            'QueryBooks': grpc.unary_unary_rpc_method_handler(
+                    servicer.QueryBooks,
+                    request_deserializer=bookstore__pb2.QueryBooksRequest.FromString,
+                    response_serializer=bookstore__pb2.QueryBooksResponse.SerializeToString,
+            ),
+            'GetBook': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetBook,
+                    request_deserializer=bookstore__pb2.GetBookRequest.FromString,
+                    response_serializer=bookstore__pb2.GetBookResponse.SerializeToString,
+            ),
+            'BatchGetBooks': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetBooks,
+                    request_deserializer=bookstore__pb2.BatchGetBooksRequest.FromString,
+                    response_serializer=bookstore__pb2.BatchGetBooksResponse.SerializeToString,
+            ),
+            'BatchUpdateStock': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchUpdateStock,
+                    request_deserializer=bookstore__pb2.BatchUpdateStockRequest.FromString,
+                    response_serializer=bookstore__pb2.BatchUpdateStockResponse.SerializeToString,
+            ),
+            'BatchDeleteBooks': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchDeleteBooks,
+                    request_deserializer=bookstore__pb2.BatchDeleteBooksRequest.FromString,
+                    response_serializer=bookstore__pb2.BatchDeleteBooksResponse.SerializeToString,
+            ),
+            'AdjustStock': grpc.unary_unary_rpc_method_handler(
+                    servicer.AdjustStock,
+                    request_deserializer=bookstore__pb2.AdjustStockRequest.FromString,
+                    response_serializer=bookstore__pb2.StockChangeResponse.SerializeToString,
+            ),
+            'CompareAndSetStock': grpc.unary_unary_rpc_method_handler(
+                    servicer.CompareAndSetStock,
+                    request_deserializer=bookstore__pb2.CompareAndSetStockRequest.FromString,
+                    response_serializer=bookstore__pb2.StockChangeResponse.SerializeToString,
+            ),
+            'WatchChanges': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchChanges,
+                    request_deserializer=bookstore__pb2.WatchChangesRequest.FromString,
+                    response_serializer=bookstore__pb2.ChangeEvent.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'bookstore.BookStore', rpc_method_handlers)
@@ -396,3 +620,381 @@ class BookStore(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GetChatHistory(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/bookstore.BookStore/GetChatHistory',
+            bookstore__pb2.ChatHistoryRequest.SerializeToString,
+            bookstore__pb2.ChatMessage.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BulkIngest(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/bookstore.BookStore/BulkIngest',
+            bookstore__pb2.BulkIngestRequest.SerializeToString,
+            bookstore__pb2.BulkIngestAck.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/bookstore.BookStore/StreamBooks',
+            bookstore__pb2.StreamBooksRequest.SerializeToString,
+            bookstore__pb2.BookChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetServerStats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/GetServerStats',
+            bookstore__pb2.ServerStatsRequest.SerializeToString,
+            bookstore__pb2.ServerStats.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetBookByIsbn(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/GetBookByIsbn',
+            bookstore__pb2.GetBookByIsbnRequest.SerializeToString,
+            bookstore__pb2.GetBookByIsbnResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchGetByIsbn(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/BatchGetByIsbn',
+            bookstore__pb2.BatchGetByIsbnRequest.SerializeToString,
+            bookstore__pb2.BatchGetByIsbnResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def QueryBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/QueryBooks',
+            bookstore__pb2.QueryBooksRequest.SerializeToString,
+            bookstore__pb2.QueryBooksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetBook(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/GetBook',
+            bookstore__pb2.GetBookRequest.SerializeToString,
+            bookstore__pb2.GetBookResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchGetBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/BatchGetBooks',
+            bookstore__pb2.BatchGetBooksRequest.SerializeToString,
+            bookstore__pb2.BatchGetBooksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchUpdateStock(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/BatchUpdateStock',
+            bookstore__pb2.BatchUpdateStockRequest.SerializeToString,
+            bookstore__pb2.BatchUpdateStockResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchDeleteBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/BatchDeleteBooks',
+            bookstore__pb2.BatchDeleteBooksRequest.SerializeToString,
+            bookstore__pb2.BatchDeleteBooksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def AdjustStock(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/AdjustStock',
+            bookstore__pb2.AdjustStockRequest.SerializeToString,
+            bookstore__pb2.StockChangeResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CompareAndSetStock(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bookstore.BookStore/CompareAndSetStock',
+            bookstore__pb2.CompareAndSetStockRequest.SerializeToString,
+            bookstore__pb2.StockChangeResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchChanges(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/bookstore.BookStore/WatchChanges',
+            bookstore__pb2.WatchChangesRequest.SerializeToString,
+            bookstore__pb2.ChangeEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
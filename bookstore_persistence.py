@@ -0,0 +1,303 @@
+import heapq
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import List, Optional, Tuple
+import bookstore_pb2
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER)
+
+OP_PUT = 1
+OP_DELETE = 2
+
+# WAL record: payload length, crc32 of (lsn, op, payload), lsn, op, payload.
+RECORD_HEADER = struct.Struct("<IIQB")
+RECORD_KEY = struct.Struct("<QB")
+# Snapshot: magic, covered lsn, book count, then length-prefixed Book
+# messages, then a footer magic and the crc32 of every record.
+SNAPSHOT_MAGIC = b"BKSNAP1\n"
+SNAPSHOT_FOOTER = b"BKSNAPOK"
+SNAPSHOT_HEADER = struct.Struct("<QQ")
+LENGTH = struct.Struct("<I")
+
+
+def wal_path(directory: str, first_lsn: int) -> str:
+    return os.path.join(directory, f"wal-{first_lsn:020d}.log")
+
+
+def snapshot_path(directory: str, lsn: int) -> str:
+    return os.path.join(directory, f"snapshot-{lsn:020d}.bin")
+
+
+def list_files(directory: str, prefix: str) -> List[Tuple[int, str]]:
+    found = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix + "-") and not name.endswith(".tmp"):
+            found.append((int(name[len(prefix) + 1:].split(".")[0]), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def encode_record(lsn: int, op: int, payload: bytes) -> bytes:
+    crc = zlib.crc32(payload, zlib.crc32(RECORD_KEY.pack(lsn, op)))
+    return RECORD_HEADER.pack(len(payload), crc, lsn, op) + payload
+
+
+def read_records(path: str):
+    # Yields (lsn, op, payload) up to the first torn or corrupt record.
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        length, crc, lsn, op = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) != length or zlib.crc32(payload, zlib.crc32(RECORD_KEY.pack(lsn, op))) != crc:
+            return
+        yield lsn, op, payload
+        offset = start + length
+
+
+class WriteAheadLog:
+    # Append-only, group-committed log. Writers only enqueue an encoded record
+    # and get its LSN back; a flusher thread writes everything queued so far
+    # with a single write() and, depending on the policy, a single fsync.
+    # Under FSYNC_ALWAYS, wait(lsn) blocks until that record is durable.
+    def __init__(self, directory: str, first_lsn: int, policy: str = FSYNC_INTERVAL,
+                 interval: float = 0.05):
+        if policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {policy!r}")
+        self.directory = directory
+        self.policy = policy
+        self.interval = interval
+        self.cond = threading.Condition(threading.Lock())
+        self.io_lock = threading.Lock()
+        self.pending: List[bytes] = []
+        self.next_lsn = first_lsn
+        self.durable_lsn = first_lsn - 1
+        self.closed = False
+        self.file = open(wal_path(directory, first_lsn), "ab")
+        self.dirty = False
+        self.last_sync = time.monotonic()
+        self.flusher = threading.Thread(target=self._run, name="wal-flusher", daemon=True)
+        self.flusher.start()
+
+    @property
+    def last_lsn(self) -> int:
+        return self.next_lsn - 1
+
+    def append(self, op: int, payload: bytes) -> int:
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("Write-ahead log is closed")
+            lsn = self.next_lsn
+            self.next_lsn += 1
+            self.pending.append(encode_record(lsn, op, payload))
+            self.cond.notify_all()
+        return lsn
+
+    def put(self, book: bookstore_pb2.Book) -> int:
+        return self.append(OP_PUT, book.SerializeToString())
+
+    def delete(self, book_id: str) -> int:
+        return self.append(OP_DELETE, book_id.encode())
+
+    def wait(self, lsn: int) -> None:
+        if self.policy != FSYNC_ALWAYS:
+            return
+        with self.cond:
+            while self.durable_lsn < lsn and not self.closed:
+                self.cond.wait()
+
+    def _flush(self, force_sync: bool) -> None:
+        with self.io_lock:
+            with self.cond:
+                batch, self.pending = self.pending, []
+                last = self.next_lsn - 1
+            if batch:
+                self.file.write(b"".join(batch))
+                self.file.flush()
+                self.dirty = True
+            now = time.monotonic()
+            if self.dirty and (force_sync or self.policy == FSYNC_ALWAYS or (
+                self.policy == FSYNC_INTERVAL and now - self.last_sync >= self.interval
+            )):
+                os.fsync(self.file.fileno())
+                self.dirty = False
+                self.last_sync = now
+            synced = not self.dirty
+        with self.cond:
+            if synced or self.policy != FSYNC_ALWAYS:
+                self.durable_lsn = max(self.durable_lsn, last)
+            self.cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait(self.interval if self.policy == FSYNC_INTERVAL else None)
+                    if self.policy == FSYNC_INTERVAL:
+                        break
+                if self.closed:
+                    return
+            self._flush(False)
+
+    def rotate(self) -> int:
+        # Seals the current segment and starts a new one; returns the last LSN
+        # of the sealed segment.
+        with self.io_lock:
+            with self.cond:
+                batch, self.pending = self.pending, []
+                last = self.next_lsn - 1
+            self.file.write(b"".join(batch))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = open(wal_path(self.directory, last + 1), "ab")
+            self.dirty = False
+            with self.cond:
+                self.durable_lsn = max(self.durable_lsn, last)
+                self.cond.notify_all()
+        return last
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.flusher.join()
+        self._flush(True)
+        with self.io_lock:
+            self.file.close()
+
+
+class Persistence:
+    def __init__(self, directory: str, fsync_policy: str = FSYNC_INTERVAL,
+                 fsync_interval: float = 0.05, snapshot_interval: float = 300.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.wal: Optional[WriteAheadLog] = None
+        self.snapshot_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.snapshotter: Optional[threading.Thread] = None
+        self.last_lsn = 0
+
+    def recover(self, store) -> int:
+        count = self.load(store)
+        self.open_log(store)
+        return count
+
+    def load(self, store) -> int:
+        # Rebuilds the catalog from disk without opening the WAL, so no
+        # thread is running yet.
+        last_lsn = 0
+        snapshots = list_files(self.directory, "snapshot")
+        for lsn, path in reversed(snapshots):
+            if self.load_snapshot(store, path):
+                last_lsn = lsn
+                break
+
+        for first_lsn, path in list_files(self.directory, "wal"):
+            for lsn, op, payload in read_records(path):
+                if lsn <= last_lsn:
+                    continue
+                if op == OP_PUT:
+                    store.apply_put(bookstore_pb2.Book.FromString(payload))
+                elif op == OP_DELETE:
+                    store.apply_delete(payload.decode())
+                last_lsn = lsn
+
+        # Each WAL record is one change, so the change feed carries on from
+        # the recovered LSN and watchers can resume across restarts.
+        store.changes.restart(last_lsn + 1)
+        self.last_lsn = last_lsn
+        return store.count()
+
+    def open_log(self, store) -> None:
+        # Always continue in a fresh segment so a torn tail is never appended to.
+        self.wal = WriteAheadLog(self.directory, self.last_lsn + 1, self.fsync_policy, self.fsync_interval)
+        store.wal = self.wal
+
+    def load_snapshot(self, store, path: str) -> bool:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size + len(SNAPSHOT_FOOTER) + LENGTH.size:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                footer = size - len(SNAPSHOT_FOOTER) - LENGTH.size
+                if mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC or mm[footer:footer + len(SNAPSHOT_FOOTER)] != SNAPSHOT_FOOTER:
+                    return False
+                body_start = len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size
+                (crc,) = LENGTH.unpack_from(mm, footer + len(SNAPSHOT_FOOTER))
+                if zlib.crc32(memoryview(mm)[body_start:footer]) != crc:
+                    return False
+                _, count = SNAPSHOT_HEADER.unpack_from(mm, len(SNAPSHOT_MAGIC))
+                offset = body_start
+                for _ in range(count):
+                    (length,) = LENGTH.unpack_from(mm, offset)
+                    offset += LENGTH.size
+                    store.apply_put(bookstore_pb2.Book.FromString(mm[offset:offset + length]))
+                    offset += length
+        return True
+
+    def snapshot(self, store) -> int:
+        with self.snapshot_lock:
+            lsn = self.wal.rotate()
+            entries = []
+            for shard in store.shards:
+                with shard.lock.read:
+                    entries.append([(seq, book.SerializeToString()) for seq, book in shard.entries()])
+
+            path = snapshot_path(self.directory, lsn)
+            tmp = path + ".tmp"
+            count = 0
+            crc = 0
+            with open(tmp, "wb") as f:
+                f.write(SNAPSHOT_MAGIC)
+                f.write(SNAPSHOT_HEADER.pack(lsn, 0))
+                for _, data in heapq.merge(*entries, key=lambda entry: entry[0]):
+                    record = LENGTH.pack(len(data)) + data
+                    crc = zlib.crc32(record, crc)
+                    f.write(record)
+                    count += 1
+                f.write(SNAPSHOT_FOOTER + LENGTH.pack(crc))
+                f.seek(len(SNAPSHOT_MAGIC))
+                f.write(SNAPSHOT_HEADER.pack(lsn, count))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+
+            for old_lsn, old_path in list_files(self.directory, "snapshot"):
+                if old_lsn < lsn:
+                    os.remove(old_path)
+            for first_lsn, old_path in list_files(self.directory, "wal"):
+                if first_lsn <= lsn:
+                    os.remove(old_path)
+            return count
+
+    def start(self, store) -> None:
+        def run():
+            while not self.stopped.wait(self.snapshot_interval):
+                try:
+                    books = self.snapshot(store)
+                    print(f"Snapshot written with {books} books")
+                except Exception as e:
+                    print(f"Snapshot failed: {str(e)}")
+
+        if self.snapshot_interval > 0:
+            self.snapshotter = threading.Thread(target=run, name="snapshotter", daemon=True)
+            self.snapshotter.start()
+
+    def close(self) -> None:
+        self.stopped.set()
+        if self.snapshotter is not None:
+            self.snapshotter.join()
+        if self.wal is not None:
+            self.wal.close()
@@ -0,0 +1,99 @@
+import math
+from typing import Callable, List, Optional, Sequence
+from bookstore_index import TermIndex
+
+# Okapi BM25 parameters: term frequency saturation and length normalisation.
+K1 = 1.2
+B = 0.75
+# Per-field weights, title then author.
+FIELD_WEIGHTS = (1.0, 0.8)
+# Added when the query is the book's whole author name.
+EXACT_AUTHOR_BOOST = 3.0
+
+
+def query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(TermIndex.tokens(query)))
+
+
+def feature_reader(query: str, terms: List[str], indexes: Sequence[TermIndex],
+                   author: Callable[[int], str]) -> Callable[[int], Optional[tuple]]:
+    # Reads what a row's score depends on besides the catalog statistics:
+    # per field its length and the frequency of each query term, then
+    # whether its author is the whole query. None when neither applies, as
+    # such rows score 0. The words come from the TermIndexes, so no text is
+    # tokenized; features only change with the row, so cached search results
+    # keep them while the statistics move on.
+    fields = []
+    for index in indexes:
+        words = [index.word(term) for term in terms]
+        fields.append((index, words, any(word is not None for word in words)))
+    absent = (0, (0,) * len(terms))
+    exact = query.strip().lower()
+
+    def features(row: int) -> Optional[tuple]:
+        result = []
+        for index, words, present in fields:
+            if present:
+                row_words = index.row(row)
+                frequencies = tuple([row_words.count(word) for word in words])
+                result.append((len(row_words), frequencies) if any(frequencies) else absent)
+            else:
+                result.append(absent)
+        # An author equal to the query holds all of its words.
+        is_author = bool(exact) and (not terms or result[-1] is not absent) and author(row).lower() == exact
+        if not is_author and all(field is absent for field in result):
+            return None
+        result.append(is_author)
+        return tuple(result)
+
+    return features
+
+
+class FieldStats:
+    # Catalog-wide statistics of one field for a query's terms, summed over
+    # the shards' TermIndexes.
+    def __init__(self, terms: List[str]):
+        self.terms = terms
+        self.documents = 0
+        self.length = 0
+        self.frequencies = [0] * len(terms)
+
+    def add(self, index: TermIndex) -> None:
+        self.documents += index.documents
+        self.length += index.length
+        for i, term in enumerate(self.terms):
+            self.frequencies[i] += index.frequency(term)
+
+    # values()/from_values() carry the statistics in search page tokens.
+    def values(self) -> List[int]:
+        return [self.documents, self.length, *self.frequencies]
+
+    @classmethod
+    def from_values(cls, terms: List[str], values: List[int]) -> "FieldStats":
+        stats = cls(terms)
+        stats.documents, stats.length, *stats.frequencies = values
+        return stats
+
+
+class Bm25:
+    # Scores rows from their feature_reader() features: BM25 over the title
+    # and author words, weighted per field, plus EXACT_AUTHOR_BOOST for an
+    # exact author match.
+    def __init__(self, fields: List[FieldStats]):
+        self.idf = [
+            [math.log(1 + (stats.documents - df + 0.5) / (df + 0.5)) for df in stats.frequencies]
+            for stats in fields
+        ]
+        self.average_length = [stats.length / stats.documents if stats.documents else 1.0 for stats in fields]
+
+    def score(self, features: Optional[tuple]) -> float:
+        if features is None:
+            return 0.0
+        total = EXACT_AUTHOR_BOOST if features[-1] else 0.0
+        for weight, idf, average_length, (length, frequencies) in zip(
+                FIELD_WEIGHTS, self.idf, self.average_length, features):
+            norm = K1 * (1 - B + B * length / average_length)
+            for term_idf, tf in zip(idf, frequencies):
+                if tf:
+                    total += weight * term_idf * tf * (K1 + 1) / (tf + norm)
+        return total
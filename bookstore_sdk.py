@@ -0,0 +1,377 @@
+import asyncio
+import itertools
+import threading
+import grpc
+import bookstore_pb2
+import bookstore_pb2_grpc
+from google.protobuf.field_mask_pb2 import FieldMask
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_TARGET = "localhost:50051"
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_CONCURRENCY = 64
+# Items per Batch* RPC issued by the bulk helpers.
+DEFAULT_BATCH_SIZE = 1000
+
+# Without a local subchannel pool, channels to the same target share one
+# connection; with it every channel in the pool gets its own HTTP/2
+# connection and streams are spread across them.
+CHANNEL_OPTIONS = [("grpc.use_local_subchannel_pool", 1)]
+
+
+class ChannelPool:
+    # A fixed set of channels to one target, handed out round-robin.
+    def __init__(self, target: str = DEFAULT_TARGET, size: int = DEFAULT_POOL_SIZE,
+                 options: Optional[List[Tuple[str, object]]] = None):
+        if size < 1:
+            raise ValueError("Channel pool size must be at least 1")
+        options = CHANNEL_OPTIONS + list(options or [])
+        self.target = target
+        self.channels = [self.open_channel(target, options) for _ in range(size)]
+        self.stubs = [bookstore_pb2_grpc.BookStoreStub(channel) for channel in self.channels]
+        self.cursor = itertools.cycle(self.stubs)
+        self.lock = threading.Lock()
+
+    def open_channel(self, target: str, options):
+        return grpc.insecure_channel(target, options=options)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def stub(self) -> bookstore_pb2_grpc.BookStoreStub:
+        with self.lock:
+            return next(self.cursor)
+
+    def close(self) -> None:
+        for channel in self.channels:
+            channel.close()
+
+
+class AsyncChannelPool(ChannelPool):
+    def open_channel(self, target: str, options):
+        return grpc.aio.insecure_channel(target, options=options)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(channel.close() for channel in self.channels))
+
+
+def chunked(items: Sequence, size: int) -> List[Sequence]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def book_request(title: str, author: str, isbn: str = "", stock: int = 0, price: float = 0.0,
+                 skip_duplicate_isbn: bool = False) -> bookstore_pb2.AddBookRequest:
+    return bookstore_pb2.AddBookRequest(title=title, author=author, isbn=isbn, stock=stock, price=price,
+                                        skip_duplicate_isbn=skip_duplicate_isbn)
+
+
+class BookStoreAPI:
+    # Blocking client over a channel pool. The *_many helpers pipeline unary
+    # calls through call futures, keeping at most `max_concurrency` in flight
+    # without a thread per request; results come back in request order and
+    # the first failed call raises its grpc.RpcError.
+    def __init__(self, target: str = DEFAULT_TARGET, pool_size: int = DEFAULT_POOL_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: Optional[float] = None,
+                 options: Optional[List[Tuple[str, object]]] = None):
+        self.pool = ChannelPool(target, pool_size, options)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def call(self, method: str, request):
+        return getattr(self.pool.stub(), method)(request, timeout=self.timeout)
+
+    def call_many(self, method: str, requests: Iterable) -> list:
+        slots = threading.BoundedSemaphore(self.max_concurrency)
+        calls = []
+        for request in requests:
+            slots.acquire()
+            call = getattr(self.pool.stub(), method).future(request, timeout=self.timeout)
+            call.add_done_callback(lambda _: slots.release())
+            calls.append(call)
+        return [call.result() for call in calls]
+
+    def add_book(self, request: bookstore_pb2.AddBookRequest) -> bookstore_pb2.AddBookResponse:
+        return self.call("AddBook", request)
+
+    # `fields` limits the returned books to those Book fields, e.g.
+    # ("id", "title", "price"); empty returns whole books. Results come
+    # best match first, one page of `limit` (server default 10) at a time.
+    def search_books(self, query: str, fields: Sequence[str] = (), limit: int = 0) -> List[bookstore_pb2.Book]:
+        return self.search_page(query, limit=limit, fields=fields)[0]
+
+    def search_page(self, query: str, page_token: str = "", limit: int = 0,
+                    fields: Sequence[str] = ()) -> Tuple[List[bookstore_pb2.Book], str]:
+        request = bookstore_pb2.SearchBookRequest(
+            query=query, limit=limit, page_token=page_token, read_mask=FieldMask(paths=fields)
+        )
+        response = self.call("SearchBook", request)
+        return list(response.books), response.next_page_token
+
+    def iter_search(self, query: str, limit: int = 0, fields: Sequence[str] = ()):
+        token = ""
+        while True:
+            books, token = self.search_page(query, token, limit, fields)
+            yield from books
+            if not token:
+                return
+
+    def get_book_by_isbn(self, isbn: str) -> Optional[bookstore_pb2.Book]:
+        response = self.call("GetBookByIsbn", bookstore_pb2.GetBookByIsbnRequest(isbn=isbn))
+        return response.book if response.found else None
+
+    def get_books_by_isbn(self, isbns: Sequence[str]) -> bookstore_pb2.BatchGetByIsbnResponse:
+        return self.call("BatchGetByIsbn", bookstore_pb2.BatchGetByIsbnRequest(isbns=isbns))
+
+    def update_stock(self, book_id: str, new_stock: int) -> bool:
+        request = bookstore_pb2.UpdateStockRequest(book_id=book_id, new_stock=new_stock)
+        return self.call("UpdateStock", request).success
+
+    def adjust_stock(self, book_id: str, delta: int, min_floor: int = 0) -> bookstore_pb2.StockChangeResponse:
+        request = bookstore_pb2.AdjustStockRequest(book_id=book_id, delta=delta, min_floor=min_floor)
+        return self.call("AdjustStock", request)
+
+    def compare_and_set_stock(self, book_id: str, expected_version: int,
+                              new_stock: int) -> bookstore_pb2.StockChangeResponse:
+        request = bookstore_pb2.CompareAndSetStockRequest(
+            book_id=book_id, expected_version=expected_version, new_stock=new_stock
+        )
+        return self.call("CompareAndSetStock", request)
+
+    def delete_book(self, book_id: str) -> bool:
+        return self.call("DeleteBook", bookstore_pb2.DeleteBookRequest(book_id=book_id)).success
+
+    def list_books(self, page_size: int = 0, page_token: str = "",
+                   fields: Sequence[str] = ()) -> Tuple[List[bookstore_pb2.Book], str]:
+        request = bookstore_pb2.ListBooksRequest(
+            page_size=page_size, page_token=page_token, read_mask=FieldMask(paths=fields)
+        )
+        response = self.call("ListBooks", request)
+        return list(response.books), response.next_page_token
+
+    def iter_books(self, page_size: int = 0, fields: Sequence[str] = ()):
+        token = ""
+        while True:
+            books, token = self.list_books(page_size, token, fields)
+            yield from books
+            if not token:
+                return
+
+    def query_books(self, page_token: str = "", fields: Sequence[str] = (),
+                    **filters) -> Tuple[List[bookstore_pb2.Book], str]:
+        request = bookstore_pb2.QueryBooksRequest(page_token=page_token, read_mask=FieldMask(paths=fields), **filters)
+        response = self.call("QueryBooks", request)
+        return list(response.books), response.next_page_token
+
+    def stream_books(self, **filters):
+        request = bookstore_pb2.StreamBooksRequest(**filters)
+        for chunk in self.pool.stub().StreamBooks(request, timeout=self.timeout):
+            yield from chunk.books
+
+    def watch_changes(self, from_sequence: int = 0):
+        # Runs until cancelled, so no per-call timeout; resume after a
+        # disconnect from the last event's sequence + 1.
+        request = bookstore_pb2.WatchChangesRequest(from_sequence=from_sequence)
+        yield from self.pool.stub().WatchChanges(request)
+
+    def bulk_add_books(self, requests: Iterable[bookstore_pb2.AddBookRequest]) -> bookstore_pb2.BulkAddResponse:
+        return self.pool.stub().BulkAddBooks(iter(requests), timeout=self.timeout)
+
+    def add_books(self, requests: Sequence[bookstore_pb2.AddBookRequest]) -> List[bookstore_pb2.AddBookResponse]:
+        return self.call_many("AddBook", requests)
+
+    def get_book(self, book_id: str) -> Optional[bookstore_pb2.Book]:
+        response = self.call("GetBook", bookstore_pb2.GetBookRequest(book_id=book_id))
+        return response.book if response.found else None
+
+    def get_books(self, book_ids: Sequence[str]) -> Dict[str, bookstore_pb2.Book]:
+        responses = self.call_many("BatchGetBooks", (
+            bookstore_pb2.BatchGetBooksRequest(book_ids=chunk)
+            for chunk in chunked(list(book_ids), DEFAULT_BATCH_SIZE)
+        ))
+        return {book.id: book for response in responses for book in response.books}
+
+    def update_stocks(self, stocks: Dict[str, int]) -> Dict[str, bool]:
+        responses = self.call_many("BatchUpdateStock", (
+            bookstore_pb2.BatchUpdateStockRequest(updates=[
+                bookstore_pb2.UpdateStockRequest(book_id=book_id, new_stock=new_stock)
+                for book_id, new_stock in chunk
+            ])
+            for chunk in chunked(list(stocks.items()), DEFAULT_BATCH_SIZE)
+        ))
+        return {result.book_id: result.success for response in responses for result in response.results}
+
+    def delete_books(self, book_ids: Sequence[str]) -> Dict[str, bool]:
+        responses = self.call_many("BatchDeleteBooks", (
+            bookstore_pb2.BatchDeleteBooksRequest(book_ids=chunk)
+            for chunk in chunked(list(book_ids), DEFAULT_BATCH_SIZE)
+        ))
+        return {result.book_id: result.success for response in responses for result in response.results}
+
+    def search_many(self, queries: Sequence[str]) -> Dict[str, List[bookstore_pb2.Book]]:
+        responses = self.call_many("SearchBook", (
+            bookstore_pb2.SearchBookRequest(query=query) for query in queries
+        ))
+        return {query: list(response.books) for query, response in zip(queries, responses)}
+
+
+class AsyncBookStoreAPI:
+    # asyncio flavour of BookStoreAPI; the *_many helpers bound in-flight
+    # calls with a semaphore and gather the results in request order.
+    def __init__(self, target: str = DEFAULT_TARGET, pool_size: int = DEFAULT_POOL_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: Optional[float] = None,
+                 options: Optional[List[Tuple[str, object]]] = None):
+        self.pool = AsyncChannelPool(target, pool_size, options)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    async def call(self, method: str, request):
+        return await getattr(self.pool.stub(), method)(request, timeout=self.timeout)
+
+    async def call_many(self, method: str, requests: Iterable) -> list:
+        slots = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(request):
+            async with slots:
+                return await self.call(method, request)
+
+        return await asyncio.gather(*(bounded(request) for request in requests))
+
+    async def add_book(self, request: bookstore_pb2.AddBookRequest) -> bookstore_pb2.AddBookResponse:
+        return await self.call("AddBook", request)
+
+    async def search_books(self, query: str, fields: Sequence[str] = (), limit: int = 0) -> List[bookstore_pb2.Book]:
+        return (await self.search_page(query, limit=limit, fields=fields))[0]
+
+    async def search_page(self, query: str, page_token: str = "", limit: int = 0,
+                          fields: Sequence[str] = ()) -> Tuple[List[bookstore_pb2.Book], str]:
+        request = bookstore_pb2.SearchBookRequest(
+            query=query, limit=limit, page_token=page_token, read_mask=FieldMask(paths=fields)
+        )
+        response = await self.call("SearchBook", request)
+        return list(response.books), response.next_page_token
+
+    async def iter_search(self, query: str, limit: int = 0, fields: Sequence[str] = ()):
+        token = ""
+        while True:
+            books, token = await self.search_page(query, token, limit, fields)
+            for book in books:
+                yield book
+            if not token:
+                return
+
+    async def get_book_by_isbn(self, isbn: str) -> Optional[bookstore_pb2.Book]:
+        response = await self.call("GetBookByIsbn", bookstore_pb2.GetBookByIsbnRequest(isbn=isbn))
+        return response.book if response.found else None
+
+    async def get_books_by_isbn(self, isbns: Sequence[str]) -> bookstore_pb2.BatchGetByIsbnResponse:
+        return await self.call("BatchGetByIsbn", bookstore_pb2.BatchGetByIsbnRequest(isbns=isbns))
+
+    async def update_stock(self, book_id: str, new_stock: int) -> bool:
+        request = bookstore_pb2.UpdateStockRequest(book_id=book_id, new_stock=new_stock)
+        return (await self.call("UpdateStock", request)).success
+
+    async def adjust_stock(self, book_id: str, delta: int, min_floor: int = 0) -> bookstore_pb2.StockChangeResponse:
+        request = bookstore_pb2.AdjustStockRequest(book_id=book_id, delta=delta, min_floor=min_floor)
+        return await self.call("AdjustStock", request)
+
+    async def compare_and_set_stock(self, book_id: str, expected_version: int,
+                                    new_stock: int) -> bookstore_pb2.StockChangeResponse:
+        request = bookstore_pb2.CompareAndSetStockRequest(
+            book_id=book_id, expected_version=expected_version, new_stock=new_stock
+        )
+        return await self.call("CompareAndSetStock", request)
+
+    async def delete_book(self, book_id: str) -> bool:
+        return (await self.call("DeleteBook", bookstore_pb2.DeleteBookRequest(book_id=book_id))).success
+
+    async def list_books(self, page_size: int = 0, page_token: str = "",
+                         fields: Sequence[str] = ()) -> Tuple[List[bookstore_pb2.Book], str]:
+        request = bookstore_pb2.ListBooksRequest(
+            page_size=page_size, page_token=page_token, read_mask=FieldMask(paths=fields)
+        )
+        response = await self.call("ListBooks", request)
+        return list(response.books), response.next_page_token
+
+    async def iter_books(self, page_size: int = 0, fields: Sequence[str] = ()):
+        token = ""
+        while True:
+            books, token = await self.list_books(page_size, token, fields)
+            for book in books:
+                yield book
+            if not token:
+                return
+
+    async def query_books(self, page_token: str = "", fields: Sequence[str] = (),
+                          **filters) -> Tuple[List[bookstore_pb2.Book], str]:
+        request = bookstore_pb2.QueryBooksRequest(page_token=page_token, read_mask=FieldMask(paths=fields), **filters)
+        response = await self.call("QueryBooks", request)
+        return list(response.books), response.next_page_token
+
+    async def stream_books(self, **filters):
+        request = bookstore_pb2.StreamBooksRequest(**filters)
+        async for chunk in self.pool.stub().StreamBooks(request, timeout=self.timeout):
+            for book in chunk.books:
+                yield book
+
+    async def watch_changes(self, from_sequence: int = 0):
+        request = bookstore_pb2.WatchChangesRequest(from_sequence=from_sequence)
+        async for event in self.pool.stub().WatchChanges(request):
+            yield event
+
+    async def bulk_add_books(self, requests: Iterable[bookstore_pb2.AddBookRequest]) -> bookstore_pb2.BulkAddResponse:
+        return await self.pool.stub().BulkAddBooks(iter(requests), timeout=self.timeout)
+
+    async def add_books(self, requests: Sequence[bookstore_pb2.AddBookRequest]) -> List[bookstore_pb2.AddBookResponse]:
+        return await self.call_many("AddBook", requests)
+
+    async def get_book(self, book_id: str) -> Optional[bookstore_pb2.Book]:
+        response = await self.call("GetBook", bookstore_pb2.GetBookRequest(book_id=book_id))
+        return response.book if response.found else None
+
+    async def get_books(self, book_ids: Sequence[str]) -> Dict[str, bookstore_pb2.Book]:
+        responses = await self.call_many("BatchGetBooks", (
+            bookstore_pb2.BatchGetBooksRequest(book_ids=chunk)
+            for chunk in chunked(list(book_ids), DEFAULT_BATCH_SIZE)
+        ))
+        return {book.id: book for response in responses for book in response.books}
+
+    async def update_stocks(self, stocks: Dict[str, int]) -> Dict[str, bool]:
+        responses = await self.call_many("BatchUpdateStock", (
+            bookstore_pb2.BatchUpdateStockRequest(updates=[
+                bookstore_pb2.UpdateStockRequest(book_id=book_id, new_stock=new_stock)
+                for book_id, new_stock in chunk
+            ])
+            for chunk in chunked(list(stocks.items()), DEFAULT_BATCH_SIZE)
+        ))
+        return {result.book_id: result.success for response in responses for result in response.results}
+
+    async def delete_books(self, book_ids: Sequence[str]) -> Dict[str, bool]:
+        responses = await self.call_many("BatchDeleteBooks", (
+            bookstore_pb2.BatchDeleteBooksRequest(book_ids=chunk)
+            for chunk in chunked(list(book_ids), DEFAULT_BATCH_SIZE)
+        ))
+        return {result.book_id: result.success for response in responses for result in response.results}
+
+    async def search_many(self, queries: Sequence[str]) -> Dict[str, List[bookstore_pb2.Book]]:
+        responses = await self.call_many("SearchBook", (
+            bookstore_pb2.SearchBookRequest(query=query) for query in queries
+        ))
+        return {query: list(response.books) for query, response in zip(queries, responses)}
@@ -1,77 +1,981 @@
+import argparse
 import grpc
-from concurrent import futures
 import uuid
 import bookstore_pb2
 import bookstore_pb2_grpc
-from typing import Dict, List
+from bookstore_cache import (
+    CachedSearch, SearchCache, DEFAULT_CACHE_BYTES, DEFAULT_CACHE_ENTRIES, DEFAULT_CACHE_TTL, part_size
+)
+from bookstore_admission import Admission, AdmissionInterceptor, ScanExpired, expiry_check, parse_method_limits
+from bookstore_broker import Broker, SubscriptionClosed, DEFAULT_CAPACITY, OVERFLOW_POLICIES
+from bookstore_changes import ADDED, DELETED, UPDATED, ChangeLog, ChangesTrimmed
+import bookstore_changes
+from bookstore_columns import BookTable
+from bookstore_chat import ChatHistory, DEFAULT_MAX_BYTES, DEFAULT_MAX_MESSAGES
+from bookstore_index import RangeIndex, TermIndex, TrigramIndex, UniqueIndex
+from bookstore_locks import ReadWriteLock
+from bookstore_metrics import InstrumentedExecutor, Metrics, MetricsInterceptor, collect_store_stats, serve_text
+from bookstore_persistence import Persistence, WriteAheadLog, FSYNC_INTERVAL, FSYNC_POLICIES
+from bookstore_ranking import Bm25, FieldStats, feature_reader, query_terms
+from bookstore_wire import (
+    DEFAULT_COMPRESSION_THRESHOLD, EncodedMessage, ResponseCompression, add_servicer_to_server, book_projection,
+    encode_doubles, encode_int, encode_messages, encode_string
+)
+from typing import Callable, Dict, List, Optional, Set
+import base64
+import bisect
+import heapq
+import itertools
 import math
+import os
 import time
 import threading
+import zlib
+from array import array
 from datetime import datetime
 import queue
 
+DEFAULT_PAGE_SIZE = 10
+DEFAULT_SHARDS = 16
+BULK_BATCH_SIZE = 1000
+STREAM_CHUNK_SIZE = 100
+MAX_STREAM_CHUNK_SIZE = 1000
+# Entries a deep ListBooks page skips between deadline checks.
+SCAN_CHECK_INTERVAL = 4096
+# Change events a watcher takes from the change log at a time.
+WATCH_BATCH = 256
+MAX_QUERY_LIMIT = 1000
+MAX_STOCK = 2**31 - 1
+
+
+def new_book_ids(count: int) -> List[str]:
+    # One urandom call per batch instead of one per uuid4().
+    entropy = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=entropy[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
+
+
+def book_from_request(request: bookstore_pb2.AddBookRequest, book_id: str) -> bookstore_pb2.Book:
+    return bookstore_pb2.Book(
+        id=request.id or book_id,
+        title=request.title,
+        author=request.author,
+        isbn=request.isbn,
+        stock=request.stock,
+        price=request.price
+    )
+
+
+def validate_book_request(request: bookstore_pb2.AddBookRequest) -> Optional[str]:
+    if not request.title.strip():
+        return "Title is required"
+    if request.stock < 0:
+        return "Stock cannot be negative"
+    if request.price < 0:
+        return "Price cannot be negative"
+    return None
+
+
+def normalize_isbn(isbn: str) -> str:
+    return isbn.replace("-", "").replace(" ", "").upper()
+
+
+def book_filter(request) -> Callable[[bookstore_pb2.Book], bool]:
+    query = request.query.lower()
+    author = request.author.lower()
+    
+    def matches(book: bookstore_pb2.Book) -> bool:
+        if query and query not in book.title.lower() and query not in book.author.lower():
+            return False
+        if author and book.author.lower() != author:
+            return False
+        if book.stock < request.min_stock or book.price < request.min_price:
+            return False
+        return request.max_price <= 0 or book.price <= request.max_price
+    
+    return matches
+
+
+def encode_page_token(seq: int) -> str:
+    return base64.urlsafe_b64encode(f"v1:{seq}".encode()).decode()
+
+
+def decode_page_token(token: str) -> int:
+    try:
+        version, seq = base64.urlsafe_b64decode(token.encode()).decode().split(":")
+        if version != "v1":
+            raise ValueError(version)
+        return int(seq)
+    except Exception:
+        raise ValueError(f"Invalid page token: {token!r}")
+
+
+def encode_search_token(request: bookstore_pb2.SearchBookRequest, key: float, seq: int, stats: List[int]) -> str:
+    # Ties the position to the query it was produced for, and keeps the word
+    # statistics it was scored with: the next pages are scored with the
+    # same ones, so positions do not move as writes change the statistics.
+    text = f"s2:{zlib.crc32(request.query.lower().encode())}:{key!r}:{seq}:{'.'.join(map(str, stats))}"
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def decode_search_token(request: bookstore_pb2.SearchBookRequest) -> tuple[tuple[float, int], List[int]]:
+    try:
+        version, query, key, seq, stats = base64.urlsafe_b64decode(request.page_token.encode()).decode().split(":")
+        stats = [int(value) for value in stats.split(".")]
+        if (version != "s2" or int(query) != zlib.crc32(request.query.lower().encode())
+                or len(stats) != 2 * (len(query_terms(request.query)) + 2) or min(stats) < 0):
+            raise ValueError(version)
+        return (float(key), int(seq)), stats
+    except Exception:
+        raise ValueError(f"Invalid page token: {request.page_token!r}")
+
+
+def encode_query_token(request: bookstore_pb2.QueryBooksRequest, key: float, seq: int) -> str:
+    # Ties the position to the sort it was produced under.
+    text = f"q1:{request.sort_by}:{int(request.descending)}:{key!r}:{seq}"
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def decode_query_token(request: bookstore_pb2.QueryBooksRequest) -> tuple[float, int]:
+    try:
+        version, sort_by, descending, key, seq = \
+            base64.urlsafe_b64decode(request.page_token.encode()).decode().split(":")
+        if version != "q1" or int(sort_by) != request.sort_by or bool(int(descending)) != request.descending:
+            raise ValueError(version)
+        return float(key), int(seq)
+    except Exception:
+        raise ValueError(f"Invalid page token: {request.page_token!r}")
+
+
+class CatalogView:
+    # A point-in-time view of the catalog for long scans. It covers every book
+    # whose sequence number was issued before `watermark`; writers that change
+    # or delete such a book before the scan reaches it first hand the old
+    # version to preserve(), so the scan still sees the catalog as it was when
+    # the view opened. Memory grows with concurrent writes, not catalog size.
+    def __init__(self, watermark: int):
+        self.watermark = watermark
+        self.position = 0
+        self.preimages: Dict[int, bookstore_pb2.Book] = {}
+        self.lock = threading.Lock()
+    
+    def preserve(self, seq: int, book: bookstore_pb2.Book) -> None:
+        if self.position < seq <= self.watermark:
+            with self.lock:
+                self.preimages.setdefault(seq, book)
+    
+    def take_preimages(self) -> List[tuple[int, bookstore_pb2.Book]]:
+        with self.lock:
+            return [(seq, book) for seq, book in self.preimages.items() if seq > self.position]
+    
+    def advance(self, seq: int) -> None:
+        with self.lock:
+            self.position = seq
+            for old in [old for old in self.preimages if old <= seq]:
+                del self.preimages[old]
+
+
+class BookShard:
+    # One partition of the catalog. Writers hold `lock.write`, scans hold
+    # `lock.read`; the methods below assume the caller already holds the
+    # appropriate side of the lock. Books live in a columnar BookTable and
+    # are materialized as Book messages only when read, so a returned Book
+    # is always a private copy.
+    COMPACT_MIN_ROWS = 1024
+    ENCODED_ROWS = 4096
+    
+    def __init__(self, next_seq):
+        self.lock = ReadWriteLock()
+        # Books are listed in insertion order: every id gets a monotonically
+        # increasing sequence number from a store-wide counter, and table rows
+        # are kept in sequence order, so a cursor can be resumed with a bisect
+        # on `table.seqs` and merging shards by sequence number reproduces the
+        # global insertion order. Deleted rows stay behind as tombstones until
+        # they outnumber the live ones.
+        self.next_seq = next_seq
+        self.table = BookTable()
+        self.search_index = TrigramIndex()
+        # Words of the titles and authors, for ranking search results.
+        self.title_terms = TermIndex()
+        self.author_terms = TermIndex()
+        # Sorted (value, seq) pairs for range queries. They are keyed by
+        # sequence number, so compaction leaves them untouched.
+        self.price_index = RangeIndex("f")
+        self.stock_index = RangeIndex("i")
+        # Rows whose title or author changed still have postings for their old
+        # text; their search matches are re-verified until the next compaction.
+        self.dirty: Set[int] = set()
+        self.views: List[CatalogView] = []
+        # Bumped by every write so cached search results can tell whether
+        # their part of this shard is still current.
+        self.generation = 0
+        # Wire encodings of recently listed books by row, so hot pages are
+        # answered without materializing and re-serializing every Book. Any
+        # write to a row drops its entry; readers fill it under `encoded_lock`.
+        self.encoded: Dict[int, bytes] = {}
+        self.encoded_lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.table)
+    
+    def preserve(self, row: int) -> None:
+        seq = self.table.seqs[row]
+        book = None
+        for view in self.views:
+            if view.position < seq <= view.watermark:
+                book = book or self.table.book(row)
+                view.preserve(seq, book)
+    
+    def get(self, book_id: str) -> Optional[bookstore_pb2.Book]:
+        row = self.table.rows.get(book_id)
+        return self.table.book(row) if row is not None else None
+    
+    def stock(self, book_id: str) -> Optional[tuple[int, int]]:
+        # (stock, version), read without materializing the book.
+        row = self.table.rows.get(book_id)
+        return (self.table.stocks[row], self.table.versions[row]) if row is not None else None
+    
+    def isbn(self, book_id: str) -> Optional[str]:
+        row = self.table.rows.get(book_id)
+        return self.table.isbns.get(row) if row is not None else None
+    
+    def put(self, book: bookstore_pb2.Book, seq: Optional[int] = None, replay: bool = False) -> bool:
+        # Also stamps `book` with its stored version. A new book takes `seq`
+        # when given, which must be above every sequence number in the shard.
+        # A replayed book keeps the version it carries.
+        table = self.table
+        row = table.rows.get(book.id)
+        self.generation += 1
+        if row is None:
+            row = table.append(seq if seq is not None else self.next_seq(), book)
+            self.search_index.add(row, book.title, book.author)
+            self.title_terms.add(row, book.title)
+            self.author_terms.add(row, book.author)
+            self.price_index.insert(table.prices[row], table.seqs[row])
+            self.stock_index.insert(table.stocks[row], table.seqs[row])
+            book.version = table.versions[row]
+            return True
+        
+        if self.views:
+            self.preserve(row)
+        self.encoded.pop(row, None)
+        text_changed = table.title(row) != book.title or table.author(row) != book.author
+        old_price, old_stock = table.prices[row], table.stocks[row]
+        table.update(row, book, replay)
+        self.move(self.price_index, table.seqs[row], old_price, table.prices[row])
+        self.move(self.stock_index, table.seqs[row], old_stock, table.stocks[row])
+        book.version = table.versions[row]
+        if text_changed:
+            self.dirty.add(row)
+            self.search_index.add(row, book.title, book.author)
+            self.title_terms.add(row, book.title)
+            self.author_terms.add(row, book.author)
+            self.maybe_compact()
+        return False
+    
+    def set_stock(self, book_id: str, stock: int) -> Optional[bookstore_pb2.Book]:
+        row = self.table.rows.get(book_id)
+        if row is None:
+            return None
+        if self.views:
+            self.preserve(row)
+        self.move(self.stock_index, self.table.seqs[row], self.table.stocks[row], stock)
+        self.table.stocks[row] = stock
+        self.table.versions[row] += 1
+        self.encoded.pop(row, None)
+        self.generation += 1
+        return self.table.book(row)
+    
+    def remove(self, book_id: str) -> bool:
+        row = self.table.rows.get(book_id)
+        if row is None:
+            return False
+        if self.views:
+            self.preserve(row)
+        self.generation += 1
+        self.encoded.pop(row, None)
+        self.price_index.remove(self.table.prices[row], self.table.seqs[row])
+        self.stock_index.remove(self.table.stocks[row], self.table.seqs[row])
+        self.table.delete(row)
+        self.dirty.discard(row)
+        self.maybe_compact()
+        return True
+    
+    def move(self, index: RangeIndex, seq: int, old: float, new: float) -> None:
+        if old != new:
+            index.remove(old, seq)
+            index.insert(new, seq)
+    
+    def maybe_compact(self) -> None:
+        table = self.table
+        if table.dead + len(self.dirty) <= max(len(table), self.COMPACT_MIN_ROWS):
+            return
+        compacted, mapping = table.compacted()
+        index = self.search_index.remapped(mapping, self.dirty)
+        for row in self.dirty:
+            new_row = mapping[row]
+            index.add(new_row, compacted.title(new_row), compacted.author(new_row))
+        # Word statistics are recounted from scratch rather than remapped.
+        self.title_terms = TermIndex()
+        self.author_terms = TermIndex()
+        for row in compacted.live_rows():
+            self.title_terms.add(row, compacted.title(row))
+            self.author_terms.add(row, compacted.author(row))
+        self.table = compacted
+        self.search_index = index
+        self.dirty = set()
+        self.encoded = {}
+    
+    def encode(self, row: int, keep: bool = True) -> bytes:
+        data = self.encoded.get(row)
+        if data is None:
+            data = self.table.book(row).SerializeToString()
+            if keep:
+                with self.encoded_lock:
+                    if len(self.encoded) >= self.ENCODED_ROWS:
+                        del self.encoded[next(iter(self.encoded))]
+                    self.encoded[row] = data
+        return data
+    
+    def matches(self, row: int, query: str) -> bool:
+        return query in self.table.title(row).lower() or query in self.table.author(row).lower()
+    
+    def search_rows(self, query: str) -> List[int]:
+        table = self.table
+        query = query.lower()
+        if not query:
+            return list(table.live_rows())
+        
+        rows, exact = self.search_index.candidates(query)
+        ids = table.ids
+        dirty = self.dirty
+        results = []
+        seen_dirty = set()
+        for row in rows:
+            if ids[row] is None:
+                continue
+            if row in dirty:
+                if row in seen_dirty or not self.matches(row, query):
+                    continue
+                seen_dirty.add(row)
+            elif not exact and not self.matches(row, query):
+                continue
+            results.append(row)
+        return results
+    
+    def search(self, query: str) -> List[bookstore_pb2.Book]:
+        return [self.table.book(row) for row in self.search_rows(query)]
+    
+    def search_encoded(self, query: str) -> List[bytes]:
+        # Search results are cached by the store as a whole, so they reuse
+        # encodings already here but do not push listed books out.
+        return [self.encode(row, keep=False) for row in self.search_rows(query)]
+    
+    def ranking_features(self, query: str, terms: List[str]) -> Callable[[int], Optional[tuple]]:
+        return feature_reader(query, terms, (self.title_terms, self.author_terms), self.table.author)
+    
+    def search_ranked(self, query: str, terms: List[str], ranker: Bm25, limit: int,
+                      after: Optional[tuple[float, int]], encoded: bool = False) -> List[tuple]:
+        # This shard's first `limit` matches as (-score, seq, book) after
+        # `after`. Only the matches are scored, and only the page is
+        # materialized.
+        table = self.table
+        features = self.ranking_features(query, terms)
+        score = ranker.score
+        seqs = table.seqs
+        entries = ((-score(features(row)), seqs[row], row) for row in self.search_rows(query))
+        if after is not None:
+            entries = (entry for entry in entries if entry[:2] > after)
+        return [
+            (key, seq, self.encode(row, keep=False) if encoded else table.book(row))
+            for key, seq, row in heapq.nsmallest(limit, entries)
+        ]
+    
+    def search_part(self, query: str, terms: List[str],
+                    ranked: bool) -> tuple[array, Optional[List[bytes]], Optional[list]]:
+        # Every match's sequence number for the store's search cache, with
+        # their ranking features when `ranked` and otherwise their wire
+        # encodings. Ranked pages are only a few books, read back by
+        # sequence number, so encoding every match would be wasted.
+        rows = self.search_rows(query)
+        seqs = self.table.seqs
+        seqs = array("Q", [seqs[row] for row in rows])
+        if ranked:
+            return seqs, None, list(map(self.ranking_features(query, terms), rows))
+        return seqs, [self.encode(row, keep=False) for row in rows], None
+    
+    def live_entries(self):
+        return ((self.table.seqs[row], row, self) for row in self.table.live_rows())
+    
+    def entries(self):
+        table = self.table
+        return ((table.seqs[row], table.book(row)) for row in table.live_rows())
+    
+    def seqs_after(self, after_seq: int, limit: int) -> List[int]:
+        table = self.table
+        rows = table.live_rows(bisect.bisect_right(table.seqs, after_seq))
+        return [table.seqs[row] for row in itertools.islice(rows, limit)]
+    
+    def row_at(self, seq: int) -> Optional[int]:
+        table = self.table
+        row = bisect.bisect_left(table.seqs, seq)
+        if row < len(table.seqs) and table.seqs[row] == seq and table.ids[row] is not None:
+            return row
+        return None
+    
+    def books_at(self, seqs: List[int], encoded: bool = False) -> List[tuple]:
+        # The books still stored under the given sequence numbers, as Book
+        # messages or, with `encoded`, as their wire encodings.
+        found = []
+        for seq in seqs:
+            row = self.row_at(seq)
+            if row is not None:
+                found.append((seq, self.encode(row) if encoded else self.table.book(row)))
+        return found
+    
+    def query(self, index: RangeIndex, low: tuple, high: tuple, descending: bool,
+              accept: Callable[[BookTable, int], bool], limit: int) -> List[tuple]:
+        # Up to `limit` (key, seq, Book) entries of `index` between `low` and
+        # `high`, in index order, whose rows pass `accept`.
+        results = []
+        for key, seq in index.scan(low, high, descending):
+            row = self.row_at(seq)
+            if row is not None and accept(self.table, row):
+                results.append((key, seq, self.table.book(row)))
+                if len(results) == limit:
+                    break
+        return results
+
+
 class BookStore:
-    def __init__(self):
-        self.books: Dict[str, bookstore_pb2.Book] = {}
-        self.subscribers = []
-        self.chat_messages = []
+    def __init__(self, num_shards: int = DEFAULT_SHARDS, broker: Optional[Broker] = None,
+                 chat_history: Optional[ChatHistory] = None, search_cache: Optional[SearchCache] = None,
+                 changes: Optional[ChangeLog] = None):
+        self.last_seq = 0
+        self.seq_lock = threading.Lock()
+        self.shards = [BookShard(self.next_seq) for _ in range(num_shards)]
+        self.broker = broker if broker is not None else Broker()
+        self.wal: Optional[WriteAheadLog] = None
+        self.chat_history = chat_history if chat_history is not None else ChatHistory()
+        self.search_cache = search_cache if search_cache is not None else SearchCache()
+        self.changes = changes if changes is not None else ChangeLog()
+        # Normalized ISBN -> id of the book holding it.
+        self.isbns = UniqueIndex()
         self.active_chat_clients = {}  # username -> queue
+        self.chat_lock = threading.Lock()
     
-    def add_book(self, book: bookstore_pb2.Book) -> None:
-        self.books[book.id] = book
-        for subscriber in self.subscribers:
-            try:
-                subscriber.put(book)
-            except:
-                self.subscribers.remove(subscriber)
+    def next_seq(self) -> int:
+        with self.seq_lock:
+            self.last_seq += 1
+            return self.last_seq
+    
+    def shard_for(self, book_id: str) -> BookShard:
+        return self.shards[hash(book_id) % len(self.shards)]
+    
+    def count(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+    
+    def iter_books(self):
+        for shard in self.shards:
+            with shard.lock.read:
+                books = [book for _, book in shard.entries()]
+            yield from books
+    
+    def put_book(self, shard: BookShard, book: bookstore_pb2.Book, replay: bool = False,
+                 seq: Optional[int] = None) -> Optional[str]:
+        # Stores `book` in `shard`, whose write lock the caller holds, unless
+        # its ISBN belongs to another book; that book's id is returned instead.
+        # Replayed writes always take the ISBN so recovery reproduces the log.
+        isbn = normalize_isbn(book.isbn)
+        old = shard.isbn(book.id)
+        old = normalize_isbn(old) if old is not None else ""
+        if isbn and isbn != old:
+            owner = self.isbns.claim(isbn, book.id, replace=replay)
+            if owner is not None:
+                return owner
+        if old and old != isbn:
+            self.isbns.release(old, book.id)
+        shard.put(book, seq, replay)
+        return None
+    
+    def remove_book(self, shard: BookShard, book_id: str) -> bool:
+        isbn = shard.isbn(book_id)
+        if isbn is None or not shard.remove(book_id):
+            return False
+        if isbn:
+            self.isbns.release(normalize_isbn(isbn), book_id)
+        return True
+    
+    # log_put/log_delete record an applied change in the change feed and the
+    # WAL. Callers hold the book's shard write lock, so both see each book's
+    # changes in the order they were made.
+    def log_put(self, kind: int, book: bookstore_pb2.Book) -> int:
+        self.changes.append(kind, book.id, book)
+        return self.wal.put(book) if self.wal else 0
+    
+    def log_delete(self, book_id: str) -> int:
+        self.changes.append(DELETED, book_id)
+        return self.wal.delete(book_id) if self.wal else 0
+    
+    def add_book(self, book: bookstore_pb2.Book) -> Optional[str]:
+        # Returns the id of the book already holding `book`'s ISBN, in which
+        # case nothing was stored.
+        shard = self.shard_for(book.id)
+        with shard.lock.write:
+            kind = UPDATED if book.id in shard.table else ADDED
+            owner = self.put_book(shard, book)
+            if owner is not None:
+                return owner
+            lsn = self.log_put(kind, book)
+        if self.wal:
+            self.wal.wait(lsn)
+        # Overwrites, e.g. a retried or resumed ingest, are not new books.
+        if kind == ADDED:
+            self.broker.publish(book)
+        return None
+    
+    def add_books(self, books: List[bookstore_pb2.Book]) -> Dict[int, str]:
+        # Returns the positions of the books rejected for a taken ISBN, mapped
+        # to the id of the book holding it. The n-th book in the batch to
+        # carry an ISBN is stored in round n, so when several books claim the
+        # same new ISBN the first one in the batch gets it.
+        rounds: List[Dict[int, List[int]]] = []
+        occurrences: Dict[str, int] = {}
+        for i, book in enumerate(books):
+            isbn = normalize_isbn(book.isbn)
+            n = occurrences.get(isbn, 0) if isbn else 0
+            if isbn:
+                occurrences[isbn] = n + 1
+            if n == len(rounds):
+                rounds.append({})
+            rounds[n].setdefault(hash(book.id) % len(self.shards), []).append(i)
+        
+        rejected: Dict[int, str] = {}
+        added: List[int] = []
+        lsn = 0
+        for by_shard in rounds:
+            for index, positions in by_shard.items():
+                shard = self.shards[index]
+                with shard.lock.write:
+                    for i in positions:
+                        kind = UPDATED if books[i].id in shard.table else ADDED
+                        owner = self.put_book(shard, books[i])
+                        if owner is not None:
+                            rejected[i] = owner
+                        else:
+                            lsn = max(lsn, self.log_put(kind, books[i]))
+                            if kind == ADDED:
+                                added.append(i)
+        if self.wal:
+            self.wal.wait(lsn)
+        self.broker.publish_many([books[i] for i in sorted(added)])
+        return rejected
+    
+    # apply_put/apply_delete replay recovered or replicated state: no
+    # logging, no fan-out. A replica passes the primary's sequence number so
+    # page tokens mean the same thing in every process.
+    def apply_put(self, book: bookstore_pb2.Book, seq: Optional[int] = None) -> None:
+        shard = self.shard_for(book.id)
+        with shard.lock.write:
+            if seq is not None:
+                with self.seq_lock:
+                    self.last_seq = max(self.last_seq, seq)
+            self.put_book(shard, book, replay=True, seq=seq)
+    
+    def apply_delete(self, book_id: str) -> None:
+        shard = self.shard_for(book_id)
+        with shard.lock.write:
+            self.remove_book(shard, book_id)
     
     def get_book(self, book_id: str) -> bookstore_pb2.Book:
-        return self.books.get(book_id)
+        shard = self.shard_for(book_id)
+        with shard.lock.read:
+            return shard.get(book_id)
     
-    def search_books(self, query: str) -> List[bookstore_pb2.Book]:
-        query = query.lower()
+    def positions_by_shard(self, book_ids: List[str]) -> Dict[int, List[int]]:
+        # Batch operations take each shard's lock once for all of its items;
+        # items of one shard keep their request order.
+        by_shard: Dict[int, List[int]] = {}
+        for i, book_id in enumerate(book_ids):
+            by_shard.setdefault(hash(book_id) % len(self.shards), []).append(i)
+        return by_shard
+    
+    def get_books(self, book_ids: List[str]) -> Dict[str, bookstore_pb2.Book]:
+        books = {}
+        for index, positions in self.positions_by_shard(book_ids).items():
+            shard = self.shards[index]
+            with shard.lock.read:
+                for i in positions:
+                    book = shard.get(book_ids[i])
+                    if book is not None:
+                        books[book_ids[i]] = book
+        return books
+    
+    def get_books_by_isbn(self, isbns: List[str]) -> List[Optional[bookstore_pb2.Book]]:
+        keys = [normalize_isbn(isbn) for isbn in isbns]
+        owners = [self.isbns.get(key) if key else None for key in keys]
+        books = self.get_books([owner for owner in owners if owner is not None])
+        # A book can change its ISBN between the index lookup and the read.
+        found = [books.get(owner) if owner is not None else None for owner in owners]
         return [
-            book for book in self.books.values()
-            if query in book.title.lower() or query in book.author.lower()
+            book if book is not None and normalize_isbn(book.isbn) == key else None
+            for key, book in zip(keys, found)
         ]
     
-    def list_books(self, page: int, page_size: int) -> tuple[List[bookstore_pb2.Book], int, int]:
-        books = list(self.books.values())
-        total_books = len(books)
-        total_pages = math.ceil(total_books / page_size)
+    def update_stock(self, book_id: str, new_stock: int) -> bool:
+        shard = self.shard_for(book_id)
+        with shard.lock.write:
+            updated = shard.set_stock(book_id, new_stock)
+            if updated is None:
+                return False
+            lsn = self.log_put(UPDATED, updated)
+        if self.wal:
+            self.wal.wait(lsn)
+        return True
+    
+    def change_stock(self, book_id: str, change: Callable[[int, int], Optional[int]]) -> tuple[bool, int, int]:
+        # Applies change(stock, version) -> new stock, or None to refuse, while
+        # holding the shard's write lock, so concurrent changes to one book
+        # never interleave. Returns (applied, stock, version) as they stand
+        # afterwards; version 0 means the book does not exist.
+        shard = self.shard_for(book_id)
+        with shard.lock.write:
+            current = shard.stock(book_id)
+            if current is None:
+                return False, 0, 0
+            new_stock = change(*current)
+            if new_stock is None:
+                return False, current[0], current[1]
+            book = shard.set_stock(book_id, new_stock)
+            lsn = self.log_put(UPDATED, book)
+        if self.wal:
+            self.wal.wait(lsn)
+        return True, book.stock, book.version
+    
+    def adjust_stock(self, book_id: str, delta: int, min_floor: int) -> tuple[bool, int, int]:
+        def change(stock: int, version: int) -> Optional[int]:
+            new_stock = stock + delta
+            return new_stock if min_floor <= new_stock <= MAX_STOCK else None
+        return self.change_stock(book_id, change)
+    
+    def compare_and_set_stock(self, book_id: str, expected_version: int, new_stock: int) -> tuple[bool, int, int]:
+        return self.change_stock(book_id, lambda stock, version: new_stock if version == expected_version else None)
+    
+    def update_stocks(self, updates: List[tuple[str, int]]) -> List[bool]:
+        updated = [False] * len(updates)
+        lsn = 0
+        for index, positions in self.positions_by_shard([book_id for book_id, _ in updates]).items():
+            shard = self.shards[index]
+            with shard.lock.write:
+                for i in positions:
+                    book = shard.set_stock(*updates[i])
+                    if book is not None:
+                        updated[i] = True
+                        lsn = max(lsn, self.log_put(UPDATED, book))
+        if self.wal:
+            self.wal.wait(lsn)
+        return updated
+    
+    def delete_book(self, book_id: str) -> bool:
+        shard = self.shard_for(book_id)
+        with shard.lock.write:
+            if not self.remove_book(shard, book_id):
+                return False
+            lsn = self.log_delete(book_id)
+        if self.wal:
+            self.wal.wait(lsn)
+        return True
+    
+    def delete_books(self, book_ids: List[str]) -> List[bool]:
+        deleted = [False] * len(book_ids)
+        lsn = 0
+        for index, positions in self.positions_by_shard(book_ids).items():
+            shard = self.shards[index]
+            with shard.lock.write:
+                for i in positions:
+                    if self.remove_book(shard, book_ids[i]):
+                        deleted[i] = True
+                        lsn = max(lsn, self.log_delete(book_ids[i]))
+        if self.wal:
+            self.wal.wait(lsn)
+        return deleted
+    
+    # Scans take an optional `expired` check, polled before each shard, and
+    # raise ScanExpired once it is true instead of finishing work nobody
+    # will receive.
+    def search_books(self, query: str, expired: Optional[Callable[[], bool]] = None) -> List[bookstore_pb2.Book]:
+        if self.search_cache.max_entries <= 0:
+            results = []
+            for shard in self.shards:
+                if expired is not None and expired():
+                    raise ScanExpired()
+                with shard.lock.read:
+                    results.extend(shard.search(query))
+            return results
+        return [bookstore_pb2.Book.FromString(data) for data in self.search_encoded(query, expired)]
+    
+    def search_encoded(self, query: str, expired: Optional[Callable[[], bool]] = None) -> List[bytes]:
+        if self.search_cache.max_entries <= 0:
+            results = []
+            for shard in self.shards:
+                if expired is not None and expired():
+                    raise ScanExpired()
+                with shard.lock.read:
+                    results.extend(shard.search_encoded(query))
+            return results
+        return list(itertools.chain.from_iterable(self.cached_search(query, expired).parts))
+    
+    def cached_search(self, query: str, expired: Optional[Callable[[], bool]] = None,
+                      ranked: bool = False) -> CachedSearch:
+        # Reuse every shard's cached part whose generation is unchanged and
+        # recompute only the parts of shards written to since. Ranked
+        # searches fill in ranking features and the others encodings, each
+        # only when they need them; a part of an unchanged shard can hold both.
+        cache = self.search_cache
+        query = query.lower()
+        cached = cache.get(query)
+        if cached is not None and all(
+            generation == shard.generation and held is not None
+            for generation, held, shard in zip(cached.generations, cached.features if ranked else cached.parts,
+                                               self.shards)
+        ):
+            cache.record(True, False)
+            return cached
         
-        start = (page - 1) * page_size
-        end = start + page_size
-        return books[start:end], total_books, total_pages
+        terms = query_terms(query)
+        count = len(self.shards)
+        generations = list(cached.generations) if cached is not None else [-1] * count
+        parts = list(cached.parts) if cached is not None else [None] * count
+        sizes = list(cached.sizes) if cached is not None else [0] * count
+        seqs = list(cached.seqs) if cached is not None else [None] * count
+        features = list(cached.features) if cached is not None else [None] * count
+        for i, shard in enumerate(self.shards):
+            if generations[i] == shard.generation and (features if ranked else parts)[i] is not None:
+                continue
+            if expired is not None and expired():
+                raise ScanExpired()
+            with shard.lock.read:
+                if generations[i] != shard.generation:
+                    generations[i] = shard.generation
+                    parts[i] = features[i] = None
+                seqs[i], part, part_features = shard.search_part(query, terms, ranked)
+            if ranked:
+                features[i] = part_features
+            else:
+                parts[i] = part
+            sizes[i] = part_size(parts[i], seqs[i], features[i])
+        cache.record(False, cached is not None)
+        entry = CachedSearch(generations, parts, sizes, cache.expiry(), seqs, features)
+        cache.put(query, entry)
+        return entry
     
-    def add_subscriber(self, subscriber):
-        self.subscribers.append(subscriber)
+    def search_ranked(self, query: str, limit: int, after: Optional[tuple[float, int]] = None, encoded: bool = False,
+                      expired: Optional[Callable[[], bool]] = None,
+                      stats: Optional[List[int]] = None) -> tuple[list, List[float], Optional[tuple], List[int]]:
+        # The `limit` most relevant matches of `query` after the (-score,
+        # seq) position `after`: their books, their scores, the position to
+        # continue from, None once the matches are exhausted, and the word
+        # statistics they were scored with. Statistics are catalog-wide and
+        # gathered unless `stats` passes those of an earlier page. With the
+        # search cache on, the matches and their features come from the
+        # query's cache entry, so a write only recomputes its own shard's
+        # part and the rest is rescored from the cache; only the page's books
+        # are then read back from the shards.
+        terms = query_terms(query)
+        if stats is not None:
+            fields = [FieldStats.from_values(terms, stats[:len(terms) + 2]),
+                      FieldStats.from_values(terms, stats[len(terms) + 2:])]
+        else:
+            fields = [FieldStats(terms), FieldStats(terms)]
+            for shard in self.shards:
+                with shard.lock.read:
+                    fields[0].add(shard.title_terms)
+                    fields[1].add(shard.author_terms)
+        ranker = Bm25(fields)
+        if self.search_cache.max_entries <= 0:
+            parts = []
+            for shard in self.shards:
+                if expired is not None and expired():
+                    raise ScanExpired()
+                with shard.lock.read:
+                    parts.append(shard.search_ranked(query, terms, ranker, limit, after, encoded))
+            top = list(itertools.islice(heapq.merge(*parts), limit))
+        else:
+            entry = self.cached_search(query, expired, ranked=True)
+            score = ranker.score
+            entries = (
+                (-score(features), seq, i)
+                for i, (seqs, part_features) in enumerate(zip(entry.seqs, entry.features))
+                for seq, features in zip(seqs, part_features)
+            )
+            if after is not None:
+                entries = (entry for entry in entries if entry[:2] > after)
+            top = heapq.nsmallest(limit, entries)
+            books = {}
+            for i, shard in enumerate(self.shards):
+                seqs = [seq for _, seq, owner in top if owner == i]
+                if seqs:
+                    with shard.lock.read:
+                        books.update(shard.books_at(seqs, encoded))
+            # A book deleted since the entry was checked is left out.
+            top = [(key, seq, books.get(seq)) for key, seq, _ in top]
+        last = top[-1][:2] if len(top) == limit else None
+        top = [entry for entry in top if entry[2] is not None]
+        return [book for _, _, book in top], [-key for key, _, _ in top], last, fields[0].values() + fields[1].values()
+    
+    def list_books(self, page: int, page_size: int,
+                   expired: Optional[Callable[[], bool]] = None) -> tuple[List[bookstore_pb2.Book], int, int]:
+        start = max((page - 1) * page_size, 0)
+        for shard in self.shards:
+            shard.lock.acquire_read()
+        try:
+            total_books = self.count()
+            total_pages = math.ceil(total_books / page_size)
+            merged = heapq.merge(*(shard.live_entries() for shard in self.shards))
+            # A deep page merges every entry before it; skip them in chunks
+            # so an expired call stops early.
+            while start > SCAN_CHECK_INTERVAL and expired is not None:
+                if expired():
+                    raise ScanExpired()
+                next(itertools.islice(merged, SCAN_CHECK_INTERVAL - 1, SCAN_CHECK_INTERVAL), None)
+                start -= SCAN_CHECK_INTERVAL
+            books = [
+                shard.table.book(row)
+                for seq, row, shard in itertools.islice(merged, start, start + page_size)
+            ]
+        finally:
+            for shard in self.shards:
+                shard.lock.release_read()
+        return books, total_books, total_pages
+    
+    def open_view(self) -> CatalogView:
+        # Registering with every shard while holding all write locks makes the
+        # watermark exact: no write is half-applied when the view opens.
+        for shard in self.shards:
+            shard.lock.acquire_write()
+        try:
+            view = CatalogView(self.last_seq)
+            for shard in self.shards:
+                shard.views = shard.views + [view]
+        finally:
+            for shard in self.shards:
+                shard.lock.release_write()
+        return view
+    
+    def close_view(self, view: CatalogView) -> None:
+        for shard in self.shards:
+            with shard.lock.write:
+                shard.views = [other for other in shard.views if other is not view]
+    
+    def seqs_after(self, after_seq: int, limit: int) -> List[tuple[int, int]]:
+        # The first `limit` live (seq, shard index) pairs after `after_seq`.
+        # Only sequence numbers are gathered here; books_at() then
+        # materializes just the ones that make the page.
+        candidates = []
+        for i, shard in enumerate(self.shards):
+            with shard.lock.read:
+                candidates.extend((seq, i) for seq in shard.seqs_after(after_seq, limit))
+        candidates.sort()
+        return candidates[:limit]
+    
+    def books_at(self, entries: List[tuple[int, int]], encoded: bool = False) -> Dict[int, bookstore_pb2.Book]:
+        by_shard: Dict[int, List[int]] = {}
+        for seq, i in entries:
+            by_shard.setdefault(i, []).append(seq)
+        books = {}
+        for i, seqs in by_shard.items():
+            shard = self.shards[i]
+            with shard.lock.read:
+                books.update(shard.books_at(seqs, encoded))
+        return books
+    
+    def read_view(self, view: CatalogView, limit: int) -> List[bookstore_pb2.Book]:
+        # The next `limit` books of the view in sequence order. Pre-images are
+        # taken last so they also cover books changed between the two passes.
+        entries = [entry for entry in self.seqs_after(view.position, limit) if entry[0] <= view.watermark]
+        books = self.books_at(entries)
+        books.update(view.take_preimages())
+        page = sorted(books.items(), key=lambda entry: entry[0])[:limit]
+        if page:
+            view.advance(page[-1][0])
+        return [book for _, book in page]
+    
+    def list_books_after(self, after_seq: int, page_size: int,
+                         encoded: bool = False) -> tuple[List[bookstore_pb2.Book], Optional[int]]:
+        entries = self.seqs_after(after_seq, page_size + 1)
+        page = entries[:page_size]
+        books = self.books_at(page, encoded)
+        more = len(entries) > page_size
+        return [books[seq] for seq, _ in page if seq in books], page[-1][0] if more else None
+    
+    def query_books(self, request: bookstore_pb2.QueryBooksRequest, limit: int,
+                    after: Optional[tuple[float, int]] = None) -> tuple[List[bookstore_pb2.Book], Optional[tuple[float, int]]]:
+        # Walks the sort key's range index in every shard and merges, so the
+        # cost follows the page size plus the books the other predicates
+        # reject, not the catalog size. `after` is the (key, seq) of the last
+        # book of the previous page; so is the position returned for the next.
+        price_range = (request.min_price, request.max_price if request.max_price > 0 else math.inf)
+        stock_range = (request.min_stock, request.max_stock if request.HasField("max_stock") else math.inf)
+        by_stock = request.sort_by == bookstore_pb2.QueryBooksRequest.STOCK
+        (low_key, high_key), (other_low, other_high) = \
+            (stock_range, price_range) if by_stock else (price_range, stock_range)
+        low, high = (low_key, 0), (high_key, math.inf)
+        if after is not None:
+            if request.descending:
+                high = min(high, (after[0], after[1] - 1))
+            else:
+                low = max(low, (after[0], after[1] + 1))
+        author = request.author.lower()
+        
+        def accept(table: BookTable, row: int) -> bool:
+            other = table.prices[row] if by_stock else table.stocks[row]
+            if not other_low <= other <= other_high:
+                return False
+            return not author or table.author(row).lower() == author
+        
+        parts = []
+        for shard in self.shards:
+            with shard.lock.read:
+                index = shard.stock_index if by_stock else shard.price_index
+                parts.append(shard.query(index, low, high, request.descending, accept, limit + 1))
+        merged = heapq.merge(*parts, key=lambda entry: entry[:2], reverse=request.descending)
+        page = list(itertools.islice(merged, limit + 1))
+        more = len(page) > limit
+        page = page[:limit]
+        return [book for _, _, book in page], page[-1][:2] if more else None
     
     def get_active_usernames(self):
-        return list(self.active_chat_clients.keys())
+        with self.chat_lock:
+            return list(self.active_chat_clients.keys())
     
     def add_chat_client(self, username, client_queue):
-        self.active_chat_clients[username] = client_queue
+        with self.chat_lock:
+            self.active_chat_clients[username] = client_queue
         print(f"User {username} connected. Active users: {self.get_active_usernames()}")
     
     def remove_chat_client(self, username):
-        if username in self.active_chat_clients:
-            del self.active_chat_clients[username]
+        with self.chat_lock:
+            removed = self.active_chat_clients.pop(username, None) is not None
+        if removed:
             print(f"User {username} disconnected. Active users: {self.get_active_usernames()}")
     
     def broadcast_chat_message(self, message, target_username=None):
-        if message.user != "SYSTEM":
-            self.chat_messages.append(message)
+        # Only public messages are kept for replay; private ones stay private.
+        if message.user != "SYSTEM" and not target_username:
+            self.chat_history.append(message)
+        with self.chat_lock:
+            target_queue = self.active_chat_clients.get(target_username) if target_username else None
+            sender_queue = self.active_chat_clients.get(message.user)
+            clients = list(self.active_chat_clients.items())
         
-        if target_username and target_username in self.active_chat_clients:
+        if target_queue is not None:
             try:
-                self.active_chat_clients[target_username].put(message)
-                if message.user != target_username and message.user in self.active_chat_clients:
-                    self.active_chat_clients[message.user].put(message)
+                target_queue.put(message)
+                if message.user != target_username and sender_queue is not None:
+                    sender_queue.put(message)
             except Exception as e:
                 print(f"Error sending to {target_username}: {str(e)}")
         else:
-            for username, client_queue in list(self.active_chat_clients.items()):
+            for username, client_queue in clients:
                 try:
                     client_queue.put(message)
                 except Exception as e:
@@ -79,102 +983,450 @@ class BookStore:
                     self.remove_chat_client(username)
 
 class BookStoreServicer(bookstore_pb2_grpc.BookStoreServicer):
-    def __init__(self):
-        self.store = BookStore()
+    def __init__(self, store: Optional[BookStore] = None, metrics: Optional[Metrics] = None,
+                 compression: Optional[ResponseCompression] = None):
+        self.store = store if store is not None else BookStore()
+        self.metrics = metrics
+        self.compression = compression if compression is not None else ResponseCompression()
+        # Set by bookstore_wire.add_servicer_to_server, whose serializer
+        # accepts pre-encoded responses.
+        self.encoded_responses = False
     
     def AddBook(self, request, context):
-        book_id = str(uuid.uuid4())
-        book = bookstore_pb2.Book(
-            id=book_id,
-            title=request.title,
-            author=request.author,
-            isbn=request.isbn,
-            stock=request.stock,
-            price=request.price
-        )
-        self.store.add_book(book)
+        book = book_from_request(request, str(uuid.uuid4()))
+        owner = self.store.add_book(book)
+        if owner is not None:
+            existing = self.store.get_book(owner)
+            if request.skip_duplicate_isbn and existing is not None:
+                return bookstore_pb2.AddBookResponse(
+                    book=existing,
+                    success=True,
+                    message="A book with this ISBN already exists"
+                )
+            return bookstore_pb2.AddBookResponse(
+                success=False,
+                message=f"ISBN {book.isbn} already belongs to book {owner}"
+            )
         return bookstore_pb2.AddBookResponse(
             book=book,
             success=True,
             message="Book added successfully"
         )
     
+    def GetBook(self, request, context):
+        book = self.store.get_book(request.book_id)
+        if book is None:
+            return bookstore_pb2.GetBookResponse(found=False)
+        return bookstore_pb2.GetBookResponse(book=book, found=True)
+    
+    def BatchGetBooks(self, request, context):
+        response = bookstore_pb2.BatchGetBooksResponse()
+        books = self.store.get_books(list(request.book_ids))
+        for book_id in request.book_ids:
+            book = books.get(book_id)
+            if book is None:
+                response.missing_ids.append(book_id)
+            else:
+                response.books.append(book)
+        return response
+    
+    def GetBookByIsbn(self, request, context):
+        book, = self.store.get_books_by_isbn([request.isbn])
+        if book is None:
+            return bookstore_pb2.GetBookByIsbnResponse(found=False)
+        return bookstore_pb2.GetBookByIsbnResponse(book=book, found=True)
+    
+    def BatchGetByIsbn(self, request, context):
+        response = bookstore_pb2.BatchGetByIsbnResponse()
+        for isbn, book in zip(request.isbns, self.store.get_books_by_isbn(list(request.isbns))):
+            if book is None:
+                response.missing_isbns.append(isbn)
+            else:
+                response.books.append(book)
+        return response
+    
     def SearchBook(self, request, context):
-        books = self.store.search_books(request.query)
-        return bookstore_pb2.SearchBookResponse(books=books)
+        limit = min(request.limit if request.limit > 0 else DEFAULT_PAGE_SIZE, MAX_QUERY_LIMIT)
+        try:
+            projection = book_projection(request.read_mask)
+            after, stats = decode_search_token(request) if request.page_token else (None, None)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return bookstore_pb2.SearchBookResponse()
+        
+        try:
+            books, scores, last, stats = self.store.search_ranked(
+                request.query, limit, after, self.encoded_responses, expiry_check(context), stats
+            )
+        except ScanExpired:
+            return self.scan_expired(context, bookstore_pb2.SearchBookResponse())
+        if projection is not None:
+            books = projection.books(books, self.encoded_responses)
+        next_page_token = encode_search_token(request, *last, stats) if last is not None else ""
+        if self.encoded_responses:
+            return self.compression.respond(context, EncodedMessage(
+                encode_messages(1, books)
+                + encode_string(2, next_page_token)
+                + encode_doubles(3, scores)
+            ))
+        return self.compression.respond(context, bookstore_pb2.SearchBookResponse(
+            books=books,
+            next_page_token=next_page_token,
+            scores=scores
+        ))
+    
+    @staticmethod
+    def scan_expired(context, response):
+        # set_code rather than abort, which is a coroutine on grpc.aio
+        # contexts that delegate here.
+        context.set_code(grpc.StatusCode.DEADLINE_EXCEEDED)
+        context.set_details("Deadline exceeded before the scan finished")
+        return response
     
     def UpdateStock(self, request, context):
-        book = self.store.get_book(request.book_id)
-        if not book:
+        if not self.store.update_stock(request.book_id, request.new_stock):
             return bookstore_pb2.UpdateStockResponse(
                 success=False,
                 message="Book not found"
             )
         
-        book.stock = request.new_stock
-        self.store.add_book(book)
         return bookstore_pb2.UpdateStockResponse(
             success=True,
             message="Stock updated successfully"
         )
     
-    def ListBooks(self, request, context):
-        books, total_books, total_pages = self.store.list_books(
-            request.page,
-            request.page_size
+    def BatchUpdateStock(self, request, context):
+        updated = self.store.update_stocks([(update.book_id, update.new_stock) for update in request.updates])
+        response = bookstore_pb2.BatchUpdateStockResponse(succeeded=sum(updated))
+        for update, success in zip(request.updates, updated):
+            response.results.add(
+                book_id=update.book_id,
+                success=success,
+                message="Stock updated successfully" if success else "Book not found"
+            )
+        return response
+    
+    def AdjustStock(self, request, context):
+        applied, stock, version = self.store.adjust_stock(request.book_id, request.delta, request.min_floor)
+        if applied:
+            message = "Stock adjusted successfully"
+        elif not version:
+            message = "Book not found"
+        elif stock + request.delta < request.min_floor:
+            message = f"Stock would fall below {request.min_floor}"
+        else:
+            message = "Stock would overflow"
+        return bookstore_pb2.StockChangeResponse(success=applied, message=message, stock=stock, version=version)
+    
+    def CompareAndSetStock(self, request, context):
+        applied, stock, version = self.store.compare_and_set_stock(
+            request.book_id, request.expected_version, request.new_stock
         )
-        return bookstore_pb2.ListBooksResponse(
+        if applied:
+            message = "Stock updated successfully"
+        elif not version:
+            message = "Book not found"
+        else:
+            message = f"Version mismatch: book is at version {version}"
+        return bookstore_pb2.StockChangeResponse(success=applied, message=message, stock=stock, version=version)
+    
+    def ListBooks(self, request, context):
+        page_size = request.page_size if request.page_size > 0 else DEFAULT_PAGE_SIZE
+        try:
+            projection = book_projection(request.read_mask)
+            after_seq = decode_page_token(request.page_token) if request.page_token else 0
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return bookstore_pb2.ListBooksResponse()
+        
+        if request.page > 0 and not request.page_token:
+            try:
+                books, total_books, total_pages = self.store.list_books(
+                    request.page,
+                    page_size,
+                    expiry_check(context)
+                )
+            except ScanExpired:
+                return self.scan_expired(context, bookstore_pb2.ListBooksResponse())
+            return self.compression.respond(context, bookstore_pb2.ListBooksResponse(
+                books=projection.books(books) if projection is not None else books,
+                total_books=total_books,
+                total_pages=total_pages
+            ))
+        
+        books, next_seq = self.store.list_books_after(after_seq, page_size, self.encoded_responses)
+        if projection is not None:
+            books = projection.books(books, self.encoded_responses)
+        total_books = self.store.count()
+        next_page_token = encode_page_token(next_seq) if next_seq is not None else ""
+        if self.encoded_responses:
+            return self.compression.respond(context, EncodedMessage(
+                encode_messages(1, books)
+                + encode_int(2, total_books)
+                + encode_int(3, math.ceil(total_books / page_size))
+                + encode_string(4, next_page_token)
+            ))
+        return self.compression.respond(context, bookstore_pb2.ListBooksResponse(
             books=books,
             total_books=total_books,
-            total_pages=total_pages
-        )
+            total_pages=math.ceil(total_books / page_size),
+            next_page_token=next_page_token
+        ))
+    
+    def QueryBooks(self, request, context):
+        limit = min(request.limit if request.limit > 0 else DEFAULT_PAGE_SIZE, MAX_QUERY_LIMIT)
+        try:
+            projection = book_projection(request.read_mask)
+            after = decode_query_token(request) if request.page_token else None
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return bookstore_pb2.QueryBooksResponse()
+        
+        books, last = self.store.query_books(request, limit, after)
+        return self.compression.respond(context, bookstore_pb2.QueryBooksResponse(
+            books=projection.books(books) if projection is not None else books,
+            next_page_token=encode_query_token(request, *last) if last is not None else ""
+        ))
+    
+    def export_chunks(self, request, view: CatalogView):
+        chunk_size = min(request.chunk_size if request.chunk_size > 0 else STREAM_CHUNK_SIZE, MAX_STREAM_CHUNK_SIZE)
+        matches = book_filter(request)
+        chunk = []
+        while True:
+            books = self.store.read_view(view, chunk_size)
+            if not books:
+                break
+            chunk.extend(book for book in books if matches(book))
+            while len(chunk) >= chunk_size:
+                yield bookstore_pb2.BookChunk(books=chunk[:chunk_size])
+                chunk = chunk[chunk_size:]
+        if chunk:
+            yield bookstore_pb2.BookChunk(books=chunk)
+    
+    def StreamBooks(self, request, context):
+        # Chunks are produced only as gRPC pulls them, so at most one chunk is
+        # in flight per stream regardless of catalog size.
+        view = self.store.open_view()
+        context.add_callback(lambda: self.store.close_view(view))
+        try:
+            yield from self.export_chunks(request, view)
+        finally:
+            self.store.close_view(view)
     
     def DeleteBook(self, request, context):
-        if request.book_id not in self.store.books:
+        if not self.store.delete_book(request.book_id):
             return bookstore_pb2.DeleteBookResponse(
                 success=False,
                 message="Book not found"
             )
         
-        del self.store.books[request.book_id]
         return bookstore_pb2.DeleteBookResponse(
             success=True,
             message="Book deleted successfully"
         )
     
+    def BatchDeleteBooks(self, request, context):
+        deleted = self.store.delete_books(list(request.book_ids))
+        response = bookstore_pb2.BatchDeleteBooksResponse(succeeded=sum(deleted))
+        for book_id, success in zip(request.book_ids, deleted):
+            response.results.add(
+                book_id=book_id,
+                success=success,
+                message="Book deleted successfully" if success else "Book not found"
+            )
+        return response
+    
     def SubscribeToNewBooks(self, request, context):
-        import queue
-        q = queue.Queue()
-        self.store.add_subscriber(q)
+        broker = self.store.broker
+        subscription = broker.subscribe()
+        context.add_callback(lambda: broker.unsubscribe(subscription))
         
-        end_time = time.time() + request.duration_seconds
-        while time.time() < end_time:
-            try:
-                book = q.get(timeout=1)
+        end_time = time.monotonic() + request.duration_seconds
+        try:
+            while True:
+                remaining = end_time - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    book = subscription.get(timeout=remaining)
+                except queue.Empty:
+                    return
+                except SubscriptionClosed:
+                    if subscription.overflowed:
+                        context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+                        context.set_details("Subscriber fell too far behind")
+                    return
                 yield book
-            except queue.Empty:
+        finally:
+            broker.unsubscribe(subscription)
+    
+    def change_events(self, data: List[bytes]) -> list:
+        if self.encoded_responses:
+            return [EncodedMessage(event) for event in data]
+        return [bookstore_pb2.ChangeEvent.FromString(event) for event in data]
+    
+    def WatchChanges(self, request, context):
+        changes = self.store.changes
+        try:
+            seq = changes.resolve(request.from_sequence)
+        except (ChangesTrimmed, ValueError) as e:
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+        stopped = threading.Event()
+        
+        def stop():
+            stopped.set()
+            changes.wake()
+        context.add_callback(stop)
+        
+        while not stopped.is_set():
+            try:
+                data = changes.read(seq, WATCH_BATCH)
+            except ChangesTrimmed as e:
+                context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+            if not data:
+                changes.wait(seq, stopped.is_set)
                 continue
+            seq += len(data)
+            yield from self.change_events(data)
     
     def BulkAddBooks(self, request_iterator, context):
-        total_added = 0
+        response = bookstore_pb2.BulkAddResponse()
+        batch = []
         for request in request_iterator:
-            book_id = str(uuid.uuid4())
-            book = bookstore_pb2.Book(
-                id=book_id,
-                title=request.title,
-                author=request.author,
-                isbn=request.isbn,
-                stock=request.stock,
-                price=request.price
-            )
-            self.store.add_book(book)
-            total_added += 1
-        
-        return bookstore_pb2.BulkAddResponse(
-            total_books_added=total_added,
-            success=True,
-            message=f"Successfully added {total_added} books"
+            batch.append(request)
+            if len(batch) >= BULK_BATCH_SIZE:
+                self.add_batch(batch, response)
+                batch = []
+        self.add_batch(batch, response)
+        return self.finish_bulk_add(response)
+    
+    def store_batch(self, requests: List[bookstore_pb2.AddBookRequest]) -> Dict[int, str]:
+        books = [
+            book_from_request(request, book_id)
+            for request, book_id in zip(requests, new_book_ids(len(requests)))
+        ]
+        return self.store.add_books(books) if books else {}
+    
+    def add_batch(self, requests: List[bookstore_pb2.AddBookRequest], response: bookstore_pb2.BulkAddResponse) -> None:
+        rejected = self.store_batch(requests)
+        for i in rejected:
+            if requests[i].skip_duplicate_isbn:
+                response.duplicates_skipped += 1
+            else:
+                response.duplicates_rejected += 1
+        response.total_books_added += len(requests) - len(rejected)
+    
+    @staticmethod
+    def finish_bulk_add(response: bookstore_pb2.BulkAddResponse) -> bookstore_pb2.BulkAddResponse:
+        response.success = response.duplicates_rejected == 0
+        response.message = f"Successfully added {response.total_books_added} books"
+        if response.duplicates_skipped:
+            response.message += f", skipped {response.duplicates_skipped} with a duplicate ISBN"
+        if response.duplicates_rejected:
+            response.message = (f"Added {response.total_books_added} books, rejected "
+                                f"{response.duplicates_rejected} with a duplicate ISBN")
+        return response
+    
+    def ingest_batch(self, requests: List[bookstore_pb2.BulkIngestRequest]) -> bookstore_pb2.BulkIngestAck:
+        ack = bookstore_pb2.BulkIngestAck()
+        valid = []
+        for request in requests:
+            error = validate_book_request(request.book)
+            if error:
+                ack.errors.add(sequence=request.sequence, message=error)
+            else:
+                valid.append(request)
+            ack.committed_sequence = max(ack.committed_sequence, request.sequence)
+        rejected = self.store_batch([request.book for request in valid])
+        for i, owner in rejected.items():
+            if not valid[i].book.skip_duplicate_isbn:
+                ack.errors.add(
+                    sequence=valid[i].sequence,
+                    message=f"ISBN {valid[i].book.isbn} already belongs to book {owner}"
+                )
+        ack.accepted = len(valid) - len(rejected)
+        ack.failed = len(ack.errors)
+        return ack
+    
+    def BulkIngest(self, request_iterator, context):
+        batch = []
+        for request in request_iterator:
+            batch.append(request)
+            if request.flush or len(batch) >= BULK_BATCH_SIZE:
+                yield self.ingest_batch(batch)
+                batch = []
+        if batch:
+            yield self.ingest_batch(batch)
+    
+    def join_chat(self, first_message, client_queue):
+        username = first_message.user
+        self.store.add_chat_client(username, client_queue)
+
+        join_msg = bookstore_pb2.ChatMessage(
+            user="SYSTEM",
+            message=f"{username} has joined the chat",
+            timestamp=int(time.time())
+        )
+        self.store.broadcast_chat_message(join_msg)
+
+        if first_message.message != "LISTENING":
+            self.store.broadcast_chat_message(first_message)
+    
+    def route_chat_message(self, request):
+        target = None
+        if ":" in request.message:
+            parts = request.message.split(":", 1)
+            if len(parts) > 1 and parts[0].strip() in self.store.get_active_usernames():
+                target = parts[0].strip()
+                request.message = parts[1].strip()
+        self.store.broadcast_chat_message(request, target)
+    
+    def leave_chat(self, username):
+        self.store.remove_chat_client(username)
+        leave_msg = bookstore_pb2.ChatMessage(
+            user="SYSTEM",
+            message=f"{username} has left the chat",
+            timestamp=int(time.time())
         )
+        self.store.broadcast_chat_message(leave_msg)
+    
+    def online_users(self, username):
+        return [
+            bookstore_pb2.ChatMessage(
+                user=user,
+                message="ONLINE",
+                timestamp=int(time.time())
+            )
+            for user in self.store.get_active_usernames()
+            if user != username
+        ]
+    
+    def chat_history_pages(self, request):
+        page_size = request.page_size if request.page_size > 0 else DEFAULT_PAGE_SIZE
+        history = self.store.chat_history
+        seq, end = history.replay_range(request.last_n, request.since_timestamp)
+        while seq < end:
+            messages, seq = history.read(seq, end, page_size)
+            if not messages:
+                return
+            yield messages
+    
+    def GetChatHistory(self, request, context):
+        for messages in self.chat_history_pages(request):
+            yield from messages
+    
+    def server_stats(self) -> bookstore_pb2.ServerStats:
+        if self.metrics is not None:
+            return self.metrics.collect(self.store)
+        stats = bookstore_pb2.ServerStats()
+        collect_store_stats(self.store, stats)
+        return stats
+    
+    def GetServerStats(self, request, context):
+        return self.server_stats()
     
     def Chat(self, request_iterator, context):
         import queue
@@ -185,48 +1437,19 @@ class BookStoreServicer(bookstore_pb2_grpc.BookStoreServicer):
             username = first_message.user
 
             if first_message.message == "GET_USERS":
-                active_users = self.store.get_active_usernames()
-                for user in active_users:
-                    if user != username:
-                        yield bookstore_pb2.ChatMessage(
-                            user=user,
-                            message="ONLINE",
-                            timestamp=int(time.time())
-                        )
+                yield from self.online_users(username)
                 return
 
-            self.store.add_chat_client(username, client_queue)
-
-            join_msg = bookstore_pb2.ChatMessage(
-                user="SYSTEM",
-                message=f"{username} has joined the chat",
-                timestamp=int(time.time())
-            )
-            self.store.broadcast_chat_message(join_msg)
-
-            if first_message.message != "LISTENING":
-                self.store.broadcast_chat_message(first_message)
+            self.join_chat(first_message, client_queue)
 
             def receive_messages():
                 try:
                     for request in request_iterator:
-                        target = None
-                        if ":" in request.message:
-                            parts = request.message.split(":", 1)
-                            if len(parts) > 1 and parts[0].strip() in self.store.get_active_usernames():
-                                target = parts[0].strip()
-                                request.message = parts[1].strip()
-                        self.store.broadcast_chat_message(request, target)
+                        self.route_chat_message(request)
                 except Exception as e:
                     print(f"Receive thread error: {str(e)}")
                 finally:
-                    self.store.remove_chat_client(username)
-                    leave_msg = bookstore_pb2.ChatMessage(
-                        user="SYSTEM",
-                        message=f"{username} has left the chat",
-                        timestamp=int(time.time())
-                    )
-                    self.store.broadcast_chat_message(leave_msg)
+                    self.leave_chat(username)
 
             recv_thread = threading.Thread(target=receive_messages)
             recv_thread.daemon = True
@@ -244,13 +1467,134 @@ class BookStoreServicer(bookstore_pb2_grpc.BookStoreServicer):
             self.store.remove_chat_client(username)
 
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    bookstore_pb2_grpc.add_BookStoreServicer_to_server(BookStoreServicer(), server)
-    server.add_insecure_port('[::]:50051')
+def build_server(servicer: bookstore_pb2_grpc.BookStoreServicer, metrics: Metrics, max_workers: int = 10,
+                 options: Optional[list] = None, interceptors: tuple = (),
+                 admission: Optional[Admission] = None) -> grpc.Server:
+    # The server with its executor, interceptors and servicer but no ports,
+    # not yet started.
+    admission = admission if admission is not None else Admission()
+    server = grpc.server(
+        InstrumentedExecutor(max_workers, metrics),
+        interceptors=[MetricsInterceptor(metrics), AdmissionInterceptor(admission), *interceptors],
+        options=options,
+        maximum_concurrent_rpcs=admission.maximum_concurrent_rpcs(max_workers)
+    )
+    add_servicer_to_server(servicer, server)
+    return server
+
+def start_server(servicer: bookstore_pb2_grpc.BookStoreServicer, metrics: Metrics, max_workers: int = 10,
+                 addresses: tuple = ('[::]:50051',), options: Optional[list] = None,
+                 interceptors: tuple = (), admission: Optional[Admission] = None) -> grpc.Server:
+    server = build_server(servicer, metrics, max_workers, options, interceptors, admission)
+    for address in addresses:
+        server.add_insecure_port(address)
     server.start()
-    print("BookStore server started on port 50051")
+    return server
+
+def serve(store: Optional[BookStore] = None, max_workers: int = 10, use_asyncio: bool = False,
+          metrics_port: Optional[int] = None, address: str = '[::]:50051', admission: Optional[Admission] = None,
+          compression: Optional[ResponseCompression] = None):
+    store = store if store is not None else BookStore()
+    metrics = Metrics()
+    if metrics_port:
+        serve_text(metrics_port, lambda: metrics.collect(store))
+    if use_asyncio:
+        import asyncio
+        from bookstore_aio_server import serve_async
+        asyncio.run(serve_async(store, address, metrics=metrics, admission=admission, compression=compression))
+        return
+    
+    server = start_server(BookStoreServicer(store, metrics, compression), metrics, max_workers,
+                          addresses=(address,), admission=admission)
+    print(f"BookStore server started on {address}")
     server.wait_for_termination()
 
 if __name__ == '__main__':
-    serve() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="BookStore gRPC server")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    parser.add_argument("--asyncio", action="store_true", help="serve on grpc.aio instead of a thread pool")
+    parser.add_argument("--subscriber-buffer", type=int, default=DEFAULT_CAPACITY,
+                        help="new-book notifications buffered per subscriber")
+    parser.add_argument("--overflow-policy", choices=OVERFLOW_POLICIES, default=OVERFLOW_POLICIES[0],
+                        help="what to do when a subscriber's buffer is full")
+    parser.add_argument("--chat-history-messages", type=int, default=DEFAULT_MAX_MESSAGES,
+                        help="chat messages kept for replay; 0 disables history")
+    parser.add_argument("--chat-history-bytes", type=int, default=DEFAULT_MAX_BYTES,
+                        help="encoded bytes of chat history kept for replay")
+    parser.add_argument("--change-log-events", type=int, default=bookstore_changes.DEFAULT_MAX_EVENTS,
+                        help="catalog changes kept for WatchChanges to resume from")
+    parser.add_argument("--change-log-bytes", type=int, default=bookstore_changes.DEFAULT_MAX_BYTES,
+                        help="encoded bytes of catalog changes kept for WatchChanges")
+    parser.add_argument("--data-dir", help="persist the catalog to a WAL and snapshots in this directory")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default=FSYNC_INTERVAL,
+                        help="always: fsync before acknowledging a write; interval: fsync every "
+                             "--fsync-interval seconds; never: leave flushing to the OS")
+    parser.add_argument("--fsync-interval", type=float, default=0.05)
+    parser.add_argument("--snapshot-interval", type=float, default=300.0,
+                        help="seconds between snapshots; 0 disables periodic snapshots")
+    parser.add_argument("--search-cache-entries", type=int, default=DEFAULT_CACHE_ENTRIES,
+                        help="SearchBook results cached; 0 disables the cache")
+    parser.add_argument("--search-cache-bytes", type=int, default=DEFAULT_CACHE_BYTES,
+                        help="encoded size of the books held by the search cache")
+    parser.add_argument("--search-cache-ttl", type=float, default=DEFAULT_CACHE_TTL,
+                        help="seconds a cached search result is served; 0 keeps it until evicted")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus-style text metrics on this HTTP port "
+                             "(replica N of --processes uses this port + N)")
+    parser.add_argument("--max-pending", type=int,
+                        help="calls allowed to wait for a worker (a thread, or the event loop with "
+                             "--asyncio) before new ones fail fast with RESOURCE_EXHAUSTED; open "
+                             "streams hold their place until they end. Unbounded by default")
+    parser.add_argument("--method-limit", action="append", default=[], metavar="METHOD=N",
+                        help="run at most N calls of METHOD at once, rejecting the rest with "
+                             "RESOURCE_EXHAUSTED, e.g. SearchBook=4; repeatable")
+    parser.add_argument("--compression", choices=("gzip", "deflate"),
+                        help="compress SearchBook, ListBooks and QueryBooks responses of at least "
+                             "--compression-threshold bytes; clients may override per call with "
+                             "x-bookstore-compression metadata")
+    parser.add_argument("--compression-threshold", type=int, default=DEFAULT_COMPRESSION_THRESHOLD)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="serve from this many processes sharing --port: one primary "
+                             "takes every write, the others serve reads from a replicated copy")
+    args = parser.parse_args()
+    if args.processes > 1 and args.asyncio:
+        parser.error("--processes is not supported with --asyncio")
+    if args.max_pending is not None and args.max_pending < 0:
+        parser.error("--max-pending must not be negative")
+    try:
+        admission = Admission(parse_method_limits(args.method_limit), args.max_pending)
+    except ValueError as e:
+        parser.error(str(e))
+    compression = ResponseCompression(args.compression, args.compression_threshold)
+    store = BookStore(
+        args.shards,
+        broker=Broker(args.subscriber_buffer, args.overflow_policy),
+        chat_history=ChatHistory(args.chat_history_messages, args.chat_history_bytes),
+        search_cache=SearchCache(args.search_cache_entries, args.search_cache_bytes, args.search_cache_ttl),
+        changes=ChangeLog(args.change_log_events, args.change_log_bytes)
+    )
+    persistence = None
+    if args.data_dir:
+        persistence = Persistence(args.data_dir, args.fsync, args.fsync_interval, args.snapshot_interval)
+        started = time.monotonic()
+        books = persistence.load(store)
+        print(f"Recovered {books} books from {args.data_dir} in {time.monotonic() - started:.2f}s")
+    address = f'[::]:{args.port}'
+    replicas = None
+    if args.processes > 1:
+        from bookstore_cluster import fork_replicas, serve_primary
+        replicas = fork_replicas(store, args.processes - 1, args.workers, args.metrics_port, address, admission,
+                                 compression)
+    if persistence is not None:
+        persistence.open_log(store)
+        persistence.start(store)
+    try:
+        if replicas:
+            serve_primary(store, replicas, args.workers, args.metrics_port, address, admission, compression)
+        else:
+            serve(store, args.workers, args.asyncio, args.metrics_port, address, admission, compression)
+    finally:
+        if persistence is not None:
+            persistence.close()
@@ -0,0 +1,693 @@
+import argparse
+import base64
+import bisect
+import contextlib
+import hashlib
+import heapq
+import itertools
+import queue
+import threading
+import uuid
+from typing import Dict, List, Optional
+import grpc
+import bookstore_pb2
+import bookstore_pb2_grpc
+from bookstore_admission import Admission, parse_method_limits
+from bookstore_cluster import forward_timeout, relay, relay_stream
+from bookstore_metrics import Metrics, serve_text
+from bookstore_sdk import ChannelPool
+from bookstore_wire import DEFAULT_COMPRESSION_THRESHOLD, ResponseCompression, book_projection
+from bookstore_server import (
+    BookStoreServicer, BULK_BATCH_SIZE, DEFAULT_PAGE_SIZE, MAX_QUERY_LIMIT, new_book_ids, normalize_isbn, start_server,
+    validate_book_request
+)
+
+# Sharded deployment: book ids are partitioned over independent bookstore
+# server nodes by consistent hashing, and a ShardRouter in front of them
+# speaks the BookStore service. Point RPCs go to the node owning the id;
+# searches and listings are scattered to every node and merged. A node only
+# knows its own ISBNs, so the router checks new ISBNs against every node and
+# serializes those checks with the writes. Nothing serializes them across
+# routers: ISBNs are unique only while every write goes through one router.
+# Chat lives on the first node.
+
+DEFAULT_VNODES = 128
+DEFAULT_NODE_CHANNELS = 2
+# Books buffered between the node streams of a merged subscription and the
+# client; when it is full, flow control pushes back on the nodes.
+SUBSCRIPTION_BUFFER = 1024
+# Seconds between checks for a cancelled subscription while its buffer is
+# full or empty.
+SUBSCRIPTION_POLL = 0.5
+# Locks serializing writes of the same ISBN between the router's check of
+# every node and the write itself; an ISBN maps to one of them by hash.
+ISBN_LOCK_STRIPES = 64
+# Page token entry of a node that has nothing left to list.
+NODE_DONE = "."
+# ServerStats fields describing the router process itself rather than the
+# catalog; they are not summed over the nodes.
+ROUTER_STATS = {"methods", "uptime_seconds", "executor_workers", "executor_busy", "executor_queued"}
+# ServerStats fields each node numbers on its own; a sum means nothing, so the
+# router reports the largest, like the max_* fields.
+NODE_MAXIMUM_STATS = {"last_change_sequence"}
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    # Each node owns `vnodes` points on a 64-bit ring and a key belongs to the
+    # node of the first point at or after the key's hash, so adding or
+    # removing a node only moves the keys next to that node's points.
+    def __init__(self, nodes: List[str], vnodes: int = DEFAULT_VNODES):
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+        if len(set(nodes)) != len(nodes):
+            raise ValueError("Hash ring nodes must be distinct")
+        points = sorted((ring_hash(f"{node}#{i}"), index) for index, node in enumerate(nodes) for i in range(vnodes))
+        self.nodes = list(nodes)
+        self.hashes = [point for point, _ in points]
+        self.owners = [index for _, index in points]
+        # Ties page tokens to the ring they were issued under.
+        self.fingerprint = f"{ring_hash(' '.join(nodes)) & 0xFFFFFFFF:08x}"
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node_for(self, key: str) -> int:
+        i = bisect.bisect_left(self.hashes, ring_hash(key))
+        return self.owners[i % len(self.owners)]
+
+    def partition(self, keys: List[str]) -> Dict[int, List[int]]:
+        # Positions of `keys` grouped by owning node, in their original order.
+        by_node: Dict[int, List[int]] = {}
+        for i, key in enumerate(keys):
+            by_node.setdefault(self.node_for(key), []).append(i)
+        return by_node
+
+
+def encode_router_token(ring: HashRing, kind: str, positions: List[str]) -> str:
+    # One entry per node: that node's own page token, "" before its first
+    # page or NODE_DONE once it is exhausted.
+    if all(position == NODE_DONE for position in positions):
+        return ""
+    text = f"r1:{kind}:{ring.fingerprint}:{','.join(positions)}"
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def decode_router_token(ring: HashRing, kind: str, token: str) -> List[str]:
+    if not token:
+        return [""] * len(ring)
+    try:
+        version, token_kind, fingerprint, positions = base64.urlsafe_b64decode(token.encode()).decode().split(":")
+        positions = positions.split(",")
+        if version != "r1" or token_kind != kind or fingerprint != ring.fingerprint or len(positions) != len(ring):
+            raise ValueError(version)
+        return positions
+    except Exception:
+        raise ValueError(f"Invalid page token: {token!r}")
+
+
+def sort_key(request: bookstore_pb2.QueryBooksRequest):
+    if request.sort_by == bookstore_pb2.QueryBooksRequest.STOCK:
+        return lambda book: book.stock
+    return lambda book: book.price
+
+
+class ShardRouter(bookstore_pb2_grpc.BookStoreServicer):
+    def __init__(self, nodes: List[str], vnodes: int = DEFAULT_VNODES, metrics: Optional[Metrics] = None,
+                 channels: int = DEFAULT_NODE_CHANNELS, compression: Optional[ResponseCompression] = None):
+        self.ring = HashRing(nodes, vnodes)
+        self.pools = [ChannelPool(node, channels) for node in nodes]
+        self.metrics = metrics
+        # Nodes apply read masks themselves; the router only compresses what
+        # it sends on.
+        self.compression = compression if compression is not None else ResponseCompression()
+        self.isbn_stripes = [threading.Lock() for _ in range(ISBN_LOCK_STRIPES)]
+
+    def close(self) -> None:
+        for pool in self.pools:
+            pool.close()
+
+    def rpc(self, node: int, method: str):
+        return getattr(self.pools[node].stub(), method)
+
+    def route(self, book_id: str, method: str, request, context):
+        response, _ = relay(self.rpc(self.ring.node_for(book_id), method), request, context)
+        return response
+
+    def scatter(self, method: str, requests: Dict[int, object], context=None) -> Dict[int, object]:
+        # Sends each node its request concurrently and waits for all of them.
+        # The first failure cancels the rest and aborts the handler, or is
+        # raised when there is no handler context.
+        timeout = forward_timeout(context) if context is not None else None
+        calls = {node: self.rpc(node, method).future(request, timeout=timeout) for node, request in requests.items()}
+        responses = {}
+        for node, call in calls.items():
+            try:
+                responses[node] = call.result()
+            except grpc.RpcError as e:
+                for other in calls.values():
+                    other.cancel()
+                if context is None:
+                    raise
+                context.abort(e.code(), f"{self.ring.nodes[node]}: {e.details()}")
+        return responses
+
+    def broadcast(self, method: str, request, context=None) -> List[object]:
+        responses = self.scatter(method, {node: request for node in range(len(self.ring))}, context)
+        return [responses[node] for node in range(len(self.ring))]
+
+    @contextlib.contextmanager
+    def isbn_locks(self, requests: List[bookstore_pb2.AddBookRequest]):
+        # Held from isbn_holders() until the requests are written, so two
+        # books with one ISBN cannot both pass the check. This only
+        # serializes writes through this router.
+        stripes = sorted({hash(normalize_isbn(request.isbn)) % ISBN_LOCK_STRIPES
+                          for request in requests if request.isbn})
+        for stripe in stripes:
+            self.isbn_stripes[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self.isbn_stripes[stripe].release()
+
+    def isbn_holders(self, requests: List[bookstore_pb2.AddBookRequest], context) -> Dict[int, bookstore_pb2.Book]:
+        # Maps the position of every request whose ISBN belongs to another
+        # book, on any node or earlier in `requests`, to that book; like a
+        # node's add_books, the first book in a batch to claim an ISBN gets it.
+        isbns = sorted({normalize_isbn(request.isbn) for request in requests} - {""})
+        if not isbns:
+            return {}
+        holders = {
+            normalize_isbn(book.isbn): book
+            for node_response in self.broadcast("BatchGetByIsbn", bookstore_pb2.BatchGetByIsbnRequest(isbns=isbns),
+                                                context)
+            for book in node_response.books
+        }
+        taken = {}
+        for i, request in enumerate(requests):
+            isbn = normalize_isbn(request.isbn)
+            if not isbn:
+                continue
+            holder = holders.setdefault(isbn, bookstore_pb2.Book(id=request.id, isbn=request.isbn))
+            if holder.id != request.id:
+                taken[i] = holder
+        return taken
+
+    def AddBook(self, request, context):
+        # The router picks the id, since the id decides the node.
+        if not request.id:
+            request.id = str(uuid.uuid4())
+        with self.isbn_locks([request]):
+            holder = self.isbn_holders([request], context).get(0)
+            if holder is None:
+                return self.route(request.id, "AddBook", request, context)
+        if request.skip_duplicate_isbn:
+            return bookstore_pb2.AddBookResponse(
+                book=holder, success=True, message="A book with this ISBN already exists"
+            )
+        return bookstore_pb2.AddBookResponse(
+            success=False, message=f"ISBN {request.isbn} already belongs to book {holder.id}"
+        )
+
+    def GetBook(self, request, context):
+        return self.route(request.book_id, "GetBook", request, context)
+
+    def UpdateStock(self, request, context):
+        return self.route(request.book_id, "UpdateStock", request, context)
+
+    def AdjustStock(self, request, context):
+        return self.route(request.book_id, "AdjustStock", request, context)
+
+    def CompareAndSetStock(self, request, context):
+        return self.route(request.book_id, "CompareAndSetStock", request, context)
+
+    def DeleteBook(self, request, context):
+        return self.route(request.book_id, "DeleteBook", request, context)
+
+    def BatchGetBooks(self, request, context):
+        book_ids = list(request.book_ids)
+        requests = {
+            node: bookstore_pb2.BatchGetBooksRequest(book_ids=[book_ids[i] for i in positions])
+            for node, positions in self.ring.partition(book_ids).items()
+        }
+        books = {
+            book.id: book
+            for node_response in self.scatter("BatchGetBooks", requests, context).values()
+            for book in node_response.books
+        }
+        response = bookstore_pb2.BatchGetBooksResponse()
+        for book_id in book_ids:
+            if book_id in books:
+                response.books.append(books[book_id])
+            else:
+                response.missing_ids.append(book_id)
+        return response
+
+    def batch_results(self, method: str, book_ids: List[str], node_request, response, context):
+        # Runs a Batch* write split by node and puts the per-item results
+        # back in request order.
+        partition = self.ring.partition(book_ids)
+        requests = {node: node_request(positions) for node, positions in partition.items()}
+        results = [None] * len(book_ids)
+        for node, node_response in self.scatter(method, requests, context).items():
+            for i, result in zip(partition[node], node_response.results):
+                results[i] = result
+            response.succeeded += node_response.succeeded
+        response.results.extend(results)
+        return response
+
+    def BatchUpdateStock(self, request, context):
+        updates = list(request.updates)
+        return self.batch_results(
+            "BatchUpdateStock", [update.book_id for update in updates],
+            lambda positions: bookstore_pb2.BatchUpdateStockRequest(updates=[updates[i] for i in positions]),
+            bookstore_pb2.BatchUpdateStockResponse(), context
+        )
+
+    def BatchDeleteBooks(self, request, context):
+        book_ids = list(request.book_ids)
+        return self.batch_results(
+            "BatchDeleteBooks", book_ids,
+            lambda positions: bookstore_pb2.BatchDeleteBooksRequest(book_ids=[book_ids[i] for i in positions]),
+            bookstore_pb2.BatchDeleteBooksResponse(), context
+        )
+
+    def GetBookByIsbn(self, request, context):
+        for node_response in self.broadcast("GetBookByIsbn", request, context):
+            if node_response.found:
+                return node_response
+        return bookstore_pb2.GetBookByIsbnResponse(found=False)
+
+    def BatchGetByIsbn(self, request, context):
+        books = {
+            normalize_isbn(book.isbn): book
+            for node_response in self.broadcast("BatchGetByIsbn", request, context)
+            for book in node_response.books
+        }
+        response = bookstore_pb2.BatchGetByIsbnResponse()
+        for isbn in request.isbns:
+            book = books.get(normalize_isbn(isbn))
+            if book is None:
+                response.missing_isbns.append(isbn)
+            else:
+                response.books.append(book)
+        return response
+
+    def SearchBook(self, request, context):
+        # Merged by the nodes' scores. Each node weighs words by its own
+        # part of the catalog, which evens out as books spread over the ring.
+        try:
+            positions = decode_router_token(self.ring, "s", request.page_token)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return bookstore_pb2.SearchBookResponse()
+
+        limit = min(request.limit if request.limit > 0 else DEFAULT_PAGE_SIZE, MAX_QUERY_LIMIT)
+
+        def node_request(node: int, node_limit: int) -> bookstore_pb2.SearchBookRequest:
+            node_request = bookstore_pb2.SearchBookRequest()
+            node_request.CopyFrom(request)
+            node_request.limit = node_limit
+            node_request.page_token = positions[node]
+            return node_request
+
+        entries = self.merge_pages("SearchBook", node_request, positions, limit,
+                                   lambda response: [-score for score in response.scores], False, context)
+        return self.compression.respond(context, bookstore_pb2.SearchBookResponse(
+            books=[book for _, book in entries],
+            next_page_token=encode_router_token(self.ring, "s", positions),
+            scores=[-key for key, _ in entries]
+        ))
+
+    def list_page(self, request, context) -> bookstore_pb2.ListBooksResponse:
+        # Page numbers over the nodes' listings laid end to end. Each node
+        # covering part of the page is asked for the pages of its own listing
+        # that hold that part: only the first such node can start mid-page,
+        # and its part then spans at most two of its pages.
+        page_size = request.page_size if request.page_size > 0 else DEFAULT_PAGE_SIZE
+        probe = bookstore_pb2.ListBooksRequest(page=1, page_size=1)
+        totals = [node_response.total_books for node_response in self.broadcast("ListBooks", probe, context)]
+        response = bookstore_pb2.ListBooksResponse(
+            total_books=sum(totals), total_pages=-(-sum(totals) // page_size)
+        )
+        start, end = (request.page - 1) * page_size, request.page * page_size
+        windows = {}
+        offset = 0
+        for node, total in enumerate(totals):
+            if offset < end and start < offset + total:
+                windows[node] = (max(start - offset, 0), min(end, offset + total) - offset)
+            offset += total
+
+        def node_pages(index: int) -> Dict[int, bookstore_pb2.ListBooksRequest]:
+            # The index-th page, 0 or 1, under each window's node; windows
+            # ending on their first page need no second one.
+            requests = {}
+            for node, (first, last) in windows.items():
+                page = first // page_size + 1 + index
+                if index == 0 or page <= (last - 1) // page_size + 1:
+                    requests[node] = bookstore_pb2.ListBooksRequest(
+                        page=page, page_size=page_size, read_mask=request.read_mask
+                    )
+            return requests
+
+        pages = self.scatter("ListBooks", node_pages(0), context)
+        rest = self.scatter("ListBooks", node_pages(1), context)
+        for node, (first, last) in sorted(windows.items()):
+            books = list(pages[node].books)
+            if node in rest:
+                books.extend(rest[node].books)
+            skip = first - first // page_size * page_size
+            response.books.extend(books[skip:skip + last - first])
+        return self.compression.respond(context, response)
+
+    def ListBooks(self, request, context):
+        # Cursor pages take a share of the page from every node that still
+        # has books, each in its own insertion order; the token keeps each
+        # node's cursor, so no book is skipped or repeated.
+        if request.page > 0 and not request.page_token:
+            return self.list_page(request, context)
+        try:
+            positions = decode_router_token(self.ring, "l", request.page_token)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return bookstore_pb2.ListBooksResponse()
+
+        page_size = request.page_size if request.page_size > 0 else DEFAULT_PAGE_SIZE
+        active = [node for node, position in enumerate(positions) if position != NODE_DONE]
+        requests = {}
+        for i, node in enumerate(active):
+            share = page_size // len(active) + (i < page_size % len(active))
+            if share:
+                requests[node] = bookstore_pb2.ListBooksRequest(
+                    page_size=share, page_token=positions[node], read_mask=request.read_mask
+                )
+        # Nodes without a share this page are only asked for their count.
+        probe = bookstore_pb2.ListBooksRequest(page=1, page_size=1)
+        for node in range(len(self.ring)):
+            requests.setdefault(node, probe)
+
+        response = bookstore_pb2.ListBooksResponse()
+        for node, node_response in sorted(self.scatter("ListBooks", requests, context).items()):
+            response.total_books += node_response.total_books
+            if requests[node] is not probe:
+                response.books.extend(node_response.books)
+                positions[node] = node_response.next_page_token or NODE_DONE
+        response.total_pages = -(-response.total_books // page_size)
+        response.next_page_token = encode_router_token(self.ring, "l", positions)
+        return self.compression.respond(context, response)
+
+    def merge_pages(self, method: str, node_request, positions: List[str], limit: int, keys,
+                    descending: bool, context) -> List[tuple]:
+        # Every node returns its next `limit` matches and the router keeps the
+        # first `limit` of their merge. A node that contributed only part of
+        # its page is asked again for exactly that many, which returns the
+        # same books together with the node's token for resuming after them.
+        # Returns the page as (key, book) pairs and advances `positions`;
+        # keys(response) gives the sort key of each of a response's books.
+        requests = {node: node_request(node, limit) for node, position in enumerate(positions) if position != NODE_DONE}
+        pages = self.scatter(method, requests, context)
+        merged = heapq.merge(
+            *([(key, node) for key in keys(pages[node])] for node in sorted(pages)),
+            key=lambda entry: entry[0], reverse=descending
+        )
+        taken = {node: 0 for node in pages}
+        for _, node in itertools.islice(merged, limit):
+            taken[node] += 1
+
+        entries = {}
+        partial = {}
+        for node, count in taken.items():
+            if count == len(pages[node].books):
+                entries[node] = list(zip(keys(pages[node]), pages[node].books))
+                positions[node] = pages[node].next_page_token or NODE_DONE
+            elif count:
+                partial[node] = node_request(node, count)
+        for node, node_response in self.scatter(method, partial, context).items():
+            entries[node] = list(zip(keys(node_response), node_response.books))
+            positions[node] = node_response.next_page_token or NODE_DONE
+        return list(heapq.merge(*(entries[node] for node in sorted(entries)),
+                                key=lambda entry: entry[0], reverse=descending))
+
+    def QueryBooks(self, request, context):
+        try:
+            projection = book_projection(request.read_mask)
+            positions = decode_router_token(self.ring, "q", request.page_token)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return bookstore_pb2.QueryBooksResponse()
+
+        limit = min(request.limit if request.limit > 0 else DEFAULT_PAGE_SIZE, MAX_QUERY_LIMIT)
+        key = sort_key(request)
+
+        def node_request(node: int, node_limit: int) -> bookstore_pb2.QueryBooksRequest:
+            node_request = bookstore_pb2.QueryBooksRequest()
+            node_request.CopyFrom(request)
+            node_request.limit = node_limit
+            node_request.page_token = positions[node]
+            # Merging needs the sort key, so the router projects instead.
+            node_request.ClearField("read_mask")
+            return node_request
+
+        entries = self.merge_pages("QueryBooks", node_request, positions, limit,
+                                   lambda response: [key(book) for book in response.books], request.descending, context)
+        books = [book for _, book in entries]
+        return self.compression.respond(context, bookstore_pb2.QueryBooksResponse(
+            books=projection.books(books) if projection is not None else books,
+            next_page_token=encode_router_token(self.ring, "q", positions)
+        ))
+
+    def StreamBooks(self, request, context):
+        # Every node's stream is opened up front, so the nodes take their
+        # snapshots together, then drained one after the other; flow control
+        # holds the others back meanwhile. The snapshots are not one instant
+        # across nodes: a write landing while they open may be exported by one
+        # node and missed by another.
+        timeout = forward_timeout(context)
+        calls = [self.rpc(node, "StreamBooks")(request, timeout=timeout) for node in range(len(self.ring))]
+        for call in calls:
+            context.add_callback(call.cancel)
+        try:
+            for call in calls:
+                yield from call
+        except grpc.RpcError as e:
+            for call in calls:
+                call.cancel()
+            if context.is_active():
+                context.abort(e.code(), e.details())
+
+    def SubscribeToNewBooks(self, request, context):
+        calls = [self.rpc(node, "SubscribeToNewBooks")(request, timeout=forward_timeout(context))
+                 for node in range(len(self.ring))]
+        books = queue.Queue(SUBSCRIPTION_BUFFER)
+        stopped = threading.Event()
+
+        def stop():
+            stopped.set()
+            for call in calls:
+                call.cancel()
+
+        # Pumps and the merge loop poll `stopped`, so a cancelled client
+        # leaves no thread blocked on a full or empty buffer.
+        def deliver(item) -> bool:
+            while not stopped.is_set():
+                try:
+                    books.put(item, timeout=SUBSCRIPTION_POLL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def pump(call):
+            try:
+                for book in call:
+                    if not deliver(book):
+                        return
+                deliver(None)
+            except grpc.RpcError as e:
+                deliver(e)
+
+        context.add_callback(stop)
+        for call in calls:
+            threading.Thread(target=pump, args=(call,), daemon=True).start()
+        finished = 0
+        try:
+            while finished < len(calls):
+                try:
+                    item = books.get(timeout=SUBSCRIPTION_POLL)
+                except queue.Empty:
+                    if stopped.is_set():
+                        return
+                    continue
+                if item is None:
+                    finished += 1
+                elif isinstance(item, grpc.RpcError):
+                    if context.is_active():
+                        context.abort(item.code(), item.details())
+                    return
+                else:
+                    yield item
+        finally:
+            stop()
+
+    def with_ids(self, requests: List[bookstore_pb2.AddBookRequest]) -> Dict[int, List[int]]:
+        missing = [request for request in requests if not request.id]
+        for request, book_id in zip(missing, new_book_ids(len(missing))):
+            request.id = book_id
+        return self.ring.partition([request.id for request in requests])
+
+    def add_batch(self, requests: List[bookstore_pb2.AddBookRequest], response: bookstore_pb2.BulkAddResponse,
+                  context) -> None:
+        partition = self.with_ids(requests)
+        with self.isbn_locks(requests):
+            taken = self.isbn_holders(requests, context)
+            node_requests = {
+                node: iter([requests[i] for i in positions if i not in taken])
+                for node, positions in partition.items()
+            }
+            node_responses = self.scatter("BulkAddBooks", node_requests, context).values()
+        for i in taken:
+            if requests[i].skip_duplicate_isbn:
+                response.duplicates_skipped += 1
+            else:
+                response.duplicates_rejected += 1
+        for node_response in node_responses:
+            response.total_books_added += node_response.total_books_added
+            response.duplicates_skipped += node_response.duplicates_skipped
+            response.duplicates_rejected += node_response.duplicates_rejected
+
+    def BulkAddBooks(self, request_iterator, context):
+        response = bookstore_pb2.BulkAddResponse()
+        batch = []
+        for request in request_iterator:
+            batch.append(request)
+            if len(batch) >= BULK_BATCH_SIZE:
+                self.add_batch(batch, response, context)
+                batch = []
+        if batch:
+            self.add_batch(batch, response, context)
+        return BookStoreServicer.finish_bulk_add(response)
+
+    def ingest_batch(self, requests: List[bookstore_pb2.BulkIngestRequest], context) -> bookstore_pb2.BulkIngestAck:
+        books = [request.book for request in requests]
+        partition = self.with_ids(books)
+        timeout = forward_timeout(context)
+        ack = bookstore_pb2.BulkIngestAck(committed_sequence=max(request.sequence for request in requests))
+        errors = []
+        with self.isbn_locks(books):
+            # Invalid books are left for the nodes to report and claim no ISBN.
+            valid = [i for i, book in enumerate(books) if validate_book_request(book) is None]
+            taken = {valid[j]: holder for j, holder in self.isbn_holders([books[i] for i in valid], context).items()}
+            for i, holder in taken.items():
+                if not books[i].skip_duplicate_isbn:
+                    errors.append(bookstore_pb2.BulkIngestError(
+                        sequence=requests[i].sequence, message=f"ISBN {books[i].isbn} already belongs to book {holder.id}"
+                    ))
+            # Every node's stream is started before any is read, so they run
+            # concurrently.
+            calls = [
+                self.rpc(node, "BulkIngest")(iter([requests[i] for i in positions if i not in taken]), timeout=timeout)
+                for node, positions in partition.items()
+            ]
+            try:
+                for call in calls:
+                    for node_ack in call:
+                        ack.accepted += node_ack.accepted
+                        errors.extend(node_ack.errors)
+            except grpc.RpcError as e:
+                for call in calls:
+                    call.cancel()
+                context.abort(e.code(), e.details())
+        ack.errors.extend(sorted(errors, key=lambda error: error.sequence))
+        ack.failed = len(ack.errors)
+        return ack
+
+    def BulkIngest(self, request_iterator, context):
+        batch = []
+        for request in request_iterator:
+            batch.append(request)
+            if request.flush or len(batch) >= BULK_BATCH_SIZE:
+                yield self.ingest_batch(batch, context)
+                batch = []
+        if batch:
+            yield self.ingest_batch(batch, context)
+
+    def Chat(self, request_iterator, context):
+        yield from relay_stream(self.rpc(0, "Chat"), request_iterator, context)
+
+    def WatchChanges(self, request, context):
+        # Each node numbers its own changes, so there is no single sequence
+        # to resume from; watch the nodes directly instead.
+        context.abort(grpc.StatusCode.UNIMPLEMENTED, "WatchChanges is not available through the router")
+
+    def GetChatHistory(self, request, context):
+        yield from relay_stream(self.rpc(0, "GetChatHistory"), request, context)
+
+    def server_stats(self, context=None) -> bookstore_pb2.ServerStats:
+        # Catalog figures summed over the nodes (maxima for max_* fields and
+        # per-node sequence numbers);
+        # method and executor figures are the router's own.
+        stats = self.metrics.collect() if self.metrics is not None else bookstore_pb2.ServerStats()
+        for node_stats in self.broadcast("GetServerStats", bookstore_pb2.ServerStatsRequest(), context):
+            for field, value in node_stats.ListFields():
+                if field.name in ROUTER_STATS:
+                    continue
+                current = getattr(stats, field.name)
+                if field.name.startswith("max_") or field.name in NODE_MAXIMUM_STATS:
+                    setattr(stats, field.name, max(current, value))
+                else:
+                    setattr(stats, field.name, current + value)
+        return stats
+
+    def GetServerStats(self, request, context):
+        return self.server_stats(context)
+
+
+def serve_router(nodes: List[str], address: str = '[::]:50051', max_workers: int = 10,
+                 vnodes: int = DEFAULT_VNODES, metrics_port: Optional[int] = None,
+                 admission: Optional[Admission] = None, compression: Optional[ResponseCompression] = None) -> None:
+    metrics = Metrics()
+    router = ShardRouter(nodes, vnodes, metrics, compression=compression)
+    if metrics_port:
+        serve_text(metrics_port, router.server_stats)
+    server = start_server(router, metrics, max_workers, addresses=(address,), admission=admission)
+    print(f"BookStore router started on {address} for {len(nodes)} nodes")
+    try:
+        server.wait_for_termination()
+    finally:
+        router.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Route the BookStore service over sharded server nodes")
+    parser.add_argument("--nodes", nargs="+", required=True,
+                        help="host:port of every node, e.g. started with bookstore_server.py --port; "
+                             "books are not migrated, so the list must stay the same for a catalog")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--vnodes", type=int, default=DEFAULT_VNODES, help="ring points per node")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus-style text metrics on this HTTP port")
+    parser.add_argument("--max-pending", type=int,
+                        help="calls allowed to wait for a worker before new ones fail fast "
+                             "with RESOURCE_EXHAUSTED. Unbounded by default")
+    parser.add_argument("--method-limit", action="append", default=[], metavar="METHOD=N",
+                        help="route at most N calls of METHOD at once; repeatable")
+    parser.add_argument("--compression", choices=("gzip", "deflate"),
+                        help="compress read responses of at least --compression-threshold bytes")
+    parser.add_argument("--compression-threshold", type=int, default=DEFAULT_COMPRESSION_THRESHOLD)
+    args = parser.parse_args()
+    if args.max_pending is not None and args.max_pending < 0:
+        parser.error("--max-pending must not be negative")
+    try:
+        admission = Admission(parse_method_limits(args.method_limit), args.max_pending)
+    except ValueError as e:
+        parser.error(str(e))
+    serve_router(args.nodes, f'[::]:{args.port}', args.workers, args.vnodes, args.metrics_port, admission,
+                 ResponseCompression(args.compression, args.compression_threshold))
@@ -0,0 +1,179 @@
+import struct
+from typing import List, Optional
+import grpc
+import bookstore_pb2
+
+SERVICE_NAME = "bookstore.BookStore"
+
+# Unary read responses at least this large are compressed when compression
+# is enabled; below it the CPU costs more than the bytes saved.
+DEFAULT_COMPRESSION_THRESHOLD = 64 * 1024
+COMPRESSION_ALGORITHMS = {
+    "identity": grpc.Compression.NoCompression,
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+# Request metadata choosing the algorithm for one call, e.g. "identity" to
+# opt out, overriding the server's --compression.
+COMPRESSION_METADATA = "x-bookstore-compression"
+
+HANDLER_FACTORIES = {
+    (False, False): grpc.unary_unary_rpc_method_handler,
+    (False, True): grpc.unary_stream_rpc_method_handler,
+    (True, False): grpc.stream_unary_rpc_method_handler,
+    (True, True): grpc.stream_stream_rpc_method_handler,
+}
+
+
+class EncodedMessage:
+    # A response that is already in protobuf wire format. Returned by
+    # handlers instead of a message object when the response is assembled
+    # from cached Book encodings; serialize() passes it through unchanged.
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+def encode_varint(value: int) -> bytes:
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def encode_int(field: int, value: int) -> bytes:
+    # Proto3 omits scalar fields at their default value.
+    return encode_varint(field << 3) + encode_varint(value) if value else b""
+
+
+def encode_bytes(field: int, data: bytes) -> bytes:
+    return encode_varint(field << 3 | 2) + encode_varint(len(data)) + data
+
+
+def encode_string(field: int, value: str) -> bytes:
+    return encode_bytes(field, value.encode()) if value else b""
+
+
+def encode_doubles(field: int, values: List[float]) -> bytes:
+    # A packed repeated double field.
+    return encode_bytes(field, struct.pack(f"<{len(values)}d", *values)) if values else b""
+
+
+def encode_messages(field: int, encoded: List[bytes]) -> bytes:
+    # A repeated message field is each element's encoding behind its tag and
+    # length, so cached encodings can be joined without decoding them.
+    tag = encode_varint(field << 3 | 2)
+    return b"".join(tag + encode_varint(len(data)) + data for data in encoded)
+
+
+def decode_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def filter_fields(data: bytes, numbers: frozenset) -> bytes:
+    # The encoded message with only the top-level fields in `numbers`,
+    # copied as they are without decoding their values.
+    out = bytearray()
+    pos = 0
+    while pos < len(data):
+        start = pos
+        key, pos = decode_varint(data, pos)
+        wire_type = key & 7
+        if wire_type == 0:
+            _, pos = decode_varint(data, pos)
+        elif wire_type == 1:
+            pos += 8
+        elif wire_type == 2:
+            length, pos = decode_varint(data, pos)
+            pos += length
+        elif wire_type == 5:
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+        if key >> 3 in numbers:
+            out += data[start:pos]
+    return bytes(out)
+
+
+class BookProjection:
+    # The Book fields selected by a request's read_mask. Applied to cached
+    # encodings by filtering their fields and to Book objects by copying.
+    FIELDS = {field.name: field.number for field in bookstore_pb2.Book.DESCRIPTOR.fields}
+
+    def __init__(self, paths: List[str]):
+        unknown = [path for path in paths if path not in self.FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown Book fields in read_mask: {', '.join(unknown)}")
+        self.names = tuple(dict.fromkeys(paths))
+        self.numbers = frozenset(self.FIELDS[name] for name in self.names)
+
+    def book(self, book: bookstore_pb2.Book) -> bookstore_pb2.Book:
+        return bookstore_pb2.Book(**{name: getattr(book, name) for name in self.names})
+
+    def books(self, books: list, encoded: bool = False) -> list:
+        if encoded:
+            return [filter_fields(data, self.numbers) for data in books]
+        return [self.book(book) for book in books]
+
+
+def book_projection(read_mask) -> Optional[BookProjection]:
+    # None for an empty mask, which selects whole books.
+    return BookProjection(list(read_mask.paths)) if read_mask.paths else None
+
+
+class ResponseCompression:
+    # Per-call compression of large unary responses. `algorithm` is the
+    # server default (None leaves responses uncompressed); a client can pick
+    # another, or "identity", per call with COMPRESSION_METADATA.
+    def __init__(self, algorithm: Optional[str] = None, threshold: int = DEFAULT_COMPRESSION_THRESHOLD):
+        self.algorithm = COMPRESSION_ALGORITHMS[algorithm] if algorithm else None
+        self.threshold = threshold
+
+    def choose(self, context, response) -> Optional[grpc.Compression]:
+        size = len(response.data) if isinstance(response, EncodedMessage) else response.ByteSize()
+        if size < self.threshold:
+            return None
+        algorithm = self.algorithm
+        for key, value in context.invocation_metadata() or ():
+            if key == COMPRESSION_METADATA:
+                algorithm = COMPRESSION_ALGORITHMS.get(value, algorithm)
+        return algorithm
+
+    def respond(self, context, response):
+        algorithm = self.choose(context, response)
+        if algorithm is not None:
+            context.set_compression(algorithm)
+        return response
+
+
+def serialize(message) -> bytes:
+    if isinstance(message, EncodedMessage):
+        return message.data
+    return message.SerializeToString()
+
+
+def add_servicer_to_server(servicer, server) -> None:
+    # Same registration as bookstore_pb2_grpc.add_BookStoreServicer_to_server,
+    # built from the service descriptor, except that responses go through
+    # serialize() so handlers may return EncodedMessage.
+    handlers = {}
+    for method in bookstore_pb2.DESCRIPTOR.services_by_name["BookStore"].methods:
+        factory = HANDLER_FACTORIES[(method.client_streaming, method.server_streaming)]
+        handlers[method.name] = factory(
+            getattr(servicer, method.name),
+            request_deserializer=getattr(bookstore_pb2, method.input_type.name).FromString,
+            response_serializer=serialize
+        )
+    servicer.encoded_responses = True
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(SERVICE_NAME, handlers),))
+    server.add_registered_method_handlers(SERVICE_NAME, handlers)